@@ -0,0 +1,220 @@
+"""
+Benchmarks for Scrapey's extraction engines.
+
+Usage:
+    python -m scrapey.benchmark ocr CORPUS_DIR
+    python -m scrapey.benchmark pdf FILE.pdf [FILE.pdf ...]
+
+An OCR corpus is a directory of page images; a page with a sibling text file
+of the same name (``page1.png`` + ``page1.txt``) is also scored for accuracy.
+"""
+import argparse
+import contextlib
+import difflib
+import logging
+import os
+import sys
+import time
+from scrapey.utils import app_settings, load_settings
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+# name -> (engine, settings overrides)
+OCR_CONFIGS = {
+    'tesseract': ('tesseract', {}),
+    'easyocr': ('easyocr', {'easyocr_fast_cpu': False}),
+    'easyocr-fp32': ('easyocr', {'easyocr_fast_cpu': False, 'easyocr_full_precision': True}),
+    'easyocr-fast': ('easyocr', {'easyocr_fast_cpu': True, 'easyocr_torchscript': False}),
+    'easyocr-fast-ts': ('easyocr', {'easyocr_fast_cpu': True, 'easyocr_torchscript': True}),
+    'cascade': ('cascade', {}),
+}
+
+
+@contextlib.contextmanager
+def override_settings(**overrides):
+    """Temporarily replace entries in app_settings."""
+    saved = {key: app_settings.get(key) for key in overrides}
+    app_settings.update(overrides)
+    try:
+        yield
+    finally:
+        app_settings.update(saved)
+
+
+def character_error_rate(reference, hypothesis):
+    """Approximate character error rate of hypothesis against reference.
+
+    Whitespace is normalised first so layout differences between engines are
+    not counted as recognition errors.
+    """
+    reference = " ".join(reference.split())
+    hypothesis = " ".join(hypothesis.split())
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+    matcher = difflib.SequenceMatcher(None, reference, hypothesis, autojunk=False)
+    errors = sum(
+        max(i2 - i1, j2 - j1)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != 'equal'
+    )
+    return errors / len(reference)
+
+
+def load_ocr_corpus(corpus_dir):
+    """Return a list of (image_path, ground_truth_or_None) for a corpus."""
+    pages = []
+    for name in sorted(os.listdir(corpus_dir)):
+        stem, ext = os.path.splitext(name)
+        if ext.lower() not in IMAGE_EXTENSIONS:
+            continue
+        truth_path = os.path.join(corpus_dir, stem + '.txt')
+        truth = None
+        if os.path.exists(truth_path):
+            with open(truth_path, 'r', encoding='utf-8') as f:
+                truth = f.read()
+        pages.append((os.path.join(corpus_dir, name), truth))
+    return pages
+
+
+def benchmark_ocr(corpus_dir, configs=None):
+    """Run every OCR configuration over a corpus.
+
+    The first page of each configuration is timed separately as warm-up so
+    one-off model loading and conversion does not skew the per-page figure.
+
+    Returns:
+        list: One dict per configuration with timing and accuracy figures
+    """
+    from scrapey.ocr import perform_ocr
+
+    pages = load_ocr_corpus(corpus_dir)
+    if not pages:
+        raise ValueError(f"No images found in {corpus_dir}")
+
+    results = []
+    for name in configs or OCR_CONFIGS:
+        engine, overrides = OCR_CONFIGS[name]
+        with override_settings(**overrides):
+            timings = []
+            errors = []
+            for image_path, truth in pages:
+                start = time.perf_counter()
+                text = perform_ocr(image_path, engine)
+                timings.append(time.perf_counter() - start)
+                if truth is not None:
+                    errors.append(character_error_rate(truth, text))
+        steady = timings[1:] or timings
+        results.append({
+            'config': name,
+            'pages': len(pages),
+            'warmup_s': timings[0],
+            'per_page_s': sum(steady) / len(steady),
+            'cer': sum(errors) / len(errors) if errors else None,
+        })
+    return results
+
+
+def benchmark_pdf(file_paths, backends=None, workers=None):
+    """Time every installed PDF backend on the same files.
+
+    For each backend and file this reports a cold page count (cache cleared),
+    a warm page count (served from the document cache), single-process
+    extraction and sharded extraction across the process pool.
+
+    Returns:
+        list: One dict per (backend, file) with timing figures
+    """
+    from scrapey import pdf
+
+    results = []
+    for name in backends or pdf.PDF_BACKENDS:
+        backend = pdf.get_pdf_backend(name)
+        if backend.name != name:
+            logging.warning(f"Skipping PDF backend '{name}': not installed")
+            continue
+        for file_path in file_paths:
+            pdf.clear_document_cache()
+            start = time.perf_counter()
+            pages = pdf.get_pdf_page_count(file_path, name)
+            count_cold = time.perf_counter() - start
+
+            start = time.perf_counter()
+            pdf.get_pdf_page_count(file_path, name)
+            count_warm = time.perf_counter() - start
+
+            start = time.perf_counter()
+            text = pdf.extract_pdf_text(file_path, backend=name, workers=1)
+            serial = time.perf_counter() - start
+
+            start = time.perf_counter()
+            pdf.extract_pdf_text(file_path, backend=name, workers=workers)
+            sharded = time.perf_counter() - start
+
+            results.append({
+                'backend': name,
+                'file': os.path.basename(file_path),
+                'pages': pages,
+                'count_cold_s': count_cold,
+                'count_warm_s': count_warm,
+                'serial_s': serial,
+                'sharded_s': sharded,
+                'chars': len(text),
+            })
+    return results
+
+
+def format_table(results, columns):
+    """Render benchmark results as a plain-text table."""
+    rows = [[str(col) for col in columns]]
+    for result in results:
+        row = []
+        for col in columns:
+            value = result.get(col)
+            if value is None:
+                row.append('-')
+            elif isinstance(value, float):
+                row.append(f"{value:.4f}")
+            else:
+                row.append(str(value))
+        rows.append(row)
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    return "\n".join(
+        "  ".join(cell.ljust(width) for cell, width in zip(row, widths))
+        for row in rows
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m scrapey.benchmark')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ocr_parser = subparsers.add_parser('ocr', help='Compare OCR engines for speed and accuracy')
+    ocr_parser.add_argument('corpus', help='Directory of page images with optional .txt ground truth')
+    ocr_parser.add_argument('--config', action='append', choices=list(OCR_CONFIGS),
+                            help='Configuration to run (repeatable, default: all)')
+
+    pdf_parser = subparsers.add_parser('pdf', help='Compare PDF text-layer backends')
+    pdf_parser.add_argument('files', nargs='+', help='PDF files to extract')
+    pdf_parser.add_argument('--backend', action='append',
+                            help='Backend to run (repeatable, default: all installed)')
+    pdf_parser.add_argument('--workers', type=int, default=None,
+                            help='Processes for sharded extraction (default: pdf_workers setting)')
+
+    args = parser.parse_args(argv)
+    load_settings()
+
+    if args.command == 'ocr':
+        results = benchmark_ocr(args.corpus, args.config)
+        print(format_table(results, ['config', 'pages', 'warmup_s', 'per_page_s', 'cer']))
+    elif args.command == 'pdf':
+        results = benchmark_pdf(args.files, args.backend, args.workers)
+        print(format_table(results, [
+            'backend', 'file', 'pages', 'count_cold_s', 'count_warm_s',
+            'serial_s', 'sharded_s', 'chars'
+        ]))
+    return 0
+
+
+if __name__ == "__main__":
+    logging.getLogger().setLevel(logging.WARNING)
+    sys.exit(main())
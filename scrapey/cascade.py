@@ -0,0 +1,217 @@
+"""
+Confidence-gated OCR cascade.
+
+Every page first gets a cheap Tesseract pass at reduced resolution. Word-level
+confidences from that pass decide what happens next:
+
+* lines whose mean confidence is below 'cascade_min_confidence' are cropped
+  from a full-resolution render and re-read with the escalation engine;
+* pages where most lines are weak, or where nothing was recognised but the
+  page has ink on it, are re-read in full with the escalation engine.
+
+Clean pages therefore cost a single low-DPI Tesseract pass, and the expensive
+engine only sees the parts that need it.
+"""
+import logging
+from PIL import Image
+from scrapey.utils import app_settings
+from scrapey.ocr import ocr_image
+from scrapey.layout import tesseract_layout
+
+# Extra pixels kept around a low-confidence line when it is re-read, so
+# descenders and slightly misplaced boxes are not clipped.
+LINE_PADDING = 4
+
+# A page the cheap pass found no words on is only re-read if more than
+# MIN_INK_FRACTION of its pixels are darker than INK_LEVEL. Blank separator
+# sheets and duplex backs stay below it despite dust and faint show-through.
+INK_LEVEL = 160
+MIN_INK_FRACTION = 0.0005
+
+
+class _Line:
+    __slots__ = ('key', 'words', 'confidences', 'box')
+
+    def __init__(self, key):
+        self.key = key
+        self.words = []
+        self.confidences = []
+        self.box = None
+
+    def add(self, word, confidence, box):
+        self.words.append(word)
+        self.confidences.append(confidence)
+        if self.box is None:
+            self.box = box
+        else:
+            self.box = (
+                min(self.box[0], box[0]), min(self.box[1], box[1]),
+                max(self.box[2], box[2]), max(self.box[3], box[3]),
+            )
+
+    @property
+    def confidence(self):
+        return sum(self.confidences) / len(self.confidences)
+
+    @property
+    def text(self):
+        return " ".join(self.words)
+
+
+def read_lines(image):
+    """Run Tesseract on an image and group its words into lines.
+
+    Returns:
+        list: _Line objects in reading order, keyed by (paragraph, line)
+    """
+    layout = tesseract_layout(image)
+    lines = {}
+    for i in range(len(layout)):
+        key = (int(layout.paragraph_ids[i]), int(layout.line_ids[i]))
+        line = lines.get(key)
+        if line is None:
+            line = lines[key] = _Line(key)
+        line.add(layout.word(i), float(layout.confidences[i]), tuple(layout.boxes[i].tolist()))
+    return list(lines.values())
+
+
+def ink_fraction(image):
+    """Fraction of an image's pixels darker than INK_LEVEL."""
+    histogram = image.convert('L').histogram()
+    return sum(histogram[:INK_LEVEL]) / max(1, image.width * image.height)
+
+
+def merge_lines(lines, replacements):
+    """Join lines back into page text, starting a new paragraph where Tesseract did."""
+    parts = []
+    previous = None
+    for line in lines:
+        if previous is not None and line.key[0] != previous[0]:
+            parts.append("")
+        parts.append(replacements.get(line.key, line.text))
+        previous = line.key
+    return "\n".join(parts)
+
+
+def cascade_page(low_image, render_high, scale):
+    """OCR one page through the cascade.
+
+    Args:
+        low_image: Grayscale PIL image for the cheap pass
+        render_high: Callable returning the full-resolution grayscale image;
+            only called when something on the page needs escalating
+        scale: Ratio of full-resolution to low-resolution pixel size
+
+    Returns:
+        tuple: (text, escalation) where escalation is 'none', 'lines', 'page',
+            or 'blank' for a page with no words and no ink
+    """
+    engine = app_settings.get('cascade_escalation_engine', 'easyocr')
+    threshold = app_settings.get('cascade_min_confidence', 70)
+    max_weak_fraction = app_settings.get('cascade_max_weak_fraction', 0.5)
+
+    lines = read_lines(low_image)
+    if not lines:
+        if ink_fraction(low_image) <= MIN_INK_FRACTION:
+            return "", 'blank'
+        # Ink but no words at low resolution: the page may be faint or small print
+        return ocr_image(render_high(), engine), 'page'
+    weak = [line for line in lines if line.confidence < threshold]
+    if not weak:
+        return merge_lines(lines, {}), 'none'
+
+    high_image = render_high()
+    if len(weak) > max_weak_fraction * len(lines):
+        return ocr_image(high_image, engine), 'page'
+
+    replacements = {}
+    for line in weak:
+        left, top, right, bottom = line.box
+        crop_box = (
+            max(0, int(left * scale) - LINE_PADDING),
+            max(0, int(top * scale) - LINE_PADDING),
+            min(high_image.width, int(right * scale) + LINE_PADDING),
+            min(high_image.height, int(bottom * scale) + LINE_PADDING),
+        )
+        crop = high_image.crop(crop_box)
+        if engine.lower() == 'tesseract':
+            # Page segmentation mode 7: treat the crop as a single text line
+            text = ocr_image(crop, engine, tesseract_config='--psm 7')
+        else:
+            text = ocr_image(crop, engine)
+        text = " ".join(text.split())
+        if text:
+            replacements[line.key] = text
+    return merge_lines(lines, replacements), 'lines'
+
+
+def cascade_ocr_image(image):
+    """Run the cascade on a grayscale PIL image.
+
+    The cheap pass reads a copy downscaled by 'cascade_image_scale'.
+    """
+    scale = app_settings.get('cascade_image_scale', 0.5)
+    if scale >= 1:
+        low_image = image
+    else:
+        size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+        low_image = image.resize(size, Image.Resampling.BILINEAR)
+    text, escalation = cascade_page(low_image, lambda: image, image.width / low_image.width)
+    logging.info(f"Cascade OCR finished with escalation: {escalation}")
+    return text
+
+
+def cascade_ocr_pdf(pdf_path, page_range=None, deduper=None):
+    """Run the cascade over the pages of a scanned PDF.
+
+    Pages are rendered one at a time at 'cascade_low_dpi'; a page is only
+    rendered again at 'cascade_high_dpi' when it needs escalating. With a
+    PageDeduper, pages matching one already seen skip the cascade entirely.
+    """
+    from pdf2image import convert_from_path, pdfinfo_from_path
+
+    low_dpi = app_settings.get('cascade_low_dpi', 150)
+    high_dpi = app_settings.get('cascade_high_dpi', 300)
+    try:
+        total_pages = pdfinfo_from_path(pdf_path)['Pages']
+        if page_range:
+            start_page = max(0, page_range[0] - 1)  # Convert to 0-based
+            end_page = min(total_pages, page_range[1])  # Already 1-based
+        else:
+            start_page = 0
+            end_page = total_pages
+
+        def render(page_number, dpi):
+            return convert_from_path(
+                pdf_path, dpi=dpi, first_page=page_number,
+                last_page=page_number, grayscale=True
+            )[0]
+
+        counts = {'none': 0, 'lines': 0, 'page': 0, 'blank': 0}
+        text_parts = []
+        for page_num in range(start_page, end_page):
+            low_image = render(page_num + 1, low_dpi)
+
+            def ocr_low_page():
+                text, escalation = cascade_page(
+                    low_image,
+                    lambda: render(page_num + 1, high_dpi),
+                    high_dpi / low_dpi
+                )
+                counts[escalation] += 1
+                return text
+
+            text = deduper.run(low_image, ocr_low_page) if deduper else ocr_low_page()
+            if text:
+                text_parts.append(f"=== Page {page_num + 1} ===\n{text}\n")
+
+        logging.info(
+            f"Cascade OCR of {pdf_path}: {counts['none']} pages clean, "
+            f"{counts['lines']} with re-read lines, {counts['page']} fully re-read, "
+            f"{counts['blank']} blank"
+        )
+        return "\n".join(text_parts)
+
+    except Exception as e:
+        logging.exception("Error during cascade PDF OCR:")
+        raise
@@ -0,0 +1,314 @@
+"""
+Same-site crawling for web extraction.
+
+Starting from one or more seed URLs, pages are fetched concurrently with
+aiohttp and their in-scope links followed up to a maximum depth. Linked PDFs
+and images are streamed from the crawl's own response into the download
+cache and extracted like direct web sources. A page's text is handed to the
+caller as soon as it has been extracted.
+
+The frontier only stores 8-byte digests of normalised URLs and page text, so
+a crawl of hundreds of thousands of pages stays small in memory. Each host
+gets its own connection limit and a minimum delay between requests, and
+robots.txt is honoured.
+"""
+import asyncio
+import hashlib
+import logging
+import time
+import urllib.robotparser
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+from bs4 import BeautifulSoup
+from scrapey.utils import app_settings
+from scrapey.web import DocumentWriter, classify_content, document_suffix, extract_document
+
+USER_AGENT = "Scrapey/1.0"
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url):
+    """Normalise a URL so trivially different spellings dedupe together.
+
+    Lower-cases the scheme and host, drops default ports and fragments,
+    sorts query parameters and gives an empty path a trailing slash.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = parts.path or '/'
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, path, query, ''))
+
+
+def _digest(value):
+    return hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest()
+
+
+def parse_page(html, base_url):
+    """Return (text, links) for an HTML page."""
+    soup = BeautifulSoup(html, "html.parser")
+    links = []
+    for anchor in soup.find_all('a', href=True):
+        href = anchor['href'].strip()
+        if href and not href.startswith(('mailto:', 'javascript:', 'tel:')):
+            links.append(urljoin(base_url, href))
+    return soup.get_text(separator="\n"), links
+
+
+class Frontier:
+    """Deduplicated FIFO of (url, depth) still to be fetched."""
+
+    def __init__(self):
+        self._queue = asyncio.Queue()
+        self._seen = set()
+
+    def add(self, url, depth):
+        key = _digest(url)
+        if key in self._seen:
+            return False
+        self._seen.add(key)
+        self._queue.put_nowait((url, depth))
+        return True
+
+    @property
+    def seen(self):
+        return len(self._seen)
+
+    async def get(self):
+        return await self._queue.get()
+
+    def task_done(self):
+        self._queue.task_done()
+
+    async def join(self):
+        await self._queue.join()
+
+
+class HostLimiter:
+    """Per-host concurrency limit plus a minimum delay between requests."""
+
+    def __init__(self, per_host, delay):
+        self.per_host = per_host
+        self.delay = delay
+        self._semaphores = {}
+        self._locks = {}
+        self._last_request = {}
+
+    async def acquire(self, host):
+        semaphore = self._semaphores.setdefault(host, asyncio.Semaphore(self.per_host))
+        await semaphore.acquire()
+        if self.delay:
+            lock = self._locks.setdefault(host, asyncio.Lock())
+            async with lock:
+                wait = self._last_request.get(host, 0) + self.delay - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                self._last_request[host] = time.monotonic()
+
+    def release(self, host):
+        self._semaphores[host].release()
+
+
+class SiteCrawler:
+    """Crawl seed URLs and the in-scope pages they link to.
+
+    Args:
+        seeds: Seed URLs
+        max_depth: Link hops to follow from the seeds (0 = seeds only)
+        max_pages: Stop after this many pages have been extracted
+        concurrency: Simultaneous fetches across all hosts
+        per_host: Simultaneous fetches per host
+        delay: Minimum seconds between requests to the same host
+        on_page: Callback(url, text) called as each page is extracted
+        engine: OCR engine for linked scans and images, defaults to the
+            'default_ocr_engine' setting
+    """
+
+    def __init__(self, seeds, max_depth=2, max_pages=None, concurrency=None,
+                 per_host=None, delay=None, on_page=None, engine=None):
+        self.seeds = [normalize_url(seed) for seed in seeds]
+        self.max_depth = max_depth
+        self.max_pages = max_pages or app_settings.get('crawl_max_pages', 500)
+        self.concurrency = concurrency or app_settings.get('crawl_concurrency', 8)
+        per_host = per_host or app_settings.get('crawl_per_host', 2)
+        delay = app_settings.get('crawl_delay', 0.5) if delay is None else delay
+        self.limiter = HostLimiter(per_host, delay)
+        self.on_page = on_page
+        self.engine = engine
+        self.pages = 0
+        self.duplicates = 0
+        self._content_hashes = set()
+        self._robots = {}
+        # Scope: same host as a seed, at or below the seed's directory
+        self._scopes = []
+        for seed in self.seeds:
+            parts = urlsplit(seed)
+            prefix = parts.path.rsplit('/', 1)[0] + '/'
+            self._scopes.append((parts.scheme, parts.netloc, prefix))
+
+    def in_scope(self, url):
+        parts = urlsplit(url)
+        return any(
+            parts.scheme == scheme and parts.netloc == netloc and parts.path.startswith(prefix)
+            for scheme, netloc, prefix in self._scopes
+        )
+
+    async def _allowed(self, session, url):
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        parser = self._robots.get(origin)
+        if parser is None:
+            parser = urllib.robotparser.RobotFileParser()
+            try:
+                async with session.get(origin + '/robots.txt') as response:
+                    if response.status == 200:
+                        parser.parse((await response.text()).splitlines())
+                    else:
+                        parser.allow_all = True
+            except Exception:
+                parser.allow_all = True
+            self._robots[origin] = parser
+        return parser.can_fetch(USER_AGENT, url)
+
+    async def _fetch(self, session, url):
+        """Return (final_url, kind, body) or None for failed and unsupported pages.
+
+        body is the text of HTML and text pages, and the path of the
+        downloaded file for PDFs and images.
+        """
+        host = urlsplit(url).netloc
+        await self.limiter.acquire(host)
+        try:
+            async with session.get(url) as response:
+                if response.status != 200:
+                    logging.warning(f"Crawl: {url} returned {response.status}")
+                    return None
+                final_url = str(response.url)
+                kind = classify_content(response.headers.get('Content-Type', ''), final_url)
+                if kind in ('html', 'text'):
+                    return final_url, kind, await response.text(errors='replace')
+                if kind in ('pdf', 'image'):
+                    return final_url, kind, await self._download(response, kind, final_url)
+                return None
+        except Exception as e:
+            logging.warning(f"Crawl: failed to fetch {url}: {e}")
+            return None
+        finally:
+            self.limiter.release(host)
+
+    @staticmethod
+    async def _download(response, kind, url):
+        # The body is streamed into the download cache from this response, so
+        # a linked document is requested once, with the crawl's User-Agent.
+        content_type = response.headers.get('Content-Type', '')
+        writer = DocumentWriter(document_suffix(kind, url, content_type))
+        try:
+            chunk_size = app_settings.get('download_chunk_size', 1024 * 1024)
+            async for chunk in response.content.iter_chunked(chunk_size):
+                writer.write(chunk)
+            path, sha256 = writer.finish()
+        except BaseException:
+            writer.discard()
+            raise
+        logging.info(f"Crawl: downloaded {url} ({writer.size} bytes, sha256 {sha256})")
+        return path
+
+    async def _worker(self, session, frontier):
+        loop = asyncio.get_running_loop()
+        while True:
+            url, depth = await frontier.get()
+            try:
+                if self.pages >= self.max_pages or not await self._allowed(session, url):
+                    continue
+                fetched = await self._fetch(session, url)
+                if fetched is None:
+                    continue
+                final_url, kind, body = fetched
+                links = []
+                if kind == 'html':
+                    # Parsing is CPU-bound; keep it off the event loop
+                    text, links = await loop.run_in_executor(None, parse_page, body, final_url)
+                elif kind == 'text':
+                    text = body
+                else:
+                    # PDF extraction and OCR are CPU-bound too
+                    text = await loop.run_in_executor(
+                        None, extract_document, body, kind, self.engine
+                    )
+
+                content_key = _digest(" ".join(text.split()))
+                if content_key in self._content_hashes:
+                    self.duplicates += 1
+                    continue
+                self._content_hashes.add(content_key)
+                if self.pages >= self.max_pages:
+                    continue
+                self.pages += 1
+                if self.on_page:
+                    self.on_page(final_url, text)
+
+                if depth < self.max_depth:
+                    for link in links:
+                        link = normalize_url(link)
+                        if self.in_scope(link):
+                            frontier.add(link, depth + 1)
+            except Exception:
+                logging.exception(f"Crawl: error processing {url}:")
+            finally:
+                frontier.task_done()
+
+    async def run(self):
+        import aiohttp
+
+        frontier = Frontier()
+        for seed in self.seeds:
+            frontier.add(seed, 0)
+
+        timeout = aiohttp.ClientTimeout(total=60)
+        headers = {'User-Agent': USER_AGENT}
+        async with aiohttp.ClientSession(timeout=timeout, headers=headers) as session:
+            workers = [
+                asyncio.create_task(self._worker(session, frontier))
+                for _ in range(self.concurrency)
+            ]
+            try:
+                await frontier.join()
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+
+        logging.info(
+            f"Crawl finished: {self.pages} pages extracted, {frontier.seen} URLs seen, "
+            f"{self.duplicates} duplicate pages skipped"
+        )
+        return self.pages
+
+
+def crawl_web_text(seeds, max_depth=2, on_page=None, **options):
+    """Crawl from seed URLs and return the text of every page found.
+
+    Args:
+        seeds: A seed URL or list of seed URLs
+        max_depth: Link hops to follow from the seeds
+        on_page: Optional callback(url, text) called as each page arrives
+        options: Passed through to SiteCrawler, e.g. engine
+
+    Returns:
+        str: Page texts, each under an "=== url ===" header
+    """
+    if isinstance(seeds, str):
+        seeds = [seeds]
+    parts = []
+
+    def collect(url, text):
+        parts.append(f"=== {url} ===\n{text}\n")
+        if on_page:
+            on_page(url, text)
+
+    crawler = SiteCrawler(seeds, max_depth=max_depth, on_page=collect, **options)
+    asyncio.run(crawler.run())
+    return "\n".join(parts)
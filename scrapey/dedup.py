@@ -0,0 +1,239 @@
+"""
+Perceptual-hash deduplication of OCR pages.
+
+Scanned batches often repeat the same page (cover sheets, fax headers,
+duplicate scans). Each rendered page is reduced to a perceptual hash; a page
+whose hash is within 'dedup_max_distance' bits of a page already OCR'd in the
+batch reuses that page's text instead of running the engine again.
+
+A hash match is only a candidate. Filled-in copies of one form (a different
+invoice number, a rewritten line) hash the same, so each page also keeps a
+larger grayscale fingerprint, and the text is reused only if no small window
+of the two fingerprints differs by more than 'dedup_max_pixel_difference'.
+"""
+import logging
+import time
+import zlib
+from collections import namedtuple
+import numpy as np
+from PIL import Image
+from scrapey.utils import app_settings
+
+# Number of set bits in every byte value, for vectorized Hamming distances
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+# Long side of the fingerprint used to confirm a hash match, and the side
+# of the square window whose mean difference must stay under the threshold.
+# A changed digit in 8pt print at 300 DPI is a few such windows.
+FINGERPRINT_SIDE = 640
+FINGERPRINT_WINDOW = 4
+
+_dct_matrices = {}
+
+PageSignature = namedtuple('PageSignature', ['hash', 'shape', 'fingerprint'])
+
+
+def _dct_matrix(n):
+    matrix = _dct_matrices.get(n)
+    if matrix is None:
+        k = np.arange(n).reshape(-1, 1)
+        i = np.arange(n).reshape(1, -1)
+        matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+        _dct_matrices[n] = matrix
+    return matrix
+
+
+def dct_hash(image, hash_size=16):
+    """Perceptual hash from the low-frequency DCT coefficients of a page.
+
+    Returns:
+        numpy.ndarray: hash_size * hash_size bits packed into uint8
+    """
+    size = hash_size * 4
+    pixels = np.asarray(
+        image.convert('L').resize((size, size), Image.Resampling.BILINEAR),
+        dtype=np.float64
+    )
+    matrix = _dct_matrix(size)
+    coefficients = (matrix @ pixels @ matrix.T)[:hash_size, :hash_size]
+    # The DC term only reflects overall brightness; leave it out of the median
+    median = np.median(coefficients.ravel()[1:])
+    return np.packbits(coefficients > median)
+
+
+def average_hash(image, hash_size=16):
+    """Cheaper hash: which cells of a downscaled page are brighter than average."""
+    pixels = np.asarray(
+        image.convert('L').resize((hash_size, hash_size), Image.Resampling.BILINEAR),
+        dtype=np.float64
+    )
+    return np.packbits(pixels > pixels.mean())
+
+
+HASH_METHODS = {
+    'dct': dct_hash,
+    'average': average_hash,
+}
+
+
+def fingerprint(image, side=FINGERPRINT_SIDE):
+    """Grayscale copy of a page with its long side scaled to side pixels."""
+    scale = min(1.0, side / max(image.size))
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return np.asarray(image.convert('L').resize(size, Image.Resampling.BOX))
+
+
+def pixel_difference(a, b, window=FINGERPRINT_WINDOW):
+    """Largest mean absolute difference of any window x window square of two fingerprints.
+
+    A whole-page mean would hide a changed number in the noise of the rest
+    of the page; a local maximum does not. Fingerprints of different sizes
+    are never the same page.
+    """
+    if a.shape != b.shape:
+        return float('inf')
+    window = min(window, *a.shape)
+    diff = np.abs(a.astype(np.int32) - b.astype(np.int32))
+    sums = np.zeros((diff.shape[0] + 1, diff.shape[1] + 1), dtype=np.int64)
+    np.cumsum(np.cumsum(diff, axis=0), axis=1, out=sums[1:, 1:])
+    window_sums = (
+        sums[window:, window:] - sums[:-window, window:]
+        - sums[window:, :-window] + sums[:-window, :-window]
+    )
+    return float(window_sums.max()) / (window * window)
+
+
+class PageDeduper:
+    """Remembers OCR results by perceptual hash for the pages of one batch.
+
+    Args:
+        max_distance: Largest Hamming distance treated as a candidate match.
+            Defaults to the 'dedup_max_distance' setting.
+        method: 'dct' or 'average'. Defaults to the 'dedup_hash' setting.
+        hash_size: Hash is hash_size * hash_size bits
+        max_pixel_difference: Largest pixel_difference() (0-255) between
+            fingerprints that confirms a candidate. Defaults to the
+            'dedup_max_pixel_difference' setting.
+    """
+
+    def __init__(self, max_distance=None, method=None, hash_size=16, max_pixel_difference=None):
+        if max_distance is None:
+            max_distance = app_settings.get('dedup_max_distance', 6)
+        if max_pixel_difference is None:
+            max_pixel_difference = app_settings.get('dedup_max_pixel_difference', 6.0)
+        self.max_distance = max_distance
+        self.max_pixel_difference = max_pixel_difference
+        self.hash_function = HASH_METHODS[method or app_settings.get('dedup_hash', 'dct')]
+        self.hash_size = hash_size
+        self._hashes = np.empty((16, hash_size * hash_size // 8), dtype=np.uint8)
+        # Fingerprints are kept zlib-compressed; blank margins make them small
+        self._signatures = []
+        self._texts = []
+        self._seconds = []
+        self.pages = 0
+        self.deduplicated = 0
+        self.rejected = 0
+        self.saved_seconds = 0.0
+
+    def signature(self, image):
+        """Hash and fingerprint a page."""
+        pixels = fingerprint(image)
+        return PageSignature(
+            self.hash_function(image, self.hash_size), pixels.shape, zlib.compress(pixels.tobytes(), 1)
+        )
+
+    @staticmethod
+    def _pixels(signature):
+        return np.frombuffer(zlib.decompress(signature.fingerprint), dtype=np.uint8).reshape(signature.shape)
+
+    def _confirmed(self, signature, other, pixels=None):
+        if pixels is None:
+            pixels = self._pixels(signature)
+        if pixel_difference(pixels, self._pixels(other)) <= self.max_pixel_difference:
+            return True
+        self.rejected += 1
+        logging.info("Page hash matches an earlier page but its pixels differ, running OCR")
+        return False
+
+    def _find(self, signature):
+        count = len(self._texts)
+        if not count:
+            return None
+        distances = _POPCOUNT[self._hashes[:count] ^ signature.hash].sum(axis=1)
+        pixels = None
+        # Closest hashes first; each candidate is confirmed on pixels
+        for index in np.argsort(distances, kind='stable'):
+            if distances[index] > self.max_distance:
+                break
+            if pixels is None:
+                pixels = self._pixels(signature)
+            if self._confirmed(signature, self._signatures[index], pixels):
+                return int(index)
+        return None
+
+    def _add(self, signature, text, seconds):
+        count = len(self._texts)
+        if count == len(self._hashes):
+            self._hashes = np.concatenate([self._hashes, np.empty_like(self._hashes)])
+        self._hashes[count] = signature.hash
+        self._signatures.append(signature)
+        self._texts.append(text)
+        self._seconds.append(seconds)
+
+    def match(self, image):
+        """Hash a page and look for a near-duplicate seen earlier.
+
+        For callers that OCR pages asynchronously; pass the hash to
+        remember() once the page's text is known.
+
+        Returns:
+            tuple: (PageSignature, earlier text or None)
+        """
+        self.pages += 1
+        signature = self.signature(image)
+        match = self._find(signature)
+        if match is None:
+            return signature, None
+        self.reused(self._seconds[match])
+        return signature, self._texts[match]
+
+    def same_page(self, signature_a, signature_b):
+        """Whether two page signatures are close in hash and confirmed on pixels."""
+        if int(_POPCOUNT[signature_a.hash ^ signature_b.hash].sum()) > self.max_distance:
+            return False
+        return self._confirmed(signature_a, signature_b)
+
+    def remember(self, signature, text, seconds):
+        """Record the OCR result of a page that match() did not find."""
+        self._add(signature, text, seconds)
+
+    def reused(self, seconds):
+        """Count a page whose text was taken from an earlier page's OCR."""
+        self.deduplicated += 1
+        self.saved_seconds += seconds
+        logging.info("Page matches an earlier page in the batch, reusing its OCR result")
+
+    def run(self, image, ocr):
+        """Return the OCR text for a page, reusing a near-duplicate's result.
+
+        Args:
+            image: PIL image of the rendered page
+            ocr: Callable taking no arguments that OCRs the page
+
+        Returns:
+            str: The page text
+        """
+        signature, text = self.match(image)
+        if text is not None:
+            return text
+
+        start = time.perf_counter()
+        text = ocr()
+        self.remember(signature, text, time.perf_counter() - start)
+        return text
+
+    def summary(self):
+        return (
+            f"Deduplicated {self.deduplicated} of {self.pages} pages, "
+            f"saving about {self.saved_seconds:.1f}s of OCR"
+        )
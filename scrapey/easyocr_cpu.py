@@ -0,0 +1,171 @@
+import hashlib
+import logging
+import os
+from scrapey.utils import app_settings
+
+# Readers are expensive to build (weights are loaded from disk and, in fast
+# mode, converted), so keep one per configuration for the life of the process.
+_readers = {}
+
+# The 'ocr_language' setting holds Tesseract codes; EasyOCR names languages
+# differently. Codes not listed are passed through as EasyOCR codes.
+TESSERACT_TO_EASYOCR = {
+    'eng': 'en',
+    'fra': 'fr',
+    'deu': 'de',
+    'spa': 'es',
+    'ita': 'it',
+    'por': 'pt',
+    'nld': 'nl',
+    'pol': 'pl',
+    'rus': 'ru',
+    'ukr': 'uk',
+    'ara': 'ar',
+    'hin': 'hi',
+    'chi_sim': 'ch_sim',
+    'chi_tra': 'ch_tra',
+    'jpn': 'ja',
+    'kor': 'ko',
+}
+
+
+def easyocr_languages(languages):
+    """Translate Tesseract language codes (e.g. 'eng', 'eng+deu') to EasyOCR codes."""
+    result = []
+    for language in languages:
+        for code in language.split('+'):
+            code = TESSERACT_TO_EASYOCR.get(code, code)
+            if code not in result:
+                result.append(code)
+    return result
+
+
+def get_easyocr_reader(languages, fast_cpu=None, torchscript=None, full_precision=None):
+    """Return a cached EasyOCR reader for the given languages.
+
+    Args:
+        languages: List of language codes, EasyOCR's or Tesseract's
+        fast_cpu: Use the int8-quantized, channels-last CPU models, cached
+            on disk. Defaults to the 'easyocr_fast_cpu' setting.
+        torchscript: Also trace the detector with TorchScript (fast mode only).
+            Defaults to the 'easyocr_torchscript' setting.
+        full_precision: Turn off EasyOCR's own int8 quantization on CPU
+            (standard mode only), for benchmarking. Defaults to the
+            'easyocr_full_precision' setting.
+
+    Returns:
+        easyocr.Reader: A reader ready for readtext()
+    """
+    languages = easyocr_languages(languages)
+    if fast_cpu is None:
+        fast_cpu = app_settings.get('easyocr_fast_cpu', False)
+    if torchscript is None:
+        torchscript = app_settings.get('easyocr_torchscript', False)
+    if full_precision is None:
+        full_precision = app_settings.get('easyocr_full_precision', False)
+    key = (
+        tuple(languages), bool(fast_cpu), bool(fast_cpu and torchscript),
+        bool(not fast_cpu and full_precision),
+    )
+    reader = _readers.get(key)
+    if reader is None:
+        import easyocr
+        if fast_cpu:
+            reader = _build_fast_reader(languages, torchscript)
+        elif full_precision:
+            reader = easyocr.Reader(languages, quantize=False)
+        else:
+            reader = easyocr.Reader(languages)
+        _readers[key] = reader
+    return reader
+
+
+def clear_reader_cache():
+    """Drop all cached readers so the next call rebuilds them."""
+    _readers.clear()
+
+
+def _cache_paths(languages, torchscript):
+    import easyocr
+    import torch
+    key = "|".join([
+        easyocr.__version__,
+        torch.__version__,
+        ",".join(sorted(languages)),
+        "ts" if torchscript else "eager",
+    ])
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    cache_dir = os.path.join(app_settings.get('model_cache_dir'), 'easyocr')
+    os.makedirs(cache_dir, exist_ok=True)
+    return (
+        os.path.join(cache_dir, f"{digest}-recognizer.pt"),
+        os.path.join(cache_dir, f"{digest}-detector.pt"),
+    )
+
+
+def _build_fast_reader(languages, torchscript=False):
+    """Build a CPU reader whose models are converted once and cached on disk.
+
+    The recognizer (LSTM + Linear head) gets dynamic int8 quantization. The
+    detector is purely convolutional, so dynamic quantization would be a no-op;
+    it is switched to channels-last instead and optionally traced.
+    """
+    import easyocr
+    import torch
+
+    # Load the stock full-precision weights; the converted modules replace
+    # them below, either from the disk cache or by converting now.
+    reader = easyocr.Reader(languages, gpu=False, quantize=False)
+    recognizer_path, detector_path = _cache_paths(languages, torchscript)
+
+    try:
+        if os.path.exists(recognizer_path):
+            reader.recognizer = torch.load(recognizer_path, map_location='cpu', weights_only=False)
+        else:
+            reader.recognizer = _convert_recognizer(reader.recognizer)
+            torch.save(reader.recognizer, recognizer_path)
+            logging.info(f"Cached quantized EasyOCR recognizer at {recognizer_path}")
+
+        if os.path.exists(detector_path):
+            if torchscript:
+                reader.detector = torch.jit.load(detector_path, map_location='cpu')
+            else:
+                reader.detector = torch.load(detector_path, map_location='cpu', weights_only=False)
+        else:
+            reader.detector = _convert_detector(reader.detector, torchscript)
+            if torchscript:
+                torch.jit.save(reader.detector, detector_path)
+            else:
+                torch.save(reader.detector, detector_path)
+            logging.info(f"Cached converted EasyOCR detector at {detector_path}")
+    except Exception:
+        # A stale or corrupt cache must never break OCR; fall back to the
+        # stock reader and let the next run rebuild the cache.
+        logging.exception("Fast EasyOCR conversion failed, using stock models:")
+        for path in (recognizer_path, detector_path):
+            if os.path.exists(path):
+                os.remove(path)
+        return easyocr.Reader(languages, gpu=False)
+
+    return reader
+
+
+def _convert_recognizer(model):
+    import torch
+    model.eval()
+    return torch.quantization.quantize_dynamic(
+        model, {torch.nn.LSTM, torch.nn.Linear}, dtype=torch.qint8
+    )
+
+
+def _convert_detector(model, torchscript=False):
+    import torch
+    model.eval()
+    # Channels-last weights make PyTorch pick the faster NHWC convolution
+    # kernels on CPU; the input tensor is converted by the first layer.
+    model = model.to(memory_format=torch.channels_last)
+    if torchscript:
+        with torch.no_grad():
+            example = torch.zeros(1, 3, 640, 640)
+            return torch.jit.trace(model, example, check_trace=False)
+    return model
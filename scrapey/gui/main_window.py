@@ -5,6 +5,7 @@ import csv
 import threading
 import tempfile
 import os
+import shutil
 from PIL import Image
 from PySide6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel,
@@ -17,6 +18,11 @@ from scrapey.utils import app_settings, save_settings
 from scrapey.ocr import perform_ocr, ocr_scanned_pdf
 from scrapey.pdf import extract_pdf_text, get_pdf_page_count
 from scrapey.web import extract_web_text
+from scrapey.crawl import crawl_web_text
+from scrapey.images import is_multi_frame, get_image_frame_count
+from scrapey.dedup import PageDeduper
+from scrapey.layout import LAYOUT_ENGINES, layout_store
+from scrapey.searchable_pdf import SearchablePDFWriter, write_searchable_pages
 from .preferences import open_preferences
 from .preview import open_preview
 
@@ -24,33 +30,57 @@ class ScrapeWorker(QThread):
     finished = Signal(str)
     error = Signal(str)
     progress = Signal(int, int)  # current, total
+    crawled = Signal(str)  # url of each page as a crawl extracts it
+    summary = Signal(str)  # run statistics, emitted just before finished
     
-    def __init__(self, sources, source_type, engine=None, selected_region=None, page_range=None):
+    def __init__(self, sources, source_type, engine=None, selected_region=None, page_range=None,
+                 crawl_depth=None, dedup=False, searchable_pdf=None):
         super().__init__()
         self.sources = sources if isinstance(sources, list) else [sources]
         self.source_type = source_type
         self.engine = engine
         self.selected_region = selected_region
         self.page_range = page_range
+        self.crawl_depth = crawl_depth
+        self.dedup = dedup
+        self.searchable_pdf = searchable_pdf
         
     def run(self):
+        writer = None
         try:
             logging.info("Scraping started.")
             results = []
+            # One deduper per run, so repeated pages are caught across files
+            deduper = PageDeduper() if self.dedup else None
             total_sources = len(self.sources)
+            # Pages are appended as each is OCR'd, from the same engine pass
+            writer = SearchablePDFWriter(self.searchable_pdf) if self.searchable_pdf else None
             
             for idx, source in enumerate(self.sources, 1):
                 self.progress.emit(idx, total_sources)
                 
-                if self.source_type == "Web":
-                    result = extract_web_text(source)
+                if self.source_type == "Web" and self.crawl_depth is not None:
+                    result = crawl_web_text(
+                        source.split(),
+                        self.crawl_depth,
+                        on_page=lambda url, text: self.crawled.emit(url),
+                        engine=self.engine
+                    )
+                elif self.source_type == "Web":
+                    result = extract_web_text(source, self.engine)
                 elif self.source_type == "PDF":
                     result = extract_pdf_text(source, self.page_range)
+                elif self.source_type == "Image OCR" and writer:
+                    result = write_searchable_pages(source, writer, self.engine, self.page_range, deduper)
                 elif self.source_type == "Image OCR":
                     if source.lower().endswith(".pdf"):
-                        result = ocr_scanned_pdf(source, self.engine, self.page_range)
+                        result = ocr_scanned_pdf(source, self.engine, self.page_range, deduper)
                     else:
-                        if self.selected_region:
+                        if self.selected_region and self.engine.lower() in LAYOUT_ENGINES:
+                            # Word boxes are kept per image, so a new or adjusted
+                            # region is a box query rather than another OCR pass
+                            result = layout_store.query(source, self.selected_region, self.engine)
+                        elif self.selected_region:
                             with Image.open(source) as img:
                                 cropped = img.crop(self.selected_region)
                                 with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmp:
@@ -59,22 +89,30 @@ class ScrapeWorker(QThread):
                             result = perform_ocr(temp_filename, self.engine)
                             os.remove(temp_filename)
                         else:
-                            result = perform_ocr(source, self.engine)
+                            result = perform_ocr(source, self.engine, self.page_range, deduper)
                 else:
                     result = "Unsupported source type"
                     
                 results.append(f"=== Results for {os.path.basename(source)} ===\n{result}\n")
                 
+            if writer:
+                writer.close()
+            if deduper:
+                logging.info(deduper.summary())
+                self.summary.emit(deduper.summary())
             self.finished.emit("\n".join(results))
             logging.info("Scraping completed successfully.")
         except Exception as e:
             logging.exception("Error during scraping:")
+            if writer:
+                writer.close()
             self.error.emit(str(e))
 
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.selected_region = None
+        self.searchable_pdf_path = None
         self.scrape_thread = None
         self.source_files = []
         self.init_ui()
@@ -127,9 +165,12 @@ class MainWindow(QMainWindow):
         ocr_layout = QHBoxLayout()
         ocr_label = QLabel("OCR Engine:")
         self.ocr_engine = QComboBox()
-        self.ocr_engine.addItems(["Tesseract", "EasyOCR"])
+        self.ocr_engine.addItems(["Tesseract", "EasyOCR", "Cascade"])
         ocr_layout.addWidget(ocr_label)
         ocr_layout.addWidget(self.ocr_engine)
+        self.dedup_check = QCheckBox("Skip duplicate pages")
+        self.dedup_check.setChecked(app_settings.get('dedup_pages', False))
+        ocr_layout.addWidget(self.dedup_check)
         ocr_layout.addStretch()
         layout.addLayout(ocr_layout)
         
@@ -149,11 +190,23 @@ class MainWindow(QMainWindow):
         page_layout.addStretch()
         layout.addLayout(page_layout)
         
+        # Crawl options for web sources
+        crawl_layout = QHBoxLayout()
+        self.crawl_check = QCheckBox("Crawl same-site links, depth:")
+        self.crawl_depth = QSpinBox()
+        self.crawl_depth.setRange(0, 10)
+        self.crawl_depth.setValue(app_settings.get('crawl_depth', 2))
+        
+        crawl_layout.addWidget(self.crawl_check)
+        crawl_layout.addWidget(self.crawl_depth)
+        crawl_layout.addStretch()
+        layout.addLayout(crawl_layout)
+        
         # Output format selection
         format_layout = QHBoxLayout()
         format_label = QLabel("Output Format:")
         self.output_format = QComboBox()
-        self.output_format.addItems(["Text", "JSON", "CSV", "HTML", "PDF"])
+        self.output_format.addItems(["Text", "JSON", "CSV", "HTML", "PDF", "Searchable PDF"])
         format_layout.addWidget(format_label)
         format_layout.addWidget(self.output_format)
         format_layout.addStretch()
@@ -184,10 +237,12 @@ class MainWindow(QMainWindow):
         self.save_button.clicked.connect(self.save_output)
         self.source_type.currentTextChanged.connect(self.update_gui)
         self.page_range_check.toggled.connect(self.toggle_page_range)
+        self.crawl_check.toggled.connect(self.crawl_depth.setEnabled)
         
         # Initial GUI update
         self.update_gui()
         self.toggle_page_range(False)
+        self.crawl_depth.setEnabled(False)
         
     def toggle_page_range(self, enabled):
         self.page_start.setEnabled(enabled)
@@ -199,8 +254,11 @@ class MainWindow(QMainWindow):
         
     def update_page_range(self, file_path):
         try:
-            if file_path.lower().endswith('.pdf'):
-                page_count = get_pdf_page_count(file_path)
+            if file_path.lower().endswith('.pdf') or is_multi_frame(file_path):
+                if file_path.lower().endswith('.pdf'):
+                    page_count = get_pdf_page_count(file_path)
+                else:
+                    page_count = get_image_frame_count(file_path)
                 self.page_start.setMaximum(page_count)
                 self.page_end.setMaximum(page_count)
                 self.page_end.setValue(page_count)
@@ -222,7 +280,7 @@ class MainWindow(QMainWindow):
             if source_type == "PDF":
                 file_filter = "PDF Files (*.pdf)"
             else:
-                file_filter = "Image Files (*.png *.jpg *.jpeg *.bmp);;PDF Files (*.pdf);;All Files (*.*)"
+                file_filter = "Image Files (*.png *.jpg *.jpeg *.bmp *.tif *.tiff);;PDF Files (*.pdf);;All Files (*.*)"
             
             # Create file dialog with native options
             dialog = QFileDialog(self)
@@ -266,21 +324,29 @@ class MainWindow(QMainWindow):
         source_type = self.source_type.currentText()
         if source_type == "Image OCR":
             self.ocr_engine.setEnabled(True)
+            self.dedup_check.setEnabled(True)
             self.browse_button.setEnabled(True)
             self.preview_button.setEnabled(True)
+            self.crawl_check.setEnabled(False)
+            self.crawl_check.setChecked(False)
             self.source_entry.setPlaceholderText("Select image files using Browse...")
         elif source_type == "PDF":
             self.ocr_engine.setEnabled(False)
+            self.dedup_check.setEnabled(False)
             self.browse_button.setEnabled(True)
             self.preview_button.setEnabled(False)
+            self.crawl_check.setEnabled(False)
+            self.crawl_check.setChecked(False)
             self.source_entry.setPlaceholderText("Select PDF files using Browse...")
         else:  # Web
-            self.ocr_engine.setEnabled(False)
+            self.ocr_engine.setEnabled(True)  # Used for linked PDFs and images
+            self.dedup_check.setEnabled(False)
             self.browse_button.setEnabled(False)
             self.preview_button.setEnabled(False)
             self.page_range_check.setEnabled(False)
             self.page_range_check.setChecked(False)
-            self.source_entry.setPlaceholderText("Enter a URL to scrape...")
+            self.crawl_check.setEnabled(True)
+            self.source_entry.setPlaceholderText("Enter a URL to scrape (or seed URLs to crawl)...")
             
     def run_scrape(self):
         if self.source_type.currentText() == "Web":
@@ -312,33 +378,63 @@ class MainWindow(QMainWindow):
         if self.page_range_check.isChecked():
             page_range = (self.page_start.value(), self.page_end.value())
         
+        # A searchable PDF is written during the scrape, from the same OCR pass
+        self.discard_searchable_pdf()
+        if (self.output_format.currentText() == "Searchable PDF"
+                and self.source_type.currentText() == "Image OCR"):
+            fd, self.searchable_pdf_path = tempfile.mkstemp(prefix="scrapey-", suffix=".pdf")
+            os.close(fd)
+        
         # Create and start worker thread
         self.scrape_thread = ScrapeWorker(
             sources,
             self.source_type.currentText(),
             self.ocr_engine.currentText() if self.ocr_engine.isEnabled() else None,
             self.selected_region,
-            page_range
+            page_range,
+            self.crawl_depth.value() if self.crawl_check.isChecked() else None,
+            self.dedup_check.isEnabled() and self.dedup_check.isChecked(),
+            self.searchable_pdf_path
         )
         self.scrape_thread.finished.connect(self.on_scrape_finished)
         self.scrape_thread.error.connect(self.on_scrape_error)
         self.scrape_thread.progress.connect(self.update_progress)
+        self.scrape_thread.crawled.connect(self.update_crawl_progress)
+        self.scrape_thread.summary.connect(self.set_run_summary)
+        self.crawled_pages = 0
+        self.run_summary = None
         self.scrape_thread.start()
         
     def update_progress(self, current, total):
         self.progress_bar.setValue(current)
         self.progress_bar.setFormat(f"Processing file {current} of {total}")
         
+    def update_crawl_progress(self, url):
+        self.crawled_pages += 1
+        self.progress_bar.setFormat(f"Crawled {self.crawled_pages} pages: {url}")
+        
+    def set_run_summary(self, summary):
+        self.run_summary = summary
+        
     def on_scrape_finished(self, result):
         self.output_text.setText(result)
-        self.progress_bar.setFormat("Processing complete")
+        if self.run_summary:
+            self.progress_bar.setFormat(f"Processing complete. {self.run_summary}")
+        else:
+            self.progress_bar.setFormat("Processing complete")
         self.scrape_button.setEnabled(True)
         
     def on_scrape_error(self, error_msg):
+        self.discard_searchable_pdf()
         QMessageBox.critical(self, "Error", error_msg)
         self.progress_bar.setFormat("Error occurred")
         self.scrape_button.setEnabled(True)
         
+    def discard_searchable_pdf(self):
+        if self.searchable_pdf_path and os.path.exists(self.searchable_pdf_path):
+            os.remove(self.searchable_pdf_path)
+        self.searchable_pdf_path = None
+        
     def save_output(self):
         text = self.output_text.toPlainText()
         if not text.strip():
@@ -361,6 +457,16 @@ class MainWindow(QMainWindow):
         elif out_format == "PDF":
             file_filter = "PDF Files (*.pdf)"
             default_suffix = ".pdf"
+        elif out_format == "Searchable PDF":
+            if not self.searchable_pdf_path:
+                QMessageBox.warning(
+                    self, "Warning",
+                    "A searchable PDF is made while scanned PDFs and images are OCR'd. "
+                    "Choose Searchable PDF before scraping with Image OCR."
+                )
+                return
+            file_filter = "PDF Files (*.pdf)"
+            default_suffix = ".pdf"
         else:
             QMessageBox.critical(self, "Error", "Unsupported output format")
             return
@@ -421,11 +527,14 @@ class MainWindow(QMainWindow):
                         for line in text.splitlines():
                             pdf.cell(0, 10, txt=line, ln=True)
                         pdf.output(filename)
+                    elif out_format == "Searchable PDF":
+                        shutil.copyfile(self.searchable_pdf_path, filename)
                         
                     QMessageBox.information(self, "Success", "Output saved successfully!")
                 except Exception as e:
                     QMessageBox.critical(self, "Error", f"Failed to save file: {str(e)}")
                 
     def closeEvent(self, event):
+        self.discard_searchable_pdf()
         save_settings()
         super().closeEvent(event) 
\ No newline at end of file
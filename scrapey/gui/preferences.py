@@ -1,7 +1,7 @@
 import logging
 from PySide6.QtWidgets import (
     QDialog, QVBoxLayout, QHBoxLayout, QLabel,
-    QComboBox, QPushButton, QMessageBox
+    QComboBox, QPushButton, QMessageBox, QCheckBox, QSpinBox
 )
 from scrapey.utils import app_settings, save_settings
 
@@ -20,7 +20,7 @@ class PreferencesDialog(QDialog):
         engine_layout = QHBoxLayout()
         engine_label = QLabel("Default OCR Engine:")
         self.engine_combo = QComboBox()
-        self.engine_combo.addItems(["Tesseract", "EasyOCR"])
+        self.engine_combo.addItems(["Tesseract", "EasyOCR", "Cascade"])
         current_engine = app_settings.get('default_ocr_engine', 'Tesseract')
         self.engine_combo.setCurrentText(current_engine)
         
@@ -40,11 +40,67 @@ class PreferencesDialog(QDialog):
         lang_layout.addWidget(self.lang_combo)
         layout.addLayout(lang_layout)
         
+        # EasyOCR CPU mode
+        self.fast_cpu_check = QCheckBox("Fast CPU EasyOCR (int8 quantized, cached models)")
+        self.fast_cpu_check.setChecked(app_settings.get('easyocr_fast_cpu', False))
+        layout.addWidget(self.fast_cpu_check)
+        
+        self.torchscript_check = QCheckBox("Use TorchScript for the EasyOCR detector")
+        self.torchscript_check.setChecked(app_settings.get('easyocr_torchscript', False))
+        self.torchscript_check.setEnabled(self.fast_cpu_check.isChecked())
+        self.fast_cpu_check.toggled.connect(self.torchscript_check.setEnabled)
+        layout.addWidget(self.torchscript_check)
+        
+        # Cascade settings
+        cascade_layout = QHBoxLayout()
+        cascade_label = QLabel("Cascade: re-read below confidence")
+        self.cascade_confidence = QSpinBox()
+        self.cascade_confidence.setRange(0, 100)
+        self.cascade_confidence.setValue(app_settings.get('cascade_min_confidence', 70))
+        cascade_engine_label = QLabel("with")
+        self.cascade_engine_combo = QComboBox()
+        self.cascade_engine_combo.addItems(["easyocr", "tesseract"])
+        self.cascade_engine_combo.setCurrentText(app_settings.get('cascade_escalation_engine', 'easyocr'))
+        
+        cascade_layout.addWidget(cascade_label)
+        cascade_layout.addWidget(self.cascade_confidence)
+        cascade_layout.addWidget(cascade_engine_label)
+        cascade_layout.addWidget(self.cascade_engine_combo)
+        layout.addLayout(cascade_layout)
+        
+        # PDF text-layer backend
+        pdf_layout = QHBoxLayout()
+        pdf_label = QLabel("PDF Text Backend:")
+        self.pdf_backend_combo = QComboBox()
+        self.pdf_backend_combo.addItems(["pypdf2", "pypdfium2", "pdfminer"])
+        self.pdf_backend_combo.setCurrentText(app_settings.get('pdf_backend', 'pypdf2'))
+        workers_label = QLabel("Processes (0 = auto):")
+        self.pdf_workers_spin = QSpinBox()
+        self.pdf_workers_spin.setRange(0, 64)
+        self.pdf_workers_spin.setValue(app_settings.get('pdf_workers', 0))
+        
+        pdf_layout.addWidget(pdf_label)
+        pdf_layout.addWidget(self.pdf_backend_combo)
+        pdf_layout.addWidget(workers_label)
+        pdf_layout.addWidget(self.pdf_workers_spin)
+        layout.addLayout(pdf_layout)
+        
+        # Scanned-PDF OCR processes
+        ocr_workers_layout = QHBoxLayout()
+        ocr_workers_label = QLabel("Scanned PDF OCR processes (0 = auto):")
+        self.ocr_workers_spin = QSpinBox()
+        self.ocr_workers_spin.setRange(0, 64)
+        self.ocr_workers_spin.setValue(app_settings.get('ocr_workers', 1))
+        
+        ocr_workers_layout.addWidget(ocr_workers_label)
+        ocr_workers_layout.addWidget(self.ocr_workers_spin)
+        layout.addLayout(ocr_workers_layout)
+        
         # Output format selection
         format_layout = QHBoxLayout()
         format_label = QLabel("Default Output Format:")
         self.format_combo = QComboBox()
-        self.format_combo.addItems(["Text", "JSON", "CSV", "HTML", "PDF"])
+        self.format_combo.addItems(["Text", "JSON", "CSV", "HTML", "PDF", "Searchable PDF"])
         current_format = app_settings.get('default_output_format', 'Text')
         self.format_combo.setCurrentText(current_format)
         
@@ -63,6 +119,13 @@ class PreferencesDialog(QDialog):
             app_settings['default_ocr_engine'] = self.engine_combo.currentText()
             app_settings['ocr_language'] = self.lang_combo.currentText()
             app_settings['default_output_format'] = self.format_combo.currentText()
+            app_settings['easyocr_fast_cpu'] = self.fast_cpu_check.isChecked()
+            app_settings['easyocr_torchscript'] = self.torchscript_check.isChecked()
+            app_settings['cascade_min_confidence'] = self.cascade_confidence.value()
+            app_settings['cascade_escalation_engine'] = self.cascade_engine_combo.currentText()
+            app_settings['pdf_backend'] = self.pdf_backend_combo.currentText()
+            app_settings['pdf_workers'] = self.pdf_workers_spin.value()
+            app_settings['ocr_workers'] = self.ocr_workers_spin.value()
             
             # Save to file
             save_settings()
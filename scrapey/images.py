@@ -0,0 +1,248 @@
+"""
+Frame-by-frame image decoding for OCR.
+
+Multi-page TIFFs from document scanners are streamed one frame at a time so
+only the frame being recognised is held in memory. Frames larger than the
+'max_image_pixels' setting are decoded at reduced scale where the format
+supports it (JPEG), a few strips at a time for striped TIFFs, and otherwise
+decoded whole and cut into horizontal bands for the OCR engine. Frames above
+the 'image_pixel_limit' setting are rejected before any pixels are decoded.
+"""
+import io
+import logging
+import numpy as np
+from PIL import Image
+from PIL.TiffImagePlugin import ImageFileDirectory_v2
+from scrapey.utils import app_settings
+
+MULTI_FRAME_EXTENSIONS = ('.tif', '.tiff')
+
+# Rows searched above a band boundary for a blank row to cut on
+BAND_SEARCH_ROWS = 200
+
+# TIFF tags
+_IMAGE_LENGTH = 257
+_COMPRESSION = 259
+_STRIP_OFFSETS = 273
+_ROWS_PER_STRIP = 278
+_STRIP_BYTE_COUNTS = 279
+_PLANAR_CONFIGURATION = 284
+_TILE_WIDTH = 322
+_OLD_JPEG = 6
+_LONG = 4
+# Pointers to other IFDs, which would dangle in a band's own IFD
+_IFD_POINTER_TAGS = {330, 34665, 34853}
+
+
+def _open_image(file_path):
+    # Opening only reads headers. PIL's own decompression bomb guard stays in
+    # place (Image.MAX_IMAGE_PIXELS is process-wide, so it is never lifted);
+    # it checks the first frame here and TIFF frames again when decoded.
+    try:
+        return Image.open(file_path)
+    except Image.DecompressionBombError as e:
+        raise ValueError(f"{file_path} is too large to open: {e}") from e
+
+
+def is_multi_frame(file_path):
+    return file_path.lower().endswith(MULTI_FRAME_EXTENSIONS)
+
+
+def get_image_frame_count(file_path):
+    """Get the number of frames (pages) in an image file.
+
+    Only the headers are read; no pixel data is decoded.
+    """
+    with _open_image(file_path) as img:
+        return getattr(img, 'n_frames', 1)
+
+
+def _check_pixel_limit(img, file_path, frame_num, pixel_limit):
+    width, height = img.size
+    if pixel_limit and width * height > pixel_limit:
+        raise ValueError(
+            f"Frame {frame_num + 1} of {file_path} is {width}x{height}, above the "
+            f"image_pixel_limit of {pixel_limit} pixels"
+        )
+
+
+def _cut_row(gray, top, bottom):
+    """Row to end a band on: the brightest (emptiest) row closest to bottom."""
+    search_top = max(top + 1, bottom - BAND_SEARCH_ROWS)
+    row_means = np.asarray(gray.crop((0, search_top, gray.width, bottom))).mean(axis=1)
+    return bottom - int(np.argmax(row_means[::-1]))
+
+
+class BandedFrame:
+    """An oversized striped TIFF frame, decoded a few strips at a time.
+
+    Each band's strips are wrapped in a small TIFF of their own and decoded
+    by PIL as usual, so only one band (plus the rows carried below its cut)
+    is in memory at once.
+    """
+
+    def __init__(self, file_path, img, max_pixels):
+        self.file_path = file_path
+        self.size = img.size
+        self.width, self.height = img.size
+        self.max_pixels = max_pixels
+        tags = img.tag_v2
+        self._endian = tags._endian
+        self._tags = {
+            tag: (value, tags.tagtype[tag]) for tag, value in tags.items()
+            if tag not in _IFD_POINTER_TAGS
+        }
+        self._offsets = tags[_STRIP_OFFSETS]
+        self._counts = tags[_STRIP_BYTE_COUNTS]
+        self._rows_per_strip = min(self.height, tags.get(_ROWS_PER_STRIP, self.height))
+
+    @staticmethod
+    def supports(img):
+        """Whether a TIFF frame is stored in independently decodable strips."""
+        tags = getattr(img, 'tag_v2', None)
+        return (
+            tags is not None
+            and _TILE_WIDTH not in tags
+            and _STRIP_OFFSETS in tags and _STRIP_BYTE_COUNTS in tags
+            and tags.get(_PLANAR_CONFIGURATION, 1) == 1
+            and tags.get(_COMPRESSION, 1) != _OLD_JPEG
+        )
+
+    def _decode_strips(self, fp, first, last):
+        data = []
+        for strip in range(first, last):
+            fp.seek(self._offsets[strip])
+            data.append(fp.read(self._counts[strip]))
+        if self._endian == '<':
+            header = b'II*\x00\x08\x00\x00\x00'
+        else:
+            header = b'MM\x00*\x00\x00\x00\x08'
+        ifd = ImageFileDirectory_v2(ifh=header)
+        for tag, (value, tag_type) in self._tags.items():
+            ifd[tag] = value
+            ifd.tagtype[tag] = tag_type
+        ifd[_IMAGE_LENGTH] = (
+            min(self.height, last * self._rows_per_strip) - first * self._rows_per_strip
+        )
+        # Strip offsets are relative to the end of the IFD; tobytes() rebases them
+        offsets = np.concatenate([[0], np.cumsum([len(d) for d in data])[:-1]])
+        ifd[_STRIP_OFFSETS] = tuple(int(offset) for offset in offsets)
+        ifd[_STRIP_BYTE_COUNTS] = tuple(len(d) for d in data)
+        ifd.tagtype[_STRIP_OFFSETS] = ifd.tagtype[_STRIP_BYTE_COUNTS] = _LONG
+        with Image.open(io.BytesIO(header + ifd.tobytes(8) + b''.join(data))) as band:
+            return band.convert('L')
+
+    def bands(self):
+        """Yield grayscale bands, top to bottom, cut along blank rows."""
+        strip_count = len(self._offsets)
+        band_rows = max(self._rows_per_strip, (self.max_pixels or 0) // self.width)
+        strips_per_band = max(1, band_rows // self._rows_per_strip)
+        carry = None
+        with open(self.file_path, 'rb') as fp:
+            for first in range(0, strip_count, strips_per_band):
+                last = min(strip_count, first + strips_per_band)
+                band = self._decode_strips(fp, first, last)
+                if carry is not None:
+                    joined = Image.new('L', (self.width, carry.height + band.height))
+                    joined.paste(carry, (0, 0))
+                    joined.paste(band, (0, carry.height))
+                    band = joined
+                    del joined
+                if last == strip_count:
+                    yield band
+                    return
+                cut = _cut_row(band, 0, band.height)
+                carry = band.crop((0, cut, self.width, band.height))
+                head = band.crop((0, 0, self.width, cut))
+                del band
+                yield head
+                del head
+
+    def preview(self, max_side=1024):
+        """Small grayscale image of the whole frame, e.g. for perceptual hashing."""
+        scale = min(1.0, max_side / max(self.size))
+        preview = Image.new('L', (max(1, round(self.width * scale)), max(1, round(self.height * scale))))
+        top = 0
+        for band in self.bands():
+            y0, y1 = round(top * scale), round((top + band.height) * scale)
+            if y1 > y0:
+                preview.paste(band.resize((preview.width, y1 - y0), Image.Resampling.BILINEAR), (0, y0))
+            top += band.height
+        return preview
+
+
+def _decode_frame(img, max_pixels):
+    """Decode the current frame of an open image as grayscale."""
+    width, height = img.size
+    if max_pixels and width * height > max_pixels and img.format == 'JPEG':
+        # JPEG can be decoded directly at 1/2, 1/4 or 1/8 scale
+        scale = (max_pixels / (width * height)) ** 0.5
+        img.draft('L', (int(width * scale), int(height * scale)))
+        logging.info(f"Decoding {width}x{height} JPEG at reduced size {img.size}")
+    return img.convert('L')
+
+
+def iter_image_frames(file_path, page_range=None, max_pixels=None, pixel_limit=None):
+    """Yield (0-based frame index, frame) for each frame.
+
+    Frames are grayscale PIL images, except that oversized striped TIFF
+    frames come as a BandedFrame when max_pixels is given.
+
+    Args:
+        file_path: Path to the image file
+        page_range: Optional tuple of (start_page, end_page) (1-based)
+        max_pixels: Frames above this size are decoded at reduced scale or
+            band by band when the format allows it
+        pixel_limit: Frames above this size raise ValueError; defaults to
+            the 'image_pixel_limit' setting
+    """
+    if pixel_limit is None:
+        pixel_limit = app_settings.get('image_pixel_limit', 178956970)
+    with _open_image(file_path) as img:
+        total_frames = getattr(img, 'n_frames', 1)
+        if page_range:
+            start_frame = max(0, page_range[0] - 1)  # Convert to 0-based
+            end_frame = min(total_frames, page_range[1])  # Already 1-based
+        else:
+            start_frame = 0
+            end_frame = total_frames
+
+        for frame_num in range(start_frame, end_frame):
+            img.seek(frame_num)
+            _check_pixel_limit(img, file_path, frame_num, pixel_limit)
+            width, height = img.size
+            if (max_pixels and width * height > max_pixels
+                    and img.format == 'TIFF' and BandedFrame.supports(img)):
+                logging.info(f"Decoding {width}x{height} TIFF frame strip by strip")
+                yield frame_num, BandedFrame(file_path, img, max_pixels)
+            else:
+                yield frame_num, _decode_frame(img, max_pixels)
+
+
+def split_bands(gray, max_pixels):
+    """Split an oversized grayscale image into horizontal bands.
+
+    Each band stays under max_pixels. Cuts are moved to the brightest
+    (emptiest) row near each boundary so text lines are not sliced in half.
+    A BandedFrame is split as it is decoded.
+
+    Returns:
+        iterable: PIL images, top to bottom
+    """
+    if isinstance(gray, BandedFrame):
+        return gray.bands()
+    width, height = gray.size
+    if not max_pixels or width * height <= max_pixels:
+        return [gray]
+
+    band_height = max(1, max_pixels // width)
+    bands = []
+    top = 0
+    while top < height:
+        bottom = min(height, top + band_height)
+        if bottom < height:
+            bottom = _cut_row(gray, top, bottom)
+        bands.append(gray.crop((0, top, width, bottom)))
+        top = bottom
+    logging.info(f"Split {width}x{height} frame into {len(bands)} bands")
+    return bands
@@ -0,0 +1,247 @@
+"""
+Word-level OCR layouts.
+
+An OCR pass can capture every recognised word with its bounding box and
+confidence. A PageLayout keeps these in flat NumPy arrays, so the text inside
+any region of the page can be answered by a vectorized box query instead of
+running the OCR engine again. The LayoutStore keeps recent layouts per image
+so adjusting a selection in the preview is answered in milliseconds.
+"""
+import logging
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from scrapey.utils import app_settings
+
+
+class PageLayout:
+    """Words of one page: boxes, confidences, line/paragraph ids and text.
+
+    All per-word data lives in parallel arrays; the words themselves are
+    concatenated into one string indexed by offsets.
+    """
+
+    def __init__(self, boxes, confidences, line_ids, paragraph_ids, words, size):
+        self.boxes = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)  # x0, y0, x1, y1
+        self.confidences = np.asarray(confidences, dtype=np.float32)
+        self.line_ids = np.asarray(line_ids, dtype=np.int32)
+        self.paragraph_ids = np.asarray(paragraph_ids, dtype=np.int32)
+        self.text = "".join(words)
+        self.offsets = np.zeros(len(words) + 1, dtype=np.int64)
+        np.cumsum([len(word) for word in words], out=self.offsets[1:])
+        self.size = size
+
+    def __len__(self):
+        return len(self.confidences)
+
+    def word(self, index):
+        return self.text[self.offsets[index]:self.offsets[index + 1]]
+
+    def select(self, region=None, min_overlap=0.5):
+        """Return indices of the words inside region, in reading order.
+
+        Args:
+            region: (x0, y0, x1, y1) in page pixels, or None for the whole page
+            min_overlap: Fraction of a word's box that must fall inside region
+        """
+        if region is None:
+            selected = np.arange(len(self))
+        else:
+            x0, y0, x1, y1 = region
+            boxes = self.boxes
+            overlap_w = np.clip(np.minimum(x1, boxes[:, 2]) - np.maximum(x0, boxes[:, 0]), 0, None)
+            overlap_h = np.clip(np.minimum(y1, boxes[:, 3]) - np.maximum(y0, boxes[:, 1]), 0, None)
+            area = np.maximum(1, (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1]))
+            selected = np.flatnonzero(overlap_w * overlap_h >= min_overlap * area)
+        order = np.lexsort((self.boxes[selected, 0], self.line_ids[selected]))
+        return selected[order]
+
+    def query(self, region=None, min_overlap=0.5):
+        """Return the text inside region, one line per OCR line."""
+        lines = []
+        current = []
+        previous_line = previous_paragraph = None
+        for index in self.select(region, min_overlap):
+            line = self.line_ids[index]
+            if previous_line is not None and line != previous_line:
+                lines.append(" ".join(current))
+                current = []
+                if self.paragraph_ids[index] != previous_paragraph:
+                    lines.append("")
+            current.append(self.word(index))
+            previous_line = line
+            previous_paragraph = self.paragraph_ids[index]
+        if current:
+            lines.append(" ".join(current))
+        return "\n".join(lines)
+
+    def offset(self, dx, dy):
+        """Shift all boxes, e.g. to place a band's layout on the full page."""
+        self.boxes += np.array([dx, dy, dx, dy], dtype=np.int32)
+        return self
+
+    @classmethod
+    def concatenate(cls, layouts, size):
+        """Join layouts of parts of one page (e.g. bands), keeping ids distinct."""
+        words, boxes, confidences, line_ids, paragraph_ids = [], [], [], [], []
+        line_base = paragraph_base = 0
+        for layout in layouts:
+            words.extend(layout.word(i) for i in range(len(layout)))
+            boxes.append(layout.boxes)
+            confidences.append(layout.confidences)
+            line_ids.append(layout.line_ids + line_base)
+            paragraph_ids.append(layout.paragraph_ids + paragraph_base)
+            if len(layout):
+                line_base += int(layout.line_ids.max()) + 1
+                paragraph_base += int(layout.paragraph_ids.max()) + 1
+        if not words:
+            return cls([], [], [], [], [], size)
+        return cls(
+            np.concatenate(boxes), np.concatenate(confidences),
+            np.concatenate(line_ids), np.concatenate(paragraph_ids), words, size
+        )
+
+
+def tesseract_layout(image):
+    """Capture a PageLayout with Tesseract's image_to_data."""
+    import pytesseract
+    data = pytesseract.image_to_data(
+        image,
+        lang=app_settings.get('ocr_language', 'eng'),
+        output_type=pytesseract.Output.DICT
+    )
+    words, boxes, confidences, line_ids, paragraph_ids = [], [], [], [], []
+    lines = {}
+    paragraphs = {}
+    for i, word in enumerate(data['text']):
+        confidence = float(data['conf'][i])
+        word = word.strip()
+        # Rows with conf -1 are page/block/line containers, not words
+        if confidence < 0 or not word:
+            continue
+        paragraph_key = (data['block_num'][i], data['par_num'][i])
+        line_key = paragraph_key + (data['line_num'][i],)
+        left, top = data['left'][i], data['top'][i]
+        words.append(word)
+        boxes.append((left, top, left + data['width'][i], top + data['height'][i]))
+        confidences.append(confidence)
+        line_ids.append(lines.setdefault(line_key, len(lines)))
+        paragraph_ids.append(paragraphs.setdefault(paragraph_key, len(paragraphs)))
+    return PageLayout(boxes, confidences, line_ids, paragraph_ids, words, image.size)
+
+
+def easyocr_layout(image):
+    """Capture a PageLayout with EasyOCR's text boxes.
+
+    EasyOCR has no line structure, so boxes whose vertical centres are
+    within half a typical box height are grouped into the same line.
+    """
+    from scrapey.easyocr_cpu import get_easyocr_reader
+    reader = get_easyocr_reader([app_settings.get('ocr_language', 'eng')])
+    results = reader.readtext(np.array(image))
+    if not results:
+        return PageLayout([], [], [], [], [], image.size)
+
+    points = np.array([result[0] for result in results], dtype=np.float32)
+    boxes = np.stack([
+        points[:, :, 0].min(axis=1), points[:, :, 1].min(axis=1),
+        points[:, :, 0].max(axis=1), points[:, :, 1].max(axis=1),
+    ], axis=1)
+    centres = (boxes[:, 1] + boxes[:, 3]) / 2
+    tolerance = np.median(boxes[:, 3] - boxes[:, 1]) / 2
+
+    line_ids = np.empty(len(results), dtype=np.int32)
+    line = -1
+    line_centre = None
+    for index in np.argsort(centres, kind='stable'):
+        if line_centre is None or centres[index] - line_centre > tolerance:
+            line += 1
+            line_centre = centres[index]
+        line_ids[index] = line
+
+    return PageLayout(
+        boxes,
+        [result[2] * 100 for result in results],
+        line_ids,
+        np.zeros(len(results), dtype=np.int32),
+        [result[1] for result in results],
+        image.size
+    )
+
+
+LAYOUT_ENGINES = {
+    'tesseract': tesseract_layout,
+    'easyocr': easyocr_layout,
+}
+
+
+def capture_layout(image, engine='tesseract'):
+    """OCR a grayscale page once and keep its word boxes.
+
+    Frames larger than 'max_image_pixels' are captured band by band and the
+    band layouts placed back on the full page.
+    """
+    from scrapey.images import split_bands
+    capture = LAYOUT_ENGINES.get(engine.lower())
+    if capture is None:
+        raise ValueError(f"OCR engine '{engine}' cannot capture a layout")
+    layouts = []
+    top = 0
+    for band in split_bands(image, app_settings.get('max_image_pixels', 40000000)):
+        layouts.append(capture(band).offset(0, top))
+        top += band.height
+    if len(layouts) == 1:
+        return layouts[0]
+    return PageLayout.concatenate(layouts, image.size)
+
+
+class LayoutStore:
+    """Recently captured layouts, keyed by file, frame, engine and language.
+
+    Entries are validated against the file's size and mtime, so an image
+    that changes on disk is OCR'd again.
+    """
+
+    def __init__(self, max_pages=64):
+        self.max_pages = max_pages
+        self._layouts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, image_path, engine='tesseract', frame=0):
+        """Return the layout of a page, capturing it on first use."""
+        from scrapey.images import iter_image_frames
+        stat = os.stat(image_path)
+        key = (
+            os.path.abspath(image_path), stat.st_size, stat.st_mtime_ns,
+            frame, engine.lower(), app_settings.get('ocr_language', 'eng'),
+        )
+        with self._lock:
+            layout = self._layouts.get(key)
+            if layout is not None:
+                self._layouts.move_to_end(key)
+                return layout
+
+        layout = None
+        for _, gray in iter_image_frames(image_path, (frame + 1, frame + 1)):
+            layout = capture_layout(gray, engine)
+        if layout is None:
+            raise ValueError(f"{image_path} has no frame {frame + 1}")
+        logging.info(f"Captured {len(layout)} word boxes from {image_path}")
+
+        with self._lock:
+            self._layouts[key] = layout
+            while len(self._layouts) > self.max_pages:
+                self._layouts.popitem(last=False)
+        return layout
+
+    def query(self, image_path, region, engine='tesseract', frame=0):
+        """Return the text inside region, OCR'ing the page only the first time."""
+        return self.get(image_path, engine, frame).query(region)
+
+    def clear(self):
+        with self._lock:
+            self._layouts.clear()
+
+
+layout_store = LayoutStore()
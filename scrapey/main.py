@@ -1,10 +1,14 @@
 import sys
 import logging
+import multiprocessing
 from PySide6.QtWidgets import QApplication
 from scrapey.gui.main_window import MainWindow
 from scrapey.utils import load_settings
 
 def main():
+    # Needed for the PDF extraction process pool in frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
+    
     # Configure logging
     logging.basicConfig(
         filename='scrapey.log',
@@ -1,68 +1,106 @@
-import tempfile
-import os
 import logging
-from PIL import Image
 import numpy as np
 from tkinter import messagebox
 from scrapey.utils import app_settings
+from scrapey.images import (
+    iter_image_frames, split_bands, is_multi_frame, get_image_frame_count, BandedFrame
+)
 from pdf2image import convert_from_path
 
-def perform_ocr(image_path, engine='tesseract'):
+def perform_ocr(image_path, engine='tesseract', page_range=None, deduper=None):
     """
     Extract text from an image using the specified OCR engine.
-    Supported engines: tesseract, easyocr.
+    Supported engines: tesseract, easyocr, cascade.
     This version converts the image to grayscale before performing OCR.
+    Multi-page TIFFs are streamed frame by frame and each frame is OCR'd as
+    soon as it is decoded; page_range selects frames like it does PDF pages.
+    With a PageDeduper, frames matching one already seen reuse its text.
     """
     try:
-        # Convert image to grayscale
-        with Image.open(image_path) as img:
-            gray = img.convert('L')
+        max_pixels = app_settings.get('max_image_pixels', 40000000)
+        multi_frame = is_multi_frame(image_path) and get_image_frame_count(image_path) > 1
+        text_parts = []
+        frame_count = 0
+        for frame_num, gray in iter_image_frames(image_path, page_range, max_pixels):
+            frame_count += 1
             
-            # Save grayscale image to temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp:
-                temp_path = tmp.name
-                gray.save(temp_path)
-        
-        text = ""
-        if engine.lower() == 'tesseract':
-            import pytesseract
-            logging.info("Using Tesseract OCR engine")
-            text = pytesseract.image_to_string(
-                temp_path,
-                lang=app_settings.get('ocr_language', 'eng')
-            )
-        elif engine.lower() == 'easyocr':
-            try:
-                import easyocr
-                logging.info("Using EasyOCR engine")
-                reader = easyocr.Reader([app_settings.get('ocr_language', 'en')])
-                result = reader.readtext(temp_path)
-                text = "\n".join([item[1] for item in result])
-            except ImportError:
-                logging.error("easyocr import failed")
-                messagebox.showerror(
-                    "Missing Dependency",
-                    "easyocr is not installed. Please install it to use EasyOCR.\n\n"
-                    "Try: pip install easyocr"
+            def ocr_frame(gray=gray):
+                return "\n".join(
+                    ocr_page(band, engine) for band in split_bands(gray, max_pixels)
                 )
-                return ""
+            
+            if deduper:
+                # Banded frames are never decoded whole; hash a reduced copy
+                hash_image = gray.preview() if isinstance(gray, BandedFrame) else gray
+                text = deduper.run(hash_image, ocr_frame)
+            else:
+                text = ocr_frame()
+            if not multi_frame:
+                return text
+            if text:
+                text_parts.append(f"=== Page {frame_num + 1} ===\n{text}\n")
+            
+        logging.info(f"OCR'd {frame_count} frames from {image_path}")
+        return "\n".join(text_parts)
     except Exception as e:
         logging.exception("Error during OCR:")
         raise
-    finally:
-        # Clean up temporary file
-        os.remove(temp_path)
+
+def ocr_page(image, engine='tesseract'):
+    """
+    OCR one grayscale page image with any supported engine, including the cascade.
+    """
+    if engine.lower() == 'cascade':
+        from scrapey.cascade import cascade_ocr_image
+        return cascade_ocr_image(image)
+    return ocr_image(image, engine)
+
+def ocr_image(image, engine='tesseract', tesseract_config=''):
+    """
+    Run a single OCR engine on an in-memory PIL image.
+    Supported engines: tesseract, easyocr.
+    """
+    text = ""
+    if engine.lower() == 'tesseract':
+        import pytesseract
+        logging.info("Using Tesseract OCR engine")
+        text = pytesseract.image_to_string(
+            image,
+            lang=app_settings.get('ocr_language', 'eng'),
+            config=tesseract_config
+        )
+    elif engine.lower() == 'easyocr':
+        try:
+            from scrapey.easyocr_cpu import get_easyocr_reader
+            logging.info("Using EasyOCR engine")
+            reader = get_easyocr_reader([app_settings.get('ocr_language', 'eng')])
+            result = reader.readtext(np.array(image))
+            text = "\n".join([item[1] for item in result])
+        except ImportError:
+            logging.error("easyocr import failed")
+            messagebox.showerror(
+                "Missing Dependency",
+                "easyocr is not installed. Please install it to use EasyOCR.\n\n"
+                "Try: pip install easyocr"
+            )
+            return ""
     return text
 
-def ocr_scanned_pdf(pdf_path, engine='tesseract', page_range=None):
+def ocr_scanned_pdf(pdf_path, engine='tesseract', page_range=None, deduper=None):
     """
-    Convert each page of a scanned PDF to an image, then run OCR on each page.
+    Render each page of a scanned PDF to a grayscale image, then run OCR on each page.
     Requires pdf2image and poppler to be installed.
+    Pages are rendered one at a time. With 'ocr_workers' above 1 they are
+    OCR'd in a process pool, handed over through shared memory.
+    With a PageDeduper, pages matching one already seen reuse its text.
     """
+    if engine.lower() == 'cascade':
+        from scrapey.cascade import cascade_ocr_pdf
+        return cascade_ocr_pdf(pdf_path, page_range, deduper)
+    from pdf2image import pdfinfo_from_path
+    from scrapey.pagebuf import ocr_pages_in_pool, ocr_worker_count
     try:
-        # Convert PDF pages to images
-        images = convert_from_path(pdf_path)
-        total_pages = len(images)
+        total_pages = pdfinfo_from_path(pdf_path)['Pages']
         
         # Determine page range
         if page_range:
@@ -72,23 +110,37 @@ def ocr_scanned_pdf(pdf_path, engine='tesseract', page_range=None):
             start_page = 0
             end_page = total_pages
             
+        def render_pages():
+            for page_num in range(start_page, end_page):
+                yield page_num, convert_from_path(
+                    pdf_path, first_page=page_num + 1, last_page=page_num + 1, grayscale=True
+                )[0]
+        
+        workers = ocr_worker_count()
+        if workers > 1 and end_page - start_page > 1:
+            pages = ocr_pages_in_pool(render_pages(), engine, workers, deduper)
+        else:
+            max_pixels = app_settings.get('max_image_pixels', 40000000)
+            
+            def ocr_pages():
+                for page_num, image in render_pages():
+                    def ocr_pdf_page(image=image):
+                        return "\n".join(
+                            ocr_page(band, engine) for band in split_bands(image, max_pixels)
+                        )
+                    
+                    text = deduper.run(image, ocr_pdf_page) if deduper else ocr_pdf_page()
+                    yield page_num, text
+            
+            pages = ocr_pages()
+            
         text_parts = []
-        for page_num in range(start_page, end_page):
-            # Save page image to temporary file
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp:
-                temp_path = tmp.name
-                images[page_num].save(temp_path, 'PNG')
-                
-            # Perform OCR on the page
-            text = perform_ocr(temp_path, engine)
+        for page_num, text in pages:
             if text:
                 text_parts.append(f"=== Page {page_num + 1} ===\n{text}\n")
-                
-            # Clean up temporary file
-            os.remove(temp_path)
             
         return "\n".join(text_parts)
         
     except Exception as e:
         logging.exception("Error during PDF OCR:")
-        raise 
\ No newline at end of file
+        raise
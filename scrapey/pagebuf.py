@@ -0,0 +1,180 @@
+"""
+Shared-memory page buffers for parallel OCR.
+
+Rendered grayscale pages are copied once into a multiprocessing.shared_memory
+block. OCR worker processes are sent only a small (name, shape, dtype)
+descriptor and read the pixels in place, so no page image is pickled or
+written to a temp file on its way to a worker. The rendering process owns
+each block and frees it as soon as that page's OCR result comes back.
+"""
+import contextlib
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from PIL import Image
+from scrapey.utils import app_settings, load_settings
+
+
+class PageBuffer:
+    """A grayscale page held in shared memory, owned by the creating process."""
+
+    def __init__(self, image):
+        array = np.asarray(image.convert('L') if image.mode != 'L' else image)
+        self.shape = array.shape
+        self.dtype = array.dtype.str
+        self._shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        np.ndarray(self.shape, dtype=array.dtype, buffer=self._shm.buf)[...] = array
+
+    @property
+    def descriptor(self):
+        """What a worker needs to attach: (name, shape, dtype)."""
+        return self._shm.name, self.shape, self.dtype
+
+    def release(self):
+        """Free the block. Workers still attached keep a valid mapping."""
+        if self._shm is None:
+            return
+        self._shm.close()
+        try:
+            self._shm.unlink()
+        except FileNotFoundError:
+            pass
+        self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+@contextlib.contextmanager
+def attach_page(descriptor):
+    """Map a PageBuffer by descriptor and yield it as a PIL image, without copying."""
+    name, shape, dtype = descriptor
+    # Pool workers share their parent's resource tracker, so attaching here
+    # does not take ownership: the block is still unlinked by its creator.
+    shm = shared_memory.SharedMemory(name=name)
+    image = None
+    try:
+        array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        image = Image.frombuffer('L', (shape[1], shape[0]), array, 'raw', 'L', 0, 1)
+        del array
+        yield image
+    finally:
+        # The image must let go of the mapping before it can be closed
+        if image is not None:
+            image.close()
+        del image
+        shm.close()
+
+
+def _ocr_shared_page(descriptor, engine):
+    # Runs in a worker process
+    from scrapey.images import split_bands
+    from scrapey.ocr import ocr_page
+    start = time.perf_counter()
+    try:
+        with attach_page(descriptor) as image:
+            bands = split_bands(image, app_settings.get('max_image_pixels', 40000000))
+            text = "\n".join(ocr_page(band, engine) for band in bands)
+            del bands
+    except Exception as e:
+        # Some engine exceptions (e.g. pytesseract's) can't be unpickled in
+        # the parent and would break the pool; send them back as RuntimeError.
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+    return text, time.perf_counter() - start
+
+
+_pool = None
+_pool_workers = 0
+
+
+def _get_pool(workers):
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        _pool = ProcessPoolExecutor(max_workers=workers, initializer=load_settings)
+        _pool_workers = workers
+    return _pool
+
+
+def ocr_worker_count():
+    workers = app_settings.get('ocr_workers', 1)
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+def ocr_pages_in_pool(pages, engine, workers, deduper=None):
+    """OCR rendered pages across a process pool through shared memory.
+
+    Rendering stays in the calling process and overlaps with OCR; at most
+    2 x workers pages are held in shared memory at once.
+
+    Args:
+        pages: Iterable of (page index, PIL image), rendered lazily
+        engine: OCR engine name
+        workers: Worker processes
+        deduper: Optional PageDeduper; matching pages are never dispatched
+
+    Yields:
+        tuple: (page index, text) in page order
+    """
+    pool = _get_pool(workers)
+    # (page index, future, buffer, page signature, text) per page, in page order.
+    # Pages reusing a finished page's text have no future; pages matching a
+    # page still in flight share its future but have no buffer of their own.
+    in_flight = deque()
+
+    def finish(page_index, future, buffer, signature, text):
+        if future is None:
+            return page_index, text
+        try:
+            text, seconds = future.result()
+        finally:
+            if buffer is not None:
+                buffer.release()
+        if deduper and buffer is not None:
+            deduper.remember(signature, text, seconds)
+        elif deduper:
+            deduper.reused(seconds)
+        return page_index, text
+
+    def pending_match(signature):
+        for _, future, buffer, other, _ in in_flight:
+            if buffer is not None and deduper.same_page(signature, other):
+                return future
+        return None
+
+    try:
+        for page_index, image in pages:
+            signature = text = future = None
+            if deduper:
+                signature, text = deduper.match(image)
+                if text is None:
+                    future = pending_match(signature)
+            if text is not None or future is not None:
+                in_flight.append((page_index, future, None, signature, text))
+            else:
+                buffer = PageBuffer(image)
+                future = pool.submit(_ocr_shared_page, buffer.descriptor, engine)
+                in_flight.append((page_index, future, buffer, signature, None))
+            del image
+            while len(in_flight) >= workers * 2:
+                yield finish(*in_flight.popleft())
+        while in_flight:
+            yield finish(*in_flight.popleft())
+    finally:
+        # On error or early close, don't leave blocks behind
+        for _, future, buffer, _, _ in in_flight:
+            if buffer is not None:
+                future.cancel()
+                buffer.release()
+        if in_flight:
+            logging.info(f"Released {len(in_flight)} unfinished page buffers")
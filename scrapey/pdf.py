@@ -1,56 +1,377 @@
+import contextlib
 import logging
-import PyPDF2
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from scrapey.utils import app_settings
 
-def get_pdf_page_count(file_path):
+
+class PDFBackend:
+    """Interface for PDF text-layer engines.
+
+    A backend opens a document once into a handle, which the document cache
+    keeps around so repeated page counts and extractions don't re-parse it.
+    """
+    name = None
+
+    def open(self, file_path):
+        raise NotImplementedError
+
+    def close(self, handle):
+        pass
+
+    def page_count(self, handle):
+        raise NotImplementedError
+
+    def page_text(self, handle, page_index):
+        raise NotImplementedError
+
+    def extract_range(self, handle, start_page, end_page):
+        """Return a list of (0-based page index, text) for [start_page, end_page)."""
+        return [(i, self.page_text(handle, i)) for i in range(start_page, end_page)]
+
+
+class PyPDF2Backend(PDFBackend):
+    """Pure-Python engine; always available."""
+    name = 'pypdf2'
+
+    def open(self, file_path):
+        import PyPDF2
+        file = open(file_path, 'rb')
+        try:
+            return (file, PyPDF2.PdfReader(file))
+        except Exception:
+            file.close()
+            raise
+
+    def close(self, handle):
+        handle[0].close()
+
+    def page_count(self, handle):
+        return len(handle[1].pages)
+
+    def page_text(self, handle, page_index):
+        return handle[1].pages[page_index].extract_text()
+
+
+# PDFium is not thread-safe, not even across different documents, so every
+# call into it from this process goes through one lock.
+_PDFIUM_LOCK = threading.Lock()
+
+
+class PdfiumBackend(PDFBackend):
+    """PDFium through pypdfium2; native code and much faster on large files."""
+    name = 'pypdfium2'
+
+    def open(self, file_path):
+        import pypdfium2
+        with _PDFIUM_LOCK:
+            return pypdfium2.PdfDocument(file_path)
+
+    def close(self, handle):
+        with _PDFIUM_LOCK:
+            handle.close()
+
+    def page_count(self, handle):
+        with _PDFIUM_LOCK:
+            return len(handle)
+
+    def page_text(self, handle, page_index):
+        with _PDFIUM_LOCK:
+            page = handle[page_index]
+            try:
+                textpage = page.get_textpage()
+                try:
+                    return textpage.get_text_range()
+                finally:
+                    textpage.close()
+            finally:
+                page.close()
+
+
+class PdfMinerBackend(PDFBackend):
+    """pdfminer.six; slower than PDFium but with better reading-order analysis."""
+    name = 'pdfminer'
+
+    def open(self, file_path):
+        import pdfminer  # noqa: F401 - fail early if missing
+        return file_path
+
+    def page_count(self, handle):
+        from pdfminer.pdfpage import PDFPage
+        with open(handle, 'rb') as file:
+            return sum(1 for _ in PDFPage.get_pages(file))
+
+    def page_text(self, handle, page_index):
+        from pdfminer.high_level import extract_text
+        return extract_text(handle, page_numbers=[page_index])
+
+    def extract_range(self, handle, start_page, end_page):
+        # Parse the range in one pass rather than re-opening the file per page
+        from pdfminer.high_level import extract_pages
+        from pdfminer.layout import LTTextContainer
+        results = []
+        pages = extract_pages(handle, page_numbers=range(start_page, end_page))
+        for page_index, layout in zip(range(start_page, end_page), pages):
+            text = "".join(
+                element.get_text() for element in layout
+                if isinstance(element, LTTextContainer)
+            )
+            results.append((page_index, text))
+        return results
+
+
+PDF_BACKENDS = {
+    backend.name: backend
+    for backend in (PyPDF2Backend(), PdfiumBackend(), PdfMinerBackend())
+}
+
+
+def get_pdf_backend(name=None):
+    """Return the named backend (default: the 'pdf_backend' setting).
+
+    Falls back to PyPDF2 if the requested engine is not installed.
+    """
+    name = (name or app_settings.get('pdf_backend', 'pypdf2')).lower()
+    backend = PDF_BACKENDS.get(name)
+    if backend is None:
+        raise ValueError(f"Unknown PDF backend: {name}")
+    if backend.name != 'pypdf2':
+        try:
+            __import__(backend.name)
+        except ImportError:
+            logging.warning(f"PDF backend '{backend.name}' is not installed, falling back to PyPDF2")
+            return PDF_BACKENDS['pypdf2']
+    return backend
+
+
+class _CachedDocument:
+    """An open handle, its page count once known, and the lock serialising its use."""
+    __slots__ = ('stamp', 'handle', 'page_count', 'lock', 'closed')
+
+    def __init__(self, stamp, handle):
+        self.stamp = stamp
+        self.handle = handle
+        self.page_count = None
+        self.lock = threading.Lock()
+        self.closed = False
+
+
+class _DocumentCache:
+    """LRU cache of open document handles and their page counts.
+
+    Entries are keyed by backend and path and validated against the file's
+    size and mtime, so a file that changes on disk is re-opened. The cache
+    lock only guards the lookup; each handle has its own lock, so threads
+    extracting from different documents don't wait for each other (except
+    with PDFium, which serialises all of its calls).
+    """
+
+    def __init__(self, max_handles=8):
+        self.max_handles = max_handles
+        self.lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def _stamp(file_path):
+        stat = os.stat(file_path)
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def _entry(self, backend, file_path):
+        key = (backend.name, os.path.abspath(file_path))
+        stamp = self._stamp(file_path)
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.stamp == stamp:
+                self._entries.move_to_end(key)
+                return entry
+
+        # Opening parses the document, so it happens outside the cache lock
+        opened = _CachedDocument(stamp, backend.open(file_path))
+        evicted = []
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.stamp == stamp:
+                # Another thread opened it meanwhile; use theirs
+                self._entries.move_to_end(key)
+                evicted.append((key, opened))
+            else:
+                if entry is not None:
+                    evicted.append((key, self._entries.pop(key)))
+                entry = self._entries[key] = opened
+                while len(self._entries) > self.max_handles:
+                    evicted.append(self._entries.popitem(last=False))
+        self._close(evicted)
+        return entry
+
+    @staticmethod
+    def _close(entries):
+        # Waits for any thread still using the handle
+        for (backend_name, path), entry in entries:
+            with entry.lock:
+                entry.closed = True
+                try:
+                    PDF_BACKENDS[backend_name].close(entry.handle)
+                except Exception:
+                    logging.exception(f"Error closing cached PDF handle for {path}:")
+
+    @contextlib.contextmanager
+    def document(self, backend, file_path):
+        """Yield the cached entry for a file, locked for the caller's use."""
+        while True:
+            entry = self._entry(backend, file_path)
+            with entry.lock:
+                if entry.closed:
+                    continue  # Evicted between lookup and lock; open it again
+                yield entry
+                return
+
+    def page_count(self, backend, file_path):
+        with self.document(backend, file_path) as entry:
+            if entry.page_count is None:
+                entry.page_count = backend.page_count(entry.handle)
+            return entry.page_count
+
+    def extract_range(self, backend, file_path, start_page, end_page):
+        with self.document(backend, file_path) as entry:
+            return backend.extract_range(entry.handle, start_page, end_page)
+
+    def _remove(self, matches):
+        with self.lock:
+            removed = [(key, self._entries.pop(key)) for key in list(self._entries) if matches(key)]
+        self._close(removed)
+
+    def forget(self, file_path):
+        """Close the handles and drop the page counts of one file."""
+        path = os.path.abspath(file_path)
+        self._remove(lambda key: key[1] == path)
+
+    def clear(self):
+        self._remove(lambda key: True)
+
+
+_documents = _DocumentCache()
+_pool = None
+_pool_workers = 0
+
+
+def clear_document_cache():
+    """Close all cached document handles and forget cached page counts."""
+    _documents.clear()
+
+
+def forget_document(file_path):
+    """Close cached handles of a file and forget its page count, e.g. before deleting it."""
+    _documents.forget(file_path)
+
+
+def _get_pool(workers):
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        _pool = ProcessPoolExecutor(max_workers=workers)
+        _pool_workers = workers
+    return _pool
+
+
+def extract_pdf_pages(file_path, start_page, end_page, backend=None):
+    """Extract the text of a range of pages without formatting it.
+
+    Args:
+        file_path: Path to the PDF file
+        start_page: First page (0-based, inclusive)
+        end_page: Last page (0-based, exclusive)
+        backend: Optional backend name, defaults to the 'pdf_backend' setting
+
+    Returns:
+        list: (0-based page index, text) tuples
+    """
+    return _documents.extract_range(get_pdf_backend(backend), file_path, start_page, end_page)
+
+
+def _extract_shard(backend_name, file_path, start_page, end_page):
+    # Runs in a worker process; each worker keeps its own document cache so
+    # consecutive shards of the same file reuse the open handle.
+    return extract_pdf_pages(file_path, start_page, end_page, backend_name)
+
+
+def _worker_count():
+    workers = app_settings.get('pdf_workers', 0)
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return workers
+
+
+def get_pdf_page_count(file_path, backend=None):
     """Get the number of pages in a PDF file.
-    
+
     Args:
         file_path: Path to the PDF file
-        
+        backend: Optional backend name, defaults to the 'pdf_backend' setting
+
     Returns:
         int: Number of pages in the PDF
     """
     try:
-        with open(file_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            return len(reader.pages)
+        return _documents.page_count(get_pdf_backend(backend), file_path)
     except Exception as e:
         logging.exception(f"Error getting page count from {file_path}:")
         raise
 
-def extract_pdf_text(file_path, page_range=None):
+def extract_pdf_text(file_path, page_range=None, backend=None, workers=None):
     """Extract text from a PDF file.
-    
+
+    Large page ranges are split into shards of 'pdf_shard_pages' pages and
+    extracted across a process pool of 'pdf_workers' processes.
+
     Args:
         file_path: Path to the PDF file
         page_range: Optional tuple of (start_page, end_page) for page range (1-based)
-        
+        backend: Optional backend name, defaults to the 'pdf_backend' setting
+        workers: Optional process count, defaults to the 'pdf_workers' setting
+
     Returns:
         str: Extracted text from the PDF
     """
     try:
-        with open(file_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            total_pages = len(reader.pages)
-            
-            # Determine page range
-            if page_range:
-                start_page = max(0, page_range[0] - 1)  # Convert to 0-based
-                end_page = min(total_pages, page_range[1])  # Already 1-based
-            else:
-                start_page = 0
-                end_page = total_pages
-            
-            # Extract text from each page
-            text_parts = []
-            for page_num in range(start_page, end_page):
-                page = reader.pages[page_num]
-                text = page.extract_text()
-                if text:
-                    text_parts.append(f"=== Page {page_num + 1} ===\n{text}\n")
-            
-            return "\n".join(text_parts)
-            
+        engine = get_pdf_backend(backend)
+        total_pages = _documents.page_count(engine, file_path)
+
+        # Determine page range
+        if page_range:
+            start_page = max(0, page_range[0] - 1)  # Convert to 0-based
+            end_page = min(total_pages, page_range[1])  # Already 1-based
+        else:
+            start_page = 0
+            end_page = total_pages
+
+        shard_pages = max(1, app_settings.get('pdf_shard_pages', 50))
+        workers = workers if workers is not None else _worker_count()
+        shards = [
+            (shard_start, min(end_page, shard_start + shard_pages))
+            for shard_start in range(start_page, end_page, shard_pages)
+        ]
+
+        if workers > 1 and len(shards) > 1:
+            pool = _get_pool(workers)
+            futures = [
+                pool.submit(_extract_shard, engine.name, file_path, shard_start, shard_end)
+                for shard_start, shard_end in shards
+            ]
+            pages = [page for future in futures for page in future.result()]
+        else:
+            pages = extract_pdf_pages(file_path, start_page, end_page, engine.name)
+
+        # Extract text from each page
+        text_parts = []
+        for page_num, text in pages:
+            if text:
+                text_parts.append(f"=== Page {page_num + 1} ===\n{text}\n")
+
+        return "\n".join(text_parts)
+
     except Exception as e:
         logging.exception(f"Error extracting text from {file_path}:")
-        raise 
\ No newline at end of file
+        raise
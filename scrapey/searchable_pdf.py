@@ -0,0 +1,339 @@
+"""
+Searchable PDF output.
+
+Scanned PDFs and images are written as PDFs that show the original page image
+with an invisible, selectable text layer on top. The text layer is placed from
+the word boxes of the same OCR pass that produces the extracted text, so no
+page is rendered or recognised twice.
+
+Pages are streamed to the output file as they are finished; only the byte
+offsets of the objects written so far are kept in memory.
+
+The text layer uses an embedded glyphless font (as Tesseract's own PDF output
+does): words are written as UTF-16BE codes, every code draws the same blank
+glyph, and a ToUnicode CMap maps the codes back to text, so any language can
+be searched and copied.
+"""
+import io
+import logging
+import struct
+import zlib
+from scrapey.utils import app_settings
+
+# Objects written when the document is closed; pages are numbered after them
+_CATALOG, _PAGES, _FONT = 1, 2, 3
+
+# Every glyph of the glyphless font is half an em wide; each word is
+# stretched to its box with Tz, so this only sets the starting width.
+_GLYPH_WIDTH = 500
+_UNITS_PER_EM = 1000
+
+# Fraction of a word box's height below the text baseline
+_DESCENT = 0.2
+
+
+def _pdf_text(text):
+    # Identity-H takes two-byte codes; the ToUnicode CMap maps them back
+    return b'<' + text.encode('utf-16-be').hex().upper().encode('ascii') + b'>'
+
+
+def _glyphless_font():
+    """A minimal TrueType font whose one glyph is a box filling the em.
+
+    The text layer is drawn in render mode 3, so the box is never painted;
+    it gives each character a bounding box, which text extractors such as
+    PDFium need to keep single-character words.
+    """
+    ascent = round(_UNITS_PER_EM * (1 - _DESCENT))
+    descent = ascent - _UNITS_PER_EM
+    # One contour through the four corners, all on-curve points with 16-bit deltas
+    box = struct.pack(
+        '>hhhhhHH4B4h4h', 1, 0, descent, _GLYPH_WIDTH, ascent, 3, 0, 1, 1, 1, 1,
+        0, 0, _GLYPH_WIDTH, 0, descent, ascent - descent, 0, descent - ascent
+    )
+    box += b'\0' * (-len(box) % 4)
+    tables = {
+        b'cmap': struct.pack(
+            '>HHHHIHHHHHHHHHHhH', 0, 1, 3, 1, 12,
+            4, 24, 0, 2, 2, 0, 0, 0xFFFF, 0, 0xFFFF, 1, 0
+        ),
+        b'glyf': box,
+        b'head': struct.pack(
+            '>IIIIHHqqhhhhHHhhh', 0x00010000, 0x00010000, 0, 0x5F0F3CF5, 0x000B,
+            _UNITS_PER_EM, 0, 0, 0, descent, _GLYPH_WIDTH, ascent, 0, 3, 2, 0, 0
+        ),
+        b'hhea': struct.pack(
+            '>IhhhHhhhhhhhhhhhH', 0x00010000, ascent, descent, 0, _GLYPH_WIDTH,
+            0, 0, 0, 1, 0, 0, 0, 0, 0, 0, 0, 2
+        ),
+        b'hmtx': struct.pack('>HhHh', _GLYPH_WIDTH, 0, _GLYPH_WIDTH, 0),
+        # Glyph 0 (.notdef) is empty; short offsets are stored halved
+        b'loca': struct.pack('>HHH', 0, 0, len(box) // 2),
+        b'maxp': struct.pack('>IH13H', 0x00010000, 2, 4, 1, 0, 0, 2, 0, 0, 0, 0, 0, 0, 0, 0),
+        b'name': struct.pack('>HHH', 0, 0, 6),
+        b'post': struct.pack('>IihhIIIII', 0x00030000, 0, -100, 50, 0, 0, 0, 0, 0),
+    }
+
+    def checksum(data):
+        data += b'\0' * (-len(data) % 4)
+        return sum(struct.unpack(f'>{len(data) // 4}I', data)) & 0xFFFFFFFF
+
+    count = len(tables)
+    entry_selector = count.bit_length() - 1
+    search_range = 16 << entry_selector
+    header = struct.pack('>IHHHH', 0x00010000, count, search_range, entry_selector,
+                         count * 16 - search_range)
+    records, body, offsets = [], b'', {}
+    for tag in sorted(tables):
+        data = tables[tag]
+        offsets[tag] = len(header) + count * 16 + len(body)
+        records.append(struct.pack('>4sIII', tag, checksum(data), offsets[tag], len(data)))
+        body += data + b'\0' * (-len(data) % 4)
+    font = bytearray(header + b''.join(records) + body)
+    # head.checkSumAdjustment makes the whole font sum to a fixed value
+    struct.pack_into('>I', font, offsets[b'head'] + 8, (0xB1B0AFBA - checksum(bytes(font))) & 0xFFFFFFFF)
+    return bytes(font)
+
+
+def _to_unicode_cmap():
+    """CMap mapping every two-byte code to the same UTF-16 code unit."""
+    # bfrange entries may not cross a change in the first byte, so there is one
+    # per first byte, in blocks of at most 100
+    ranges = [f"<{high:02X}00> <{high:02X}FF> <{high:02X}00>" for high in range(256)]
+    blocks = "".join(
+        f"{len(ranges[i:i + 100])} beginbfrange\n" + "\n".join(ranges[i:i + 100]) + "\nendbfrange\n"
+        for i in range(0, len(ranges), 100)
+    )
+    return (
+        "/CIDInit /ProcSet findresource begin\n12 dict begin\nbegincmap\n"
+        "/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def\n"
+        "/CMapName /Adobe-Identity-UCS def\n/CMapType 2 def\n"
+        "1 begincodespacerange\n<0000> <FFFF>\nendcodespacerange\n"
+        + blocks +
+        "endcmap\nCMapName currentdict /CMap defineresource pop\nend\nend\n"
+    ).encode('ascii')
+
+
+class SearchablePDFWriter:
+    """Write page images with invisible text layers to a PDF, one page at a time.
+
+    Args:
+        path: Output file
+        jpeg_quality: JPEG quality of page images, defaults to the
+            'searchable_pdf_jpeg_quality' setting
+    """
+
+    def __init__(self, path, jpeg_quality=None):
+        self.path = path
+        self.jpeg_quality = jpeg_quality or app_settings.get('searchable_pdf_jpeg_quality', 85)
+        self._file = open(path, 'wb')
+        self._offsets = {}
+        self._pages = []
+        self._next_number = _FONT + 1
+        self._file.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def _reserve(self):
+        number = self._next_number
+        self._next_number += 1
+        return number
+
+    def _write_object(self, number, body):
+        self._offsets[number] = self._file.tell()
+        self._file.write(f"{number} 0 obj\n".encode('ascii'))
+        self._file.write(body)
+        self._file.write(b"\nendobj\n")
+
+    def _write_stream(self, number, dictionary, data):
+        self._write_object(
+            number,
+            f"<< {dictionary} /Length {len(data)} >>\nstream\n".encode('ascii')
+            + data + b"\nendstream"
+        )
+
+    @staticmethod
+    def _text_layer(layout, scale, page_height):
+        parts = [b"BT\n3 Tr\n"]  # Render mode 3: neither fill nor stroke
+        for index in range(len(layout)):
+            word = layout.word(index)
+            x0, y0, x1, y1 = layout.boxes[index].tolist()
+            size = max(1.0, (y1 - y0) * scale)
+            codes = len(word.encode('utf-16-be')) // 2
+            natural_width = _GLYPH_WIDTH / _UNITS_PER_EM * size * max(1, codes)
+            stretch = 100.0 * (x1 - x0) * scale / natural_width
+            baseline = page_height - y1 * scale + _DESCENT * size
+            parts.append(
+                f"/F1 {size:.2f} Tf {stretch:.1f} Tz 1 0 0 1 {x0 * scale:.2f} {baseline:.2f} Tm ".encode('ascii')
+                + _pdf_text(word) + b" Tj\n"
+            )
+        parts.append(b"ET\n")
+        return b"".join(parts)
+
+    def add_page(self, image, layout, dpi):
+        """Append a page.
+
+        Args:
+            image: PIL image of the page, at the resolution layout was captured at
+            layout: PageLayout of the page's words
+            dpi: Image resolution, which sets the page size
+        """
+        if image.mode not in ('L', 'RGB'):
+            image = image.convert('RGB')
+        jpeg = io.BytesIO()
+        image.save(jpeg, 'JPEG', quality=self.jpeg_quality)
+        colour_space = '/DeviceGray' if image.mode == 'L' else '/DeviceRGB'
+
+        scale = 72.0 / dpi
+        width, height = image.width * scale, image.height * scale
+        image_number, content_number, page_number = self._reserve(), self._reserve(), self._reserve()
+
+        self._write_stream(
+            image_number,
+            f"/Type /XObject /Subtype /Image /Width {image.width} /Height {image.height} "
+            f"/ColorSpace {colour_space} /BitsPerComponent 8 /Filter /DCTDecode",
+            jpeg.getvalue()
+        )
+        content = (
+            f"q {width:.2f} 0 0 {height:.2f} 0 0 cm /Im0 Do Q\n".encode('ascii')
+            + self._text_layer(layout, scale, height)
+        )
+        self._write_stream(content_number, "", content)
+        self._write_object(
+            page_number,
+            f"<< /Type /Page /Parent {_PAGES} 0 R /MediaBox [0 0 {width:.2f} {height:.2f}] "
+            f"/Resources << /XObject << /Im0 {image_number} 0 R >> /Font << /F1 {_FONT} 0 R >> >> "
+            f"/Contents {content_number} 0 R >>".encode('ascii')
+        )
+        self._pages.append(page_number)
+        self._file.flush()
+
+    def _write_font(self):
+        cid_font, descriptor, font_file, cid_to_gid, to_unicode = (
+            self._reserve(), self._reserve(), self._reserve(), self._reserve(), self._reserve()
+        )
+        self._write_object(
+            _FONT,
+            f"<< /Type /Font /Subtype /Type0 /BaseFont /GlyphLessFont /Encoding /Identity-H "
+            f"/DescendantFonts [{cid_font} 0 R] /ToUnicode {to_unicode} 0 R >>".encode('ascii')
+        )
+        self._write_object(
+            cid_font,
+            f"<< /Type /Font /Subtype /CIDFontType2 /BaseFont /GlyphLessFont "
+            f"/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> "
+            f"/FontDescriptor {descriptor} 0 R /DW {_GLYPH_WIDTH} "
+            f"/CIDToGIDMap {cid_to_gid} 0 R >>".encode('ascii')
+        )
+        ascent = round(_UNITS_PER_EM * (1 - _DESCENT))
+        self._write_object(
+            descriptor,
+            f"<< /Type /FontDescriptor /FontName /GlyphLessFont /Flags 5 "
+            f"/FontBBox [0 {ascent - _UNITS_PER_EM} {_GLYPH_WIDTH} {ascent}] /ItalicAngle 0 "
+            f"/Ascent {ascent} /Descent {ascent - _UNITS_PER_EM} /CapHeight {ascent} /StemV 80 "
+            f"/FontFile2 {font_file} 0 R >>".encode('ascii')
+        )
+        font = _glyphless_font()
+        self._write_stream(font_file, f"/Length1 {len(font)}", font)
+        # Every code draws glyph 1
+        self._write_stream(
+            cid_to_gid, "/Filter /FlateDecode", zlib.compress(b'\x00\x01' * 65536)
+        )
+        self._write_stream(to_unicode, "", _to_unicode_cmap())
+
+    @property
+    def page_count(self):
+        return len(self._pages)
+
+    def close(self):
+        """Write the page tree, cross-reference table and trailer."""
+        if self._file is None:
+            return
+        self._write_font()
+        kids = " ".join(f"{number} 0 R" for number in self._pages)
+        self._write_object(
+            _PAGES, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._pages)} >>".encode('ascii')
+        )
+        self._write_object(_CATALOG, f"<< /Type /Catalog /Pages {_PAGES} 0 R >>".encode('ascii'))
+
+        xref_offset = self._file.tell()
+        count = self._next_number
+        self._file.write(f"xref\n0 {count}\n0000000000 65535 f \n".encode('ascii'))
+        for number in range(1, count):
+            self._file.write(f"{self._offsets[number]:010d} 00000 n \n".encode('ascii'))
+        self._file.write(
+            f"trailer\n<< /Size {count} /Root {_CATALOG} 0 R >>\n"
+            f"startxref\n{xref_offset}\n%%EOF\n".encode('ascii')
+        )
+        self._file.close()
+        self._file = None
+        logging.info(f"Wrote searchable PDF {self.path} ({len(self._pages)} pages)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _iter_pages(source, page_range):
+    """Yield (0-based page index, grayscale image, dpi) for a PDF or image."""
+    if source.lower().endswith('.pdf'):
+        from pdf2image import convert_from_path, pdfinfo_from_path
+        dpi = app_settings.get('searchable_pdf_dpi', 300)
+        total_pages = pdfinfo_from_path(source)['Pages']
+        if page_range:
+            start_page = max(0, page_range[0] - 1)  # Convert to 0-based
+            end_page = min(total_pages, page_range[1])  # Already 1-based
+        else:
+            start_page = 0
+            end_page = total_pages
+        for page_num in range(start_page, end_page):
+            yield page_num, convert_from_path(
+                source, dpi=dpi, first_page=page_num + 1, last_page=page_num + 1, grayscale=True
+            )[0], dpi
+    else:
+        from scrapey.images import iter_image_frames
+        for frame_num, gray in iter_image_frames(source, page_range):
+            dpi = gray.info.get('dpi', (0, 0))[0] or 300
+            yield frame_num, gray, float(dpi)
+
+
+def write_searchable_pages(source, writer, engine='tesseract', page_range=None, deduper=None):
+    """OCR a scanned PDF or image once, appending its pages to a searchable PDF.
+
+    Args:
+        source: Path to a PDF or image file
+        writer: SearchablePDFWriter to append pages to
+        engine: 'tesseract' or 'easyocr'; the cascade has no single word-box
+            pass, so it is read with Tesseract
+        page_range: Optional tuple of (start_page, end_page) (1-based)
+        deduper: Optional PageDeduper; duplicate pages reuse the earlier
+            page's words
+
+    Returns:
+        str: The extracted text, formatted like ocr_scanned_pdf/perform_ocr
+    """
+    from scrapey.images import is_multi_frame, get_image_frame_count
+    from scrapey.layout import LAYOUT_ENGINES, capture_layout
+
+    if engine.lower() not in LAYOUT_ENGINES:
+        logging.info(f"Searchable PDF output reads pages with Tesseract instead of {engine}")
+        engine = 'tesseract'
+    labelled = source.lower().endswith('.pdf') or (
+        is_multi_frame(source) and get_image_frame_count(source) > 1
+    )
+    try:
+        text_parts = []
+        for page_num, gray, dpi in _iter_pages(source, page_range):
+            def capture(gray=gray):
+                return capture_layout(gray, engine)
+
+            layout = deduper.run(gray, capture) if deduper else capture()
+            writer.add_page(gray, layout, dpi)
+            text = layout.query()
+            if not labelled:
+                return text
+            if text:
+                text_parts.append(f"=== Page {page_num + 1} ===\n{text}\n")
+        return "\n".join(text_parts)
+    except Exception as e:
+        logging.exception("Error writing searchable PDF:")
+        raise
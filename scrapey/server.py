@@ -0,0 +1,625 @@
+"""
+Local HTTP extraction service.
+
+Usage:
+    python -m scrapey.server [--host 127.0.0.1] [--port 8765] [--workers N]
+
+Endpoints (PDF and image bodies are sent raw, as the request body):
+
+    POST /extract/pdf   PDF text layer            -> 202 {"job_id", "total_pages"}
+    POST /ocr/pdf       OCR of a scanned PDF      -> 202 {"job_id", "total_pages"}
+    POST /ocr/image     OCR of one image          -> 200 {"text"}
+    POST /extract/web   JSON {"url": ...}         -> 200 {"text"}
+    GET  /jobs/{id}         job status, plus the full text once done
+    GET  /jobs/{id}/pages   page results as NDJSON, streamed as pages finish
+    GET  /metrics           queue depths and per-endpoint latency
+    GET  /health
+
+PDF endpoints accept ?page_start=&page_end= (1-based) and the OCR endpoints
+?engine=. Work runs in a pool of warm worker processes with the OCR engines
+preloaded. Image requests are sent to the pool one by one while a worker is
+free; requests that queue up while every worker is busy are micro-batched.
+A PDF job keeps at most one task per worker in the pool and lets queued
+image requests take the next free worker, so long jobs don't starve them.
+"""
+import argparse
+import asyncio
+import collections
+import functools
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from scrapey.utils import app_settings, load_settings
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+# --- Worker process side -----------------------------------------------------
+
+def _init_worker(preload_engines):
+    load_settings()
+    for engine in preload_engines:
+        try:
+            if engine == 'tesseract':
+                import pytesseract
+                pytesseract.get_tesseract_version()
+            elif engine == 'easyocr':
+                from scrapey.easyocr_cpu import get_easyocr_reader
+                get_easyocr_reader([app_settings.get('ocr_language', 'eng')])
+        except Exception:
+            logging.exception(f"Could not preload OCR engine {engine}:")
+
+
+def _portable_errors(func):
+    # Some engine exceptions (e.g. pytesseract's) can't be unpickled in the
+    # parent, which breaks the whole pool; send them back as RuntimeError.
+    @functools.wraps(func)
+    def wrapper(*args):
+        try:
+            return func(*args)
+        except Exception as e:
+            raise RuntimeError(f"{type(e).__name__}: {e}") from None
+    return wrapper
+
+
+def _ping():
+    return os.getpid()
+
+
+@_portable_errors
+def _pdf_page_count(file_path):
+    from scrapey.pdf import get_pdf_page_count, forget_document
+    try:
+        return get_pdf_page_count(file_path)
+    finally:
+        # Uploads are deleted when their job ends; don't keep them open
+        forget_document(file_path)
+
+
+@_portable_errors
+def _extract_pdf_shard(file_path, start_page, end_page):
+    from scrapey.pdf import extract_pdf_pages, forget_document
+    try:
+        return extract_pdf_pages(file_path, start_page, end_page)
+    finally:
+        forget_document(file_path)
+
+
+@_portable_errors
+def _ocr_pdf_page(file_path, page_index, engine):
+    from pdf2image import convert_from_path
+    from scrapey.ocr import ocr_page
+    image = convert_from_path(
+        file_path, first_page=page_index + 1, last_page=page_index + 1, grayscale=True
+    )[0]
+    return [(page_index, ocr_page(image, engine))]
+
+
+def _save_image(data):
+    """Write an uploaded image to a temp file named for its format."""
+    from PIL import Image
+    with Image.open(io.BytesIO(data)) as img:
+        suffix = '.tif' if img.format == 'TIFF' else f".{(img.format or 'img').lower()}"
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def _ocr_image_batch(images, engine):
+    # Errors are reported per image so one bad upload doesn't fail its batch.
+    # Each image goes through perform_ocr like a local file, so every frame
+    # of a TIFF is read, oversized frames are banded and the pixel limit holds.
+    from scrapey.ocr import perform_ocr
+    results = []
+    for data in images:
+        try:
+            path = _save_image(data)
+            try:
+                results.append((True, perform_ocr(path, engine)))
+            finally:
+                os.remove(path)
+        except Exception as e:
+            results.append((False, f"{type(e).__name__}: {e}"))
+    return results
+
+
+@_portable_errors
+def _extract_web(url, engine):
+    from scrapey.web import extract_web_text
+    return extract_web_text(url, engine)
+
+
+# --- Service side --------------------------------------------------------------
+
+class Job:
+    """A long-running PDF extraction whose pages arrive out of order."""
+
+    def __init__(self, kind, total_pages, file_path):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.total_pages = total_pages
+        self.file_path = file_path
+        self.pages = {}
+        self.status = 'running'
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self._changed = asyncio.Condition()
+
+    async def add_pages(self, pages):
+        async with self._changed:
+            for page_index, text in pages:
+                self.pages[page_index] = text
+            self._changed.notify_all()
+
+    async def finish(self, error=None):
+        async with self._changed:
+            self.status = 'failed' if error else 'done'
+            self.error = error
+            self.finished = time.time()
+            self._changed.notify_all()
+
+    async def wait_for_change(self, seen):
+        async with self._changed:
+            await self._changed.wait_for(
+                lambda: len(self.pages) != seen or self.status != 'running'
+            )
+
+    def text(self):
+        return "\n".join(
+            f"=== Page {index + 1} ===\n{self.pages[index]}\n"
+            for index in sorted(self.pages) if self.pages[index]
+        )
+
+    def describe(self):
+        info = {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'total_pages': self.total_pages,
+            'pages_done': len(self.pages),
+        }
+        if self.error:
+            info['error'] = self.error
+        if self.status == 'done':
+            info['text'] = self.text()
+        return info
+
+
+class Metrics:
+    """Request counts and recent latencies per endpoint."""
+
+    def __init__(self, window=1000):
+        self.counts = collections.Counter()
+        self.errors = collections.Counter()
+        self.latencies = collections.defaultdict(lambda: collections.deque(maxlen=window))
+
+    def record(self, endpoint, seconds, failed=False):
+        self.counts[endpoint] += 1
+        if failed:
+            self.errors[endpoint] += 1
+        self.latencies[endpoint].append(seconds)
+
+    def summary(self):
+        endpoints = {}
+        for endpoint, samples in self.latencies.items():
+            ordered = sorted(samples)
+
+            def percentile(p):
+                return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+            endpoints[endpoint] = {
+                'requests': self.counts[endpoint],
+                'errors': self.errors[endpoint],
+                'p50_ms': round(percentile(0.50) * 1000, 1),
+                'p95_ms': round(percentile(0.95) * 1000, 1),
+                'max_ms': round(ordered[-1] * 1000, 1),
+            }
+        return endpoints
+
+
+class ImageBatcher:
+    """Collects image OCR requests into batches for the worker pool.
+
+    A batch runs serially in one worker, so images are only batched when
+    every worker is busy; otherwise each image is dispatched on its own.
+    Images queued behind a busy pool wait for a worker to free up (checked
+    every window_ms) and are then split into batches of at most max_batch,
+    about one batch per worker.
+    """
+
+    def __init__(self, service, max_batch=8, window_ms=20):
+        self.service = service
+        self.max_batch = max_batch
+        self.window = window_ms / 1000
+        self.queue = None
+        self.idle = None
+        self.batches = 0
+        self.batched_images = 0
+        self._task = None
+        self._starting = 0  # Dispatches created but not yet counted by the pool
+
+    def start(self):
+        # Created here, inside the running loop: on Python 3.9 a Queue binds
+        # to the loop current at construction, which is not aiohttp's.
+        self.queue = asyncio.Queue()
+        # Set while no image is waiting for a worker; PDF jobs wait on it
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def submit(self, data, engine):
+        future = asyncio.get_running_loop().create_future()
+        self.idle.clear()
+        await self.queue.put((data, engine, future))
+        return await future
+
+    def _workers_busy(self):
+        return self.service.pending_tasks + self._starting >= self.service.workers
+
+    async def _run(self):
+        while True:
+            batch = [await self.queue.get()]
+            while self._workers_busy():
+                await asyncio.sleep(self.window)
+            share = -(-(len(batch) + self.queue.qsize()) // self.service.workers)
+            while len(batch) < min(self.max_batch, share):
+                batch.append(self.queue.get_nowait())
+            # A batch runs on one engine; split if requests asked for different ones
+            by_engine = collections.defaultdict(list)
+            for item in batch:
+                by_engine[item[1]].append(item)
+            for engine, items in by_engine.items():
+                self._starting += 1
+                asyncio.create_task(self._dispatch(engine, items))
+            if self.queue.empty():
+                self.idle.set()
+
+    async def _dispatch(self, engine, items):
+        self.batches += 1
+        self.batched_images += len(items)
+        try:
+            # run_in_pool counts the task before its first await
+            self._starting -= 1
+            results = await self.service.run_in_pool(
+                _ocr_image_batch, [data for data, _, _ in items], engine
+            )
+            for (_, _, future), (ok, value) in zip(items, results):
+                if future.done():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(RuntimeError(value))
+        except Exception as e:
+            for _, _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+
+
+class ExtractionService:
+    """aiohttp application wiring the endpoints to the worker pool.
+
+    Args:
+        workers: Worker processes
+        preload: OCR engines to load in each worker at startup
+        job_ttl: Seconds a finished job is kept for clients to collect
+    """
+
+    def __init__(self, workers=None, preload=('tesseract',), max_batch=8,
+                 batch_window_ms=20, job_ttl=3600):
+        self.workers = workers or os.cpu_count() or 1
+        self.preload = tuple(preload)
+        self.job_ttl = job_ttl
+        self.pool = None
+        self.jobs = {}
+        self.metrics = Metrics()
+        self.pending_tasks = 0
+        self.batcher = ImageBatcher(self, max_batch, batch_window_ms)
+        self._job_tasks = set()
+        self._reaper = None
+
+    async def run_in_pool(self, func, *args):
+        self.pending_tasks += 1
+        pool = self.pool
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(pool, func, *args)
+        except BrokenProcessPool:
+            # A worker died; replace the pool so later requests still work
+            if self.pool is pool:
+                logging.error("Worker pool broke, starting a new one")
+                pool.shutdown(wait=False)
+                self.pool = self._make_pool()
+            raise
+        finally:
+            self.pending_tasks -= 1
+
+    def _make_pool(self):
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(self.preload,)
+        )
+
+    # Lifecycle
+
+    async def on_startup(self, app):
+        self.pool = self._make_pool()
+        # Start every worker now so the first request doesn't pay for it
+        pids = await asyncio.gather(*[self.run_in_pool(_ping) for _ in range(self.workers)])
+        logging.info(f"Extraction service workers ready: {sorted(set(pids))}")
+        self.batcher.start()
+        self._reaper = asyncio.create_task(self._reap_jobs())
+
+    async def on_cleanup(self, app):
+        await self.batcher.stop()
+        if self._reaper:
+            self._reaper.cancel()
+        for task in list(self._job_tasks):
+            task.cancel()
+        await asyncio.gather(*self._job_tasks, return_exceptions=True)
+        self.pool.shutdown(wait=True)
+        for job in self.jobs.values():
+            self._remove_upload(job)
+
+    async def _reap_jobs(self):
+        while True:
+            await asyncio.sleep(60)
+            cutoff = time.time() - self.job_ttl
+            for job_id, job in list(self.jobs.items()):
+                if job.finished and job.finished < cutoff:
+                    del self.jobs[job_id]
+
+    @staticmethod
+    def _remove_upload(job):
+        from scrapey.pdf import forget_document
+        if job.file_path:
+            forget_document(job.file_path)
+            if os.path.exists(job.file_path):
+                os.remove(job.file_path)
+
+    # Helpers
+
+    @staticmethod
+    async def _save_upload(request, suffix):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                async for chunk in request.content.iter_chunked(UPLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+        except Exception:
+            os.remove(path)
+            raise
+        return path
+
+    @staticmethod
+    def _page_bounds(request, total_pages):
+        start_page = max(0, int(request.query.get('page_start', 1)) - 1)  # Convert to 0-based
+        end_page = min(total_pages, int(request.query.get('page_end', total_pages)))  # Already 1-based
+        return start_page, end_page
+
+    def _engine(self, request):
+        return request.query.get('engine', app_settings.get('default_ocr_engine', 'tesseract')).lower()
+
+    def timed(self, endpoint, handler):
+        from aiohttp import web
+
+        async def wrapper(request):
+            start = time.perf_counter()
+            failed = False
+            try:
+                return await handler(request)
+            except web.HTTPException:
+                raise
+            except Exception as e:
+                failed = True
+                logging.exception(f"Error handling {endpoint}:")
+                return web.json_response({'error': str(e)}, status=500)
+            finally:
+                self.metrics.record(endpoint, time.perf_counter() - start, failed)
+        return wrapper
+
+    async def _start_pdf_job(self, request, kind):
+        from aiohttp import web
+
+        path = await self._save_upload(request, '.pdf')
+        try:
+            # Parsing a large PDF would stall the event loop; count in a worker
+            total_pages = await self.run_in_pool(_pdf_page_count, path)
+            start_page, end_page = self._page_bounds(request, total_pages)
+        except BrokenProcessPool:
+            os.remove(path)
+            raise
+        except (RuntimeError, ValueError) as e:
+            os.remove(path)
+            raise web.HTTPBadRequest(text=f"Could not read PDF: {e}")
+        except Exception:
+            os.remove(path)
+            raise
+        job = Job(kind, end_page - start_page, path)
+        self.jobs[job.id] = job
+
+        if kind == 'extract':
+            shard_pages = max(1, app_settings.get('pdf_shard_pages', 50))
+            tasks = [
+                (_extract_pdf_shard, path, shard_start, min(end_page, shard_start + shard_pages))
+                for shard_start in range(start_page, end_page, shard_pages)
+            ]
+        else:
+            engine = self._engine(request)
+            tasks = [(_ocr_pdf_page, path, page, engine) for page in range(start_page, end_page)]
+
+        task = asyncio.create_task(self._run_job(job, tasks))
+        self._job_tasks.add(task)
+        task.add_done_callback(self._job_tasks.discard)
+        return web.json_response(
+            {'job_id': job.id, 'total_pages': job.total_pages}, status=202
+        )
+
+    async def _run_job(self, job, tasks):
+        # At most one task per worker is in the pool for this job, and image
+        # requests waiting for a worker go first, so they interleave with
+        # long jobs instead of queueing behind every page.
+        in_flight = asyncio.Semaphore(self.workers)
+
+        async def run(func, *args):
+            async with in_flight:
+                await self.batcher.idle.wait()
+                pages = await self.run_in_pool(func, *args)
+            await job.add_pages(pages)
+        try:
+            await asyncio.gather(*[run(*task) for task in tasks])
+            await job.finish()
+        except Exception as e:
+            logging.exception(f"Job {job.id} failed:")
+            await job.finish(str(e))
+        finally:
+            self._remove_upload(job)
+
+    # Handlers
+
+    async def extract_pdf(self, request):
+        return await self._start_pdf_job(request, 'extract')
+
+    async def ocr_pdf(self, request):
+        return await self._start_pdf_job(request, 'ocr')
+
+    async def ocr_image(self, request):
+        from aiohttp import web
+        data = await request.read()
+        if not data:
+            raise web.HTTPBadRequest(text="Empty image body")
+        from PIL import Image
+        try:
+            # Only the header is read; decoding happens in the worker
+            with Image.open(io.BytesIO(data)) as img:
+                width, height = img.size
+        except Exception as e:
+            raise web.HTTPBadRequest(text=f"Could not read image: {e}")
+        pixel_limit = app_settings.get('image_pixel_limit', 178956970)
+        if pixel_limit and width * height > pixel_limit:
+            raise web.HTTPBadRequest(
+                text=f"Image is {width}x{height}, above the image_pixel_limit of {pixel_limit} pixels"
+            )
+        text = await self.batcher.submit(data, self._engine(request))
+        return web.json_response({'text': text})
+
+    async def extract_web(self, request):
+        from aiohttp import web
+        body = await request.json()
+        url = body.get('url')
+        if not url:
+            raise web.HTTPBadRequest(text="Missing 'url'")
+        text = await self.run_in_pool(_extract_web, url, self._engine(request))
+        return web.json_response({'text': text})
+
+    def _get_job(self, request):
+        from aiohttp import web
+        job = self.jobs.get(request.match_info['job_id'])
+        if job is None:
+            raise web.HTTPNotFound(text="Unknown job")
+        return job
+
+    async def job_status(self, request):
+        from aiohttp import web
+        return web.json_response(self._get_job(request).describe())
+
+    async def job_pages(self, request):
+        from aiohttp import web
+        job = self._get_job(request)
+        response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+        await response.prepare(request)
+        sent = set()
+        while True:
+            for page_index in sorted(set(job.pages) - sent):
+                line = json.dumps({'page': page_index + 1, 'text': job.pages[page_index]})
+                await response.write(line.encode('utf-8') + b'\n')
+                sent.add(page_index)
+            if job.status != 'running' and len(sent) == len(job.pages):
+                break
+            await job.wait_for_change(len(sent))
+        trailer = {'status': job.status}
+        if job.error:
+            trailer['error'] = job.error
+        await response.write(json.dumps(trailer).encode('utf-8') + b'\n')
+        await response.write_eof()
+        return response
+
+    async def metrics_handler(self, request):
+        from aiohttp import web
+        return web.json_response({
+            'workers': self.workers,
+            'pool_pending_tasks': self.pending_tasks,
+            'image_queue_depth': self.batcher.queue.qsize() if self.batcher.queue else 0,
+            'image_batches': self.batcher.batches,
+            'image_mean_batch_size': (
+                round(self.batcher.batched_images / self.batcher.batches, 2)
+                if self.batcher.batches else None
+            ),
+            'jobs_running': sum(1 for job in self.jobs.values() if job.status == 'running'),
+            'jobs_kept': len(self.jobs),
+            'endpoints': self.metrics.summary(),
+        })
+
+    async def health(self, request):
+        from aiohttp import web
+        return web.json_response({'status': 'ok'})
+
+    def make_app(self):
+        from aiohttp import web
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.on_startup.append(self.on_startup)
+        app.on_cleanup.append(self.on_cleanup)
+        app.router.add_post('/extract/pdf', self.timed('extract_pdf', self.extract_pdf))
+        app.router.add_post('/ocr/pdf', self.timed('ocr_pdf', self.ocr_pdf))
+        app.router.add_post('/ocr/image', self.timed('ocr_image', self.ocr_image))
+        app.router.add_post('/extract/web', self.timed('extract_web', self.extract_web))
+        app.router.add_get('/jobs/{job_id}', self.job_status)
+        app.router.add_get('/jobs/{job_id}/pages', self.job_pages)
+        app.router.add_get('/metrics', self.metrics_handler)
+        app.router.add_get('/health', self.health)
+        return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m scrapey.server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--preload', action='append', choices=['tesseract', 'easyocr'],
+                        help='OCR engine to load in each worker at startup (repeatable)')
+    parser.add_argument('--batch-size', type=int, default=8, help='Max images per OCR batch')
+    parser.add_argument('--batch-window', type=float, default=20,
+                        help='Milliseconds between checks for a free worker while images are queued')
+    args = parser.parse_args(argv)
+
+    from aiohttp import web
+    load_settings()
+    logging.getLogger().addHandler(logging.StreamHandler())
+
+    service = ExtractionService(
+        workers=args.workers,
+        preload=args.preload or ['tesseract'],
+        max_batch=args.batch_size,
+        batch_window_ms=args.batch_window,
+    )
+    web.run_app(service.make_app(), host=args.host, port=args.port)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
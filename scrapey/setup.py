@@ -33,6 +33,7 @@ setup(
         "easyocr>=1.7.1",
         "beautifulsoup4>=4.12.2",
         "requests>=2.31.0",
+        "aiohttp>=3.9.0",
         "Pillow>=10.0.0",
         "numpy>=1.24.0",
         "scipy>=1.10.0",
@@ -42,6 +43,8 @@ setup(
     entry_points={
         "console_scripts": [
             "scrapey=scrapey.main:main",
+            "scrapey-watch=scrapey.watch:main",
+            "scrapey-server=scrapey.server:main",
         ],
     },
     include_package_data=True,
@@ -13,7 +13,38 @@ logging.basicConfig(
 app_settings = {
     'ocr_language': 'eng',
     'default_ocr_engine': 'tesseract',
-    'default_output_format': 'Text'
+    'default_output_format': 'Text',
+    'easyocr_fast_cpu': False,
+    'easyocr_torchscript': False,
+    # Benchmark only, not saved: skip EasyOCR's int8 CPU quantization
+    'easyocr_full_precision': False,
+    'model_cache_dir': os.path.join(os.path.expanduser('~'), '.cache', 'scrapey'),
+    'cascade_escalation_engine': 'easyocr',
+    'cascade_min_confidence': 70,
+    'cascade_max_weak_fraction': 0.5,
+    'cascade_low_dpi': 150,
+    'cascade_high_dpi': 300,
+    'cascade_image_scale': 0.5,
+    'pdf_backend': 'pypdf2',
+    'pdf_workers': 0,
+    'pdf_shard_pages': 50,
+    'ocr_workers': 1,
+    'max_image_pixels': 40000000,
+    'image_pixel_limit': 178956970,
+    'crawl_depth': 2,
+    'crawl_max_pages': 500,
+    'crawl_concurrency': 8,
+    'crawl_per_host': 2,
+    'crawl_delay': 0.5,
+    'download_chunk_size': 1024 * 1024,
+    'download_timeout': 60,
+    'download_cache_max_mb': 2048,
+    'dedup_pages': False,
+    'dedup_max_distance': 6,
+    'dedup_hash': 'dct',
+    'dedup_max_pixel_difference': 6.0,
+    'searchable_pdf_dpi': 300,
+    'searchable_pdf_jpeg_quality': 85
 }
 
 def load_settings():
@@ -24,13 +55,71 @@ def load_settings():
             app_settings['ocr_language'] = config['Settings'].get('ocr_language', 'eng')
             app_settings['default_ocr_engine'] = config['Settings'].get('default_ocr_engine', 'tesseract')
             app_settings['default_output_format'] = config['Settings'].get('default_output_format', 'Text')
+            app_settings['easyocr_fast_cpu'] = config['Settings'].getboolean('easyocr_fast_cpu', False)
+            app_settings['easyocr_torchscript'] = config['Settings'].getboolean('easyocr_torchscript', False)
+            app_settings['model_cache_dir'] = config['Settings'].get('model_cache_dir', app_settings['model_cache_dir'])
+            app_settings['cascade_escalation_engine'] = config['Settings'].get('cascade_escalation_engine', 'easyocr')
+            app_settings['cascade_min_confidence'] = config['Settings'].getint('cascade_min_confidence', 70)
+            app_settings['cascade_max_weak_fraction'] = config['Settings'].getfloat('cascade_max_weak_fraction', 0.5)
+            app_settings['cascade_low_dpi'] = config['Settings'].getint('cascade_low_dpi', 150)
+            app_settings['cascade_high_dpi'] = config['Settings'].getint('cascade_high_dpi', 300)
+            app_settings['cascade_image_scale'] = config['Settings'].getfloat('cascade_image_scale', 0.5)
+            app_settings['pdf_backend'] = config['Settings'].get('pdf_backend', 'pypdf2')
+            app_settings['pdf_workers'] = config['Settings'].getint('pdf_workers', 0)
+            app_settings['pdf_shard_pages'] = config['Settings'].getint('pdf_shard_pages', 50)
+            app_settings['ocr_workers'] = config['Settings'].getint('ocr_workers', 1)
+            app_settings['max_image_pixels'] = config['Settings'].getint('max_image_pixels', 40000000)
+            app_settings['image_pixel_limit'] = config['Settings'].getint('image_pixel_limit', 178956970)
+            app_settings['crawl_depth'] = config['Settings'].getint('crawl_depth', 2)
+            app_settings['crawl_max_pages'] = config['Settings'].getint('crawl_max_pages', 500)
+            app_settings['crawl_concurrency'] = config['Settings'].getint('crawl_concurrency', 8)
+            app_settings['crawl_per_host'] = config['Settings'].getint('crawl_per_host', 2)
+            app_settings['crawl_delay'] = config['Settings'].getfloat('crawl_delay', 0.5)
+            app_settings['download_chunk_size'] = config['Settings'].getint('download_chunk_size', 1024 * 1024)
+            app_settings['download_timeout'] = config['Settings'].getint('download_timeout', 60)
+            app_settings['download_cache_max_mb'] = config['Settings'].getint('download_cache_max_mb', 2048)
+            app_settings['dedup_pages'] = config['Settings'].getboolean('dedup_pages', False)
+            app_settings['dedup_max_distance'] = config['Settings'].getint('dedup_max_distance', 6)
+            app_settings['dedup_hash'] = config['Settings'].get('dedup_hash', 'dct')
+            app_settings['dedup_max_pixel_difference'] = config['Settings'].getfloat('dedup_max_pixel_difference', 6.0)
+            app_settings['searchable_pdf_dpi'] = config['Settings'].getint('searchable_pdf_dpi', 300)
+            app_settings['searchable_pdf_jpeg_quality'] = config['Settings'].getint('searchable_pdf_jpeg_quality', 85)
 
 def save_settings():
     config = configparser.ConfigParser()
     config['Settings'] = {
         'ocr_language': app_settings['ocr_language'],
         'default_ocr_engine': app_settings['default_ocr_engine'],
-        'default_output_format': app_settings['default_output_format']
+        'default_output_format': app_settings['default_output_format'],
+        'easyocr_fast_cpu': str(app_settings['easyocr_fast_cpu']),
+        'easyocr_torchscript': str(app_settings['easyocr_torchscript']),
+        'model_cache_dir': app_settings['model_cache_dir'],
+        'cascade_escalation_engine': app_settings['cascade_escalation_engine'],
+        'cascade_min_confidence': str(app_settings['cascade_min_confidence']),
+        'cascade_max_weak_fraction': str(app_settings['cascade_max_weak_fraction']),
+        'cascade_low_dpi': str(app_settings['cascade_low_dpi']),
+        'cascade_high_dpi': str(app_settings['cascade_high_dpi']),
+        'cascade_image_scale': str(app_settings['cascade_image_scale']),
+        'pdf_backend': app_settings['pdf_backend'],
+        'pdf_workers': str(app_settings['pdf_workers']),
+        'pdf_shard_pages': str(app_settings['pdf_shard_pages']),
+        'ocr_workers': str(app_settings['ocr_workers']),
+        'max_image_pixels': str(app_settings['max_image_pixels']),
+        'image_pixel_limit': str(app_settings['image_pixel_limit']),
+        'crawl_depth': str(app_settings['crawl_depth']),
+        'crawl_max_pages': str(app_settings['crawl_max_pages']),
+        'crawl_concurrency': str(app_settings['crawl_concurrency']),
+        'crawl_per_host': str(app_settings['crawl_per_host']),
+        'crawl_delay': str(app_settings['crawl_delay']),
+        'download_chunk_size': str(app_settings['download_chunk_size']),
+        'download_timeout': str(app_settings['download_timeout']),
+        'download_cache_max_mb': str(app_settings['download_cache_max_mb']),
+        'dedup_pages': str(app_settings['dedup_pages']),
+        'dedup_max_distance': str(app_settings['dedup_max_distance']),
+        'dedup_hash': app_settings['dedup_hash'],
+        'dedup_max_pixel_difference': str(app_settings['dedup_max_pixel_difference']),
+        'searchable_pdf_dpi': str(app_settings['searchable_pdf_dpi']),
+        'searchable_pdf_jpeg_quality': str(app_settings['searchable_pdf_jpeg_quality'])
     }
     with open('scrapey.ini', 'w') as f:
         config.write(f)
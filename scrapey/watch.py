@@ -0,0 +1,378 @@
+"""
+Headless watch-folder ingest.
+
+Usage:
+    python -m scrapey.watch WATCH_DIR [--output-dir DIR] [--workers N]
+
+New PDFs and images dropped into WATCH_DIR are picked up (inotify when the
+optional inotify_simple package is installed, directory polling otherwise),
+held until they have stopped changing for --settle seconds, and extracted in
+a bounded process pool. Text is written next to each file as NAME.txt, or
+into --output-dir.
+
+Finished files are recorded in a SQLite ledger keyed by path, size and mtime,
+so restarts never re-process a file. A file that keeps killing its worker
+process is retried on its own and recorded as failed after --max-crashes
+crashes. Memory use stays flat: the ledger lives on disk, at most --queue
+files are in flight, and worker processes are recycled after
+--tasks-per-worker files.
+"""
+import argparse
+import logging
+import os
+import signal
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from scrapey.utils import app_settings, load_settings
+
+PDF_EXTENSIONS = ('.pdf',)
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+INGEST_EXTENSIONS = PDF_EXTENSIONS + IMAGE_EXTENSIONS
+
+# ProcessPoolExecutor's max_tasks_per_child is new in Python 3.11; before
+# that the watcher recycles workers by replacing the whole pool.
+_RECYCLES_WORKERS = sys.version_info >= (3, 11)
+
+
+def extract_file(file_path, engine):
+    """Extract text from a PDF or image with the regular extraction functions.
+
+    PDFs without a text layer are OCR'd as scans.
+    """
+    from scrapey.ocr import perform_ocr, ocr_scanned_pdf
+    from scrapey.pdf import extract_pdf_text
+
+    if file_path.lower().endswith(PDF_EXTENSIONS):
+        # Already inside a pool worker, so don't shard into a nested pool
+        text = extract_pdf_text(file_path, workers=1)
+        if not text.strip():
+            text = ocr_scanned_pdf(file_path, engine)
+        return text
+    return perform_ocr(file_path, engine)
+
+
+def process_file(file_path, output_path, engine):
+    """Pool task: extract one file and write its text atomically.
+
+    Returns:
+        tuple: (file_path, characters written, seconds taken)
+    """
+    start = time.perf_counter()
+    text = extract_file(file_path, engine)
+    temp_path = output_path + '.part'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temp_path, output_path)
+    return file_path, len(text), time.perf_counter() - start
+
+
+class Ledger:
+    """On-disk record of files that have been processed."""
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS processed ("
+            " path TEXT NOT NULL, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,"
+            " status TEXT NOT NULL, finished_at REAL NOT NULL,"
+            " PRIMARY KEY (path, size, mtime_ns))"
+        )
+        self.connection.commit()
+
+    def contains(self, key):
+        row = self.connection.execute(
+            "SELECT 1 FROM processed WHERE path = ? AND size = ? AND mtime_ns = ?", key
+        ).fetchone()
+        return row is not None
+
+    def record(self, key, status):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO processed VALUES (?, ?, ?, ?, ?)",
+            key + (status, time.time())
+        )
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+class _InotifySource:
+    """Reports paths written or moved into a directory, via inotify."""
+
+    def __init__(self, directory):
+        import inotify_simple
+        self.flags = inotify_simple.flags
+        self.inotify = inotify_simple.INotify()
+        self.inotify.add_watch(
+            directory,
+            self.flags.CLOSE_WRITE | self.flags.MOVED_TO | self.flags.CREATE
+        )
+        self.directory = directory
+        self.overflowed = False
+
+    def read(self, timeout):
+        paths = []
+        for event in self.inotify.read(timeout=int(timeout * 1000)):
+            if event.mask & self.flags.Q_OVERFLOW:
+                self.overflowed = True
+            elif event.name:
+                paths.append(os.path.join(self.directory, event.name))
+        return paths
+
+    def close(self):
+        self.inotify.close()
+
+
+class FolderWatcher:
+    """Watch a directory and feed new documents to a bounded worker pool.
+
+    Args:
+        watch_dir: Directory to watch (not recursive)
+        output_dir: Where NAME.txt files go; next to the input if None
+        engine: OCR engine for images and scanned PDFs
+        workers: Worker processes
+        max_queue: Most files submitted to the pool at once (backpressure)
+        settle_seconds: A file must be unchanged this long before ingest
+        poll_seconds: Interval between scans in polling mode
+        rescan_seconds: Full directory rescans in inotify mode, to catch
+            events dropped under backpressure or on queue overflow
+        tasks_per_worker: Recycle a worker process after this many files.
+            Before Python 3.11 the whole pool is replaced instead, once it
+            has been given this many files per worker and has gone idle.
+        force_polling: Don't try inotify
+        max_crashes: Record a file as failed after it was in flight this
+            many times when the worker pool broke
+    """
+
+    def __init__(self, watch_dir, output_dir=None, engine=None, workers=None,
+                 max_queue=None, settle_seconds=5.0, poll_seconds=2.0,
+                 rescan_seconds=60.0, tasks_per_worker=200, ledger_path=None,
+                 force_polling=False, max_crashes=3):
+        self.watch_dir = os.path.abspath(watch_dir)
+        self.output_dir = output_dir
+        self.engine = engine or app_settings.get('default_ocr_engine', 'tesseract')
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue or self.workers * 2
+        self.settle_seconds = settle_seconds
+        self.poll_seconds = poll_seconds
+        self.rescan_seconds = rescan_seconds
+        self.tasks_per_worker = tasks_per_worker
+        self.ledger = Ledger(ledger_path or os.path.join(self.watch_dir, '.scrapey-ledger.sqlite'))
+        self.force_polling = force_polling
+        self.max_crashes = max_crashes
+        # path -> (size, mtime_ns, time the stat was last seen to change)
+        self._candidates = {}
+        # future -> ledger key
+        self._in_flight = {}
+        # ledger key -> pool crashes the file was in flight for
+        self._crashes = {}
+        self._stopping = False
+        self._pool_broken = False
+        # Files submitted to the current pool
+        self._pool_tasks = 0
+        self.processed = 0
+        self.failed = 0
+
+    def output_path(self, file_path):
+        name = os.path.splitext(os.path.basename(file_path))[0] + '.txt'
+        directory = self.output_dir or os.path.dirname(file_path)
+        return os.path.join(directory, name)
+
+    def stop(self, *args):
+        self._stopping = True
+
+    def _make_pool(self):
+        kwargs = {'max_workers': self.workers, 'initializer': load_settings}
+        if _RECYCLES_WORKERS and self.tasks_per_worker:
+            kwargs['max_tasks_per_child'] = self.tasks_per_worker
+        self._pool_tasks = 0
+        return ProcessPoolExecutor(**kwargs)
+
+    def _recycle_due(self):
+        """Whether the pool has had its share of files and must be replaced by hand."""
+        return (
+            not _RECYCLES_WORKERS and bool(self.tasks_per_worker)
+            and self._pool_tasks >= self.tasks_per_worker * self.workers
+        )
+
+    def _renew_pool(self, pool):
+        """Replace a broken pool, or an idle one that is due for recycling."""
+        if self._pool_broken or (self._recycle_due() and not self._in_flight):
+            if not self._pool_broken:
+                logging.info(f"Watch: recycling worker processes after {self._pool_tasks} files")
+            pool.shutdown(wait=False)
+            pool = self._make_pool()
+            self._pool_broken = False
+        return pool
+
+    def _consider(self, path):
+        if not path.lower().endswith(INGEST_EXTENSIONS):
+            return
+        if len(self._candidates) >= self.max_queue * 4 and path not in self._candidates:
+            # Under backpressure; the next rescan will find it again
+            return
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self._candidates.pop(path, None)
+            return
+        if self.ledger.contains((path, stat.st_size, stat.st_mtime_ns)):
+            return
+        if any(key[0] == path for key in self._in_flight.values()):
+            return
+        stamp = (stat.st_size, stat.st_mtime_ns)
+        previous = self._candidates.get(path)
+        if previous is None or previous[:2] != stamp:
+            self._candidates[path] = stamp + (time.monotonic(),)
+
+    def _scan(self):
+        with os.scandir(self.watch_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.startswith('.'):
+                    self._consider(entry.path)
+
+    def _submit_ready(self, pool):
+        now = time.monotonic()
+        for path, (size, mtime_ns, changed_at) in list(self._candidates.items()):
+            if len(self._in_flight) >= self.max_queue or self._recycle_due():
+                break
+            if any(key in self._crashes for key in self._in_flight.values()):
+                # A file that crashed the pool before runs alone, so another
+                # crash is charged to it rather than to its neighbours
+                break
+            if now - changed_at < self.settle_seconds:
+                continue
+            if (path, size, mtime_ns) in self._crashes and self._in_flight:
+                continue
+            # Re-check the stamp: the file may have changed since it was seen
+            self._consider(path)
+            if self._candidates.get(path, (None,))[:2] != (size, mtime_ns):
+                continue
+            del self._candidates[path]
+            future = pool.submit(process_file, path, self.output_path(path), self.engine)
+            self._in_flight[future] = (path, size, mtime_ns)
+            self._pool_tasks += 1
+
+    def _collect_finished(self):
+        for future in [f for f in self._in_flight if f.done()]:
+            key = self._in_flight.pop(future)
+            try:
+                path, chars, seconds = future.result()
+                self.ledger.record(key, 'done')
+                self._crashes.pop(key, None)
+                self.processed += 1
+                logging.info(f"Watch: extracted {path} ({chars} chars in {seconds:.1f}s)")
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for memory); the file may not be
+                # at fault, so it is retried on a fresh pool until it has been
+                # in flight for max_crashes crashes.
+                self._pool_broken = True
+                crashes = self._crashes.get(key, 0) + 1
+                if crashes >= self.max_crashes:
+                    del self._crashes[key]
+                    self.ledger.record(key, 'failed')
+                    self.failed += 1
+                    logging.error(
+                        f"Watch: worker pool broke {crashes} times while extracting {key[0]}, "
+                        f"giving up on it"
+                    )
+                else:
+                    self._crashes[key] = crashes
+                    logging.error(f"Watch: worker pool broke while extracting {key[0]}, restarting it")
+            except Exception:
+                # Recorded as failed so a broken file isn't retried forever;
+                # it is picked up again if it is replaced (new size/mtime).
+                self.ledger.record(key, 'failed')
+                self.failed += 1
+                logging.exception(f"Watch: failed to extract {key[0]}:")
+
+    def run(self):
+        """Watch until stop() is called (or SIGINT/SIGTERM is received)."""
+        if self.output_dir:
+            os.makedirs(self.output_dir, exist_ok=True)
+        source = None
+        if not self.force_polling:
+            try:
+                source = _InotifySource(self.watch_dir)
+                logging.info(f"Watching {self.watch_dir} with inotify")
+            except (ImportError, OSError) as e:
+                logging.info(f"inotify unavailable ({e}), polling {self.watch_dir}")
+        if source is None:
+            logging.info(f"Polling {self.watch_dir} every {self.poll_seconds}s")
+
+        pool = self._make_pool()
+        last_scan = 0.0
+        try:
+            while not self._stopping:
+                now = time.monotonic()
+                if source is None or source.overflowed or now - last_scan >= self.rescan_seconds:
+                    if source is not None:
+                        source.overflowed = False
+                    self._scan()
+                    last_scan = now
+
+                if source is not None:
+                    wait = self.poll_seconds if self._candidates or self._in_flight else 1.0
+                    for path in source.read(wait):
+                        self._consider(path)
+                else:
+                    time.sleep(self.poll_seconds)
+
+                self._collect_finished()
+                pool = self._renew_pool(pool)
+                self._submit_ready(pool)
+        finally:
+            logging.info("Watch: stopping, waiting for files in progress")
+            pool.shutdown(wait=True)
+            self._collect_finished()
+            if source is not None:
+                source.close()
+            self.ledger.close()
+            logging.info(f"Watch: {self.processed} files extracted, {self.failed} failed")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m scrapey.watch')
+    parser.add_argument('watch_dir', help='Directory to watch for new PDFs and images')
+    parser.add_argument('--output-dir', help='Write NAME.txt here instead of next to the input')
+    parser.add_argument('--engine', help='OCR engine (default: default_ocr_engine setting)')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--queue', type=int, help='Max files in flight (default: 2 x workers)')
+    parser.add_argument('--settle', type=float, default=5.0,
+                        help='Seconds a file must be unchanged before ingest')
+    parser.add_argument('--poll', type=float, default=2.0, help='Polling interval in seconds')
+    parser.add_argument('--tasks-per-worker', type=int, default=200,
+                        help='Recycle worker processes after this many files')
+    parser.add_argument('--ledger', help='Ledger database path (default: WATCH_DIR/.scrapey-ledger.sqlite)')
+    parser.add_argument('--force-polling', action='store_true', help='Never use inotify')
+    parser.add_argument('--max-crashes', type=int, default=3,
+                        help='Record a file as failed after it was in flight for this many worker crashes')
+    args = parser.parse_args(argv)
+
+    load_settings()
+    logging.getLogger().addHandler(logging.StreamHandler())
+
+    watcher = FolderWatcher(
+        args.watch_dir,
+        output_dir=args.output_dir,
+        engine=args.engine,
+        workers=args.workers,
+        max_queue=args.queue,
+        settle_seconds=args.settle,
+        poll_seconds=args.poll,
+        tasks_per_worker=args.tasks_per_worker,
+        ledger_path=args.ledger,
+        force_polling=args.force_polling,
+        max_crashes=args.max_crashes,
+    )
+    signal.signal(signal.SIGINT, watcher.stop)
+    signal.signal(signal.SIGTERM, watcher.stop)
+    watcher.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,196 @@
+import hashlib
+import logging
+import mimetypes
+import os
+import tempfile
+import time
+from collections import namedtuple
+from urllib.parse import urlsplit
 import requests
 from bs4 import BeautifulSoup
+from scrapey.utils import app_settings
 
-def extract_web_text(url):
+Download = namedtuple('Download', ['path', 'sha256', 'size', 'content_type'])
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.gif', '.webp')
+
+# Partial downloads older than this were left behind by an interrupted run
+STALE_PART_SECONDS = 24 * 60 * 60
+
+def classify_content(content_type, url):
+    """Decide how a web resource should be extracted.
+
+    Returns:
+        str: 'html', 'pdf', 'image', 'text', or None if unsupported
+    """
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    path = urlsplit(url).path.lower()
+    if content_type == 'application/pdf' or path.endswith('.pdf'):
+        return 'pdf'
+    if content_type.startswith('image/') or path.endswith(IMAGE_EXTENSIONS):
+        return 'image'
+    if content_type in ('text/html', 'application/xhtml+xml') or not content_type:
+        return 'html'
+    if content_type.startswith('text/'):
+        return 'text'
+    return None
+
+def document_suffix(kind, url, content_type):
+    """File extension to store a downloaded PDF or image under."""
+    if kind == 'pdf':
+        return '.pdf'
+    suffix = os.path.splitext(urlsplit(url).path)[1].lower()
+    if suffix in IMAGE_EXTENSIONS:
+        return suffix
+    # Keep a real extension so multi-page TIFFs are recognised as such
+    return mimetypes.guess_extension(content_type.split(';')[0].strip()) or ''
+
+def download_dir():
+    return os.path.join(app_settings.get('model_cache_dir'), 'downloads')
+
+def prune_download_cache(keep=None, max_bytes=None):
+    """Delete the least recently used downloads until the cache fits its limit.
+
+    Args:
+        keep: Path that is never deleted, e.g. the file just downloaded
+        max_bytes: Cache size limit, defaults to the 'download_cache_max_mb'
+            setting; 0 or less means unlimited
+    """
+    if max_bytes is None:
+        max_bytes = app_settings.get('download_cache_max_mb', 2048) * 1024 * 1024
+    directory = download_dir()
+    if not os.path.isdir(directory):
+        return
+    now = time.time()
+    entries = []
+    with os.scandir(directory) as scan:
+        for entry in scan:
+            if not entry.is_file():
+                continue
+            try:
+                stat = entry.stat()
+                if entry.name.endswith('.part'):
+                    if now - stat.st_mtime > STALE_PART_SECONDS:
+                        os.remove(entry.path)
+                    continue
+            except FileNotFoundError:
+                continue  # Removed by a concurrent download
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    if max_bytes <= 0 or total <= max_bytes:
+        return
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+    logging.info(f"Pruned download cache to {total} bytes")
+
+class DocumentWriter:
+    """Write a document into the download cache chunk by chunk.
+
+    The body is hashed while it is written, and the file is stored under its
+    SHA-256, so the same document fetched from different URLs is kept once.
+    Both blocking (requests) and async (aiohttp) downloads feed it chunks.
+    """
+
+    def __init__(self, suffix=''):
+        self.suffix = suffix
+        self.size = 0
+        self._digest = hashlib.sha256()
+        os.makedirs(download_dir(), exist_ok=True)
+        fd, self._temp_path = tempfile.mkstemp(dir=download_dir(), suffix='.part')
+        self._file = os.fdopen(fd, 'wb')
+
+    def write(self, chunk):
+        if chunk:
+            self._file.write(chunk)
+            self._digest.update(chunk)
+            self.size += len(chunk)
+
+    def finish(self):
+        """Store the file under its hash, then prune the cache.
+
+        Returns:
+            tuple: (path, sha256)
+        """
+        self._file.close()
+        sha256 = self._digest.hexdigest()
+        path = os.path.join(download_dir(), sha256 + self.suffix)
+        if os.path.exists(path):
+            os.remove(self._temp_path)
+            os.utime(path)  # Mark as recently used
+        else:
+            os.replace(self._temp_path, path)
+        prune_download_cache(keep=path)
+        return path, sha256
+
+    def discard(self):
+        self._file.close()
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+def download_document(response, suffix=''):
+    """Stream a requests response body to the download cache in fixed-size chunks.
+
+    Memory use is bounded by 'download_chunk_size', not by the file size.
+
+    Returns:
+        Download: path, sha256, size and content type of the stored file
+    """
+    chunk_size = app_settings.get('download_chunk_size', 1024 * 1024)
+    writer = DocumentWriter(suffix)
+    try:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            writer.write(chunk)
+        path, sha256 = writer.finish()
+    except BaseException:
+        writer.discard()
+        raise
+    logging.info(f"Downloaded {response.url} ({writer.size} bytes, sha256 {sha256})")
+    return Download(path, sha256, writer.size, response.headers.get('Content-Type', ''))
+
+def extract_document(path, kind, engine=None):
+    """Extract text from a downloaded PDF or image with the existing local paths."""
+    from scrapey.ocr import perform_ocr, ocr_scanned_pdf
+    from scrapey.pdf import extract_pdf_text
+
+    engine = engine or app_settings.get('default_ocr_engine', 'tesseract')
+    if kind == 'pdf':
+        text = extract_pdf_text(path)
+        if not text.strip():
+            # No text layer: treat it as a scanned document
+            logging.info(f"{path} has no text layer, running OCR")
+            text = ocr_scanned_pdf(path, engine)
+        return text
+    if kind == 'image':
+        return perform_ocr(path, engine)
+    raise ValueError(f"Unsupported document kind: {kind}")
+
+def extract_web_text(url, engine=None):
     """
-    Extract and return the text content from a web page using requests and BeautifulSoup.
+    Extract and return the text content from a web resource.
+    HTML is parsed with BeautifulSoup; PDFs and images are streamed to disk
+    and passed through PDF text extraction or OCR.
     """
-    response = requests.get(url)
-    if response.status_code != 200:
-        raise Exception(f"Error fetching URL: {response.status_code}")
-    soup = BeautifulSoup(response.text, "html.parser")
-    # Get all text, separating by newlines
-    return soup.get_text(separator="\n") 
\ No newline at end of file
+    timeout = app_settings.get('download_timeout', 60)
+    with requests.get(url, stream=True, timeout=timeout) as response:
+        if response.status_code != 200:
+            raise Exception(f"Error fetching URL: {response.status_code}")
+        content_type = response.headers.get('Content-Type', '')
+        kind = classify_content(content_type, response.url)
+        if kind == 'html':
+            soup = BeautifulSoup(response.text, "html.parser")
+            # Get all text, separating by newlines
+            return soup.get_text(separator="\n")
+        if kind == 'text':
+            return response.text
+        if kind is None:
+            raise Exception(f"Unsupported content type: {content_type}")
+        download = download_document(response, document_suffix(kind, response.url, content_type))
+    return extract_document(download.path, kind, engine)
@@ -0,0 +1,104 @@
+import pytest
+from PIL import Image, ImageDraw
+import scrapey.cascade
+from scrapey.cascade import cascade_page, merge_lines, read_lines
+from scrapey.layout import PageLayout
+
+# (word, confidence, paragraph, line, box) in the order Tesseract reports them
+WORDS = [
+    ('Dear', 95, 0, 0, (10, 10, 40, 20)),
+    ('Sir,', 93, 0, 0, (45, 8, 70, 22)),
+    ('thank', 40, 1, 1, (10, 40, 50, 52)),
+    ('you', 50, 1, 1, (55, 40, 80, 50)),
+    ('Regards', 90, 1, 2, (10, 60, 70, 72)),
+]
+
+
+def make_layout(words, size=(200, 100)):
+    return PageLayout(
+        [box for *_, box in words], [conf for _, conf, *_ in words],
+        [line for _, _, _, line, _ in words], [par for _, _, par, _, _ in words],
+        [word for word, *_ in words], size
+    )
+
+
+@pytest.fixture
+def page(monkeypatch):
+    """Stub Tesseract with a fixed layout and the escalation engine with a recorder."""
+    state = {'words': WORDS, 'ocr': [], 'renders': 0}
+    monkeypatch.setattr(scrapey.cascade, 'tesseract_layout', lambda image: make_layout(state['words']))
+
+    def ocr_image(image, engine, tesseract_config=None):
+        state['ocr'].append((image.size, engine))
+        return f" re-read  {image.width}x{image.height} "
+
+    def render_high():
+        state['renders'] += 1
+        return Image.new('L', (400, 200), 255)
+
+    monkeypatch.setattr(scrapey.cascade, 'ocr_image', ocr_image)
+    monkeypatch.setitem(scrapey.cascade.app_settings, 'cascade_escalation_engine', 'easyocr')
+    monkeypatch.setitem(scrapey.cascade.app_settings, 'cascade_min_confidence', 70)
+    monkeypatch.setitem(scrapey.cascade.app_settings, 'cascade_max_weak_fraction', 0.5)
+    state['render_high'] = render_high
+    return state
+
+
+def blank_image(ink=0):
+    """A white 200x100 image with `ink` black pixels."""
+    image = Image.new('L', (200, 100), 255)
+    for index in range(ink):
+        image.putpixel((index % 200, index // 200), 0)
+    return image
+
+
+def test_read_lines_groups_words(page):
+    lines = read_lines(blank_image())
+    assert [line.key for line in lines] == [(0, 0), (1, 1), (1, 2)]
+    assert [line.text for line in lines] == ['Dear Sir,', 'thank you', 'Regards']
+    assert lines[0].box == (10, 8, 70, 22)
+    assert lines[1].confidence == 45
+
+
+def test_merge_lines_keeps_paragraphs_and_applies_replacements(page):
+    lines = read_lines(blank_image())
+    assert merge_lines(lines, {}) == "Dear Sir,\n\nthank you\nRegards"
+    assert merge_lines(lines, {(1, 1): 'thank you kindly'}) == "Dear Sir,\n\nthank you kindly\nRegards"
+
+
+def test_clean_page_is_not_escalated(page):
+    page['words'] = [word for word in WORDS if word[1] >= 70]
+    text, escalation = cascade_page(blank_image(), page['render_high'], 2)
+    assert (text, escalation) == ("Dear Sir,\n\nRegards", 'none')
+    assert page['renders'] == 0 and page['ocr'] == []
+
+
+def test_weak_line_is_reread_from_full_resolution(page):
+    text, escalation = cascade_page(blank_image(), page['render_high'], 2)
+    assert escalation == 'lines'
+    # Line box (10, 40, 80, 52) at twice the scale, padded by LINE_PADDING
+    assert page['ocr'] == [((148, 32), 'easyocr')]
+    assert text == "Dear Sir,\n\nre-read 148x32\nRegards"
+    assert page['renders'] == 1
+
+
+def test_mostly_weak_page_is_reread_in_full(page):
+    page['words'] = [(word, 30, *rest) for word, _, *rest in WORDS]
+    text, escalation = cascade_page(blank_image(), page['render_high'], 2)
+    assert escalation == 'page'
+    assert page['ocr'] == [((400, 200), 'easyocr')]
+
+
+def test_blank_page_is_skipped(page):
+    page['words'] = []
+    assert cascade_page(blank_image(ink=5), page['render_high'], 2) == ("", 'blank')
+    assert page['renders'] == 0 and page['ocr'] == []
+
+
+def test_page_with_ink_but_no_words_is_reread(page):
+    page['words'] = []
+    image = blank_image()
+    ImageDraw.Draw(image).rectangle((20, 20, 120, 30), fill=90)
+    text, escalation = cascade_page(image, page['render_high'], 2)
+    assert escalation == 'page'
+    assert page['renders'] == 1
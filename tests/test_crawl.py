@@ -0,0 +1,202 @@
+import asyncio
+import os
+from urllib.parse import urlsplit
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+import scrapey.crawl
+from scrapey.crawl import USER_AGENT, SiteCrawler, crawl_web_text, normalize_url
+from scrapey.utils import app_settings
+
+ROBOTS = "User-agent: *\nDisallow: /docs/private/\n"
+
+PAGES = {
+    '/docs/index.html': """
+        <p>Index</p>
+        <a href="a.html">A</a>
+        <a href="/docs/a.html#section">A again</a>
+        <a href="b.html?y=2&amp;x=1">B</a>
+        <a href="/docs/b.html?x=1&amp;y=2">B again</a>
+        <a href="copy.html">Copy of A</a>
+        <a href="private/secret.html">Secret</a>
+        <a href="/other/outside.html">Outside</a>
+        <a href="http://example.invalid/docs/index.html">Other host</a>
+        <a href="mailto:someone@example.com">Mail</a>
+    """,
+    '/docs/a.html': '<p>Page A</p><a href="deep.html">Deep</a>',
+    '/docs/b.html': '<p>Page B</p>',
+    # Same text as a.html, laid out differently
+    '/docs/copy.html': '<div><p>Page   A</p>\n <a href="deep.html">Deep</a></div>',
+    '/docs/deep.html': '<p>Deep page</p><a href="deeper.html">Deeper</a>',
+    '/docs/deeper.html': '<p>Deeper page</p>',
+    '/docs/private/secret.html': '<p>Secret</p>',
+    '/other/outside.html': '<p>Outside</p>',
+    '/files/index.html': '<a href="report.pdf">Report</a> <a href="scan">Scan</a>',
+}
+
+DOCUMENTS = {
+    '/files/report.pdf': (b'%PDF-1.4 report body', 'application/pdf'),
+    '/files/scan': (b'\x89PNG scan body', 'image/png'),
+}
+
+
+def make_site(requested, user_agents=None):
+    async def handler(request):
+        requested.append(request.path)
+        if user_agents is not None:
+            user_agents.append(request.headers.get('User-Agent'))
+        if request.path == '/robots.txt':
+            return web.Response(text=ROBOTS)
+        if request.path in DOCUMENTS:
+            body, content_type = DOCUMENTS[request.path]
+            return web.Response(body=body, content_type=content_type)
+        body = PAGES.get(request.path)
+        if body is None:
+            raise web.HTTPNotFound()
+        return web.Response(text=body, content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/{path:.*}', handler)
+    return app
+
+
+def crawl(max_depth=2, concurrency=1, seed='/docs/index.html', user_agents=None, **options):
+    """Crawl the fixture site, from /docs/index.html by default.
+
+    One fetch at a time keeps the crawl order, and so which of two
+    duplicate pages is kept, deterministic.
+
+    Returns:
+        tuple: (crawler, {path: text} of extracted pages, requested paths)
+    """
+    requested = []
+    pages = {}
+
+    async def run():
+        server = TestServer(make_site(requested, user_agents))
+        await server.start_server()
+        try:
+            crawler = SiteCrawler(
+                [str(server.make_url(seed))], max_depth=max_depth,
+                concurrency=concurrency, delay=0, on_page=lambda url, text: pages.setdefault(urlsplit(url).path, text),
+                **options
+            )
+            await crawler.run()
+            return crawler
+        finally:
+            await server.close()
+
+    return asyncio.run(run()), pages, requested
+
+
+def test_normalize_url():
+    assert normalize_url('HTTP://Example.COM:80') == 'http://example.com/'
+    assert normalize_url('https://example.com:443/a?b=2&a=1#top') == 'https://example.com/a?a=1&b=2'
+    assert normalize_url('http://example.com:8080/a') == 'http://example.com:8080/a'
+
+
+def test_in_scope():
+    crawler = SiteCrawler(['http://example.com/docs/index.html'])
+    assert crawler.in_scope('http://example.com/docs/a.html')
+    assert crawler.in_scope('http://example.com/docs/sub/b.html')
+    assert not crawler.in_scope('http://example.com/other/a.html')
+    assert not crawler.in_scope('https://example.com/docs/a.html')
+    assert not crawler.in_scope('http://other.example.com/docs/a.html')
+
+
+def test_crawl_stays_on_site_and_under_seed_directory():
+    _, pages, requested = crawl()
+    assert '/other/outside.html' not in requested
+    assert all(path.startswith('/docs/') or path == '/robots.txt' for path in requested)
+    assert '/docs/b.html' in pages
+
+
+def test_crawl_honours_robots_txt():
+    _, pages, requested = crawl()
+    assert requested.count('/robots.txt') == 1
+    assert '/docs/private/secret.html' not in requested
+    assert '/docs/private/secret.html' not in pages
+
+
+@pytest.mark.parametrize('max_depth, expected', [
+    (0, {'/docs/index.html'}),
+    (1, {'/docs/index.html', '/docs/a.html', '/docs/b.html'}),
+    (2, {'/docs/index.html', '/docs/a.html', '/docs/b.html', '/docs/deep.html'}),
+])
+def test_crawl_depth(max_depth, expected):
+    _, pages, _ = crawl(max_depth=max_depth)
+    assert set(pages) == expected
+
+
+def test_crawl_fetches_each_normalised_url_once():
+    _, _, requested = crawl()
+    assert requested.count('/docs/a.html') == 1
+    assert requested.count('/docs/b.html') == 1
+
+
+def test_crawl_skips_duplicate_content():
+    crawler, pages, requested = crawl(max_depth=1)
+    assert '/docs/copy.html' in requested
+    assert '/docs/copy.html' not in pages
+    assert crawler.duplicates == 1
+    assert crawler.pages == len(pages) == 3
+
+
+def test_crawl_concurrent_fetches_find_every_page():
+    crawler, pages, requested = crawl(concurrency=4)
+    assert crawler.pages == len(pages) == 4
+    assert crawler.duplicates == 1
+    assert '/docs/deep.html' in pages
+
+
+def test_crawl_max_pages():
+    crawler, pages, _ = crawl(max_pages=2)
+    assert crawler.pages == len(pages) == 2
+
+
+def test_crawl_web_text_labels_pages():
+    requested = []
+
+    async def serve():
+        server = TestServer(make_site(requested))
+        await server.start_server()
+        return server
+
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(serve())
+    try:
+        seed = str(server.make_url('/docs/deep.html'))
+        # crawl_web_text runs its own event loop, so it runs in a thread
+        # while this loop serves the site
+        future = loop.run_in_executor(None, lambda: crawl_web_text(seed, max_depth=1, delay=0))
+        text = loop.run_until_complete(future)
+    finally:
+        loop.run_until_complete(server.close())
+        loop.close()
+    assert f"=== {seed} ===\n" in text
+    assert "Deep page" in text and "Deeper page" in text
+
+
+def test_crawl_downloads_linked_documents_once(tmp_path, monkeypatch):
+    monkeypatch.setitem(app_settings, 'model_cache_dir', str(tmp_path))
+    extracted = []
+
+    def extract_document(path, kind, engine=None):
+        with open(path, 'rb') as f:
+            extracted.append((f.read(), kind, engine, os.path.splitext(path)[1]))
+        return f"{kind} text"
+
+    monkeypatch.setattr(scrapey.crawl, 'extract_document', extract_document)
+    user_agents = []
+    crawler, pages, requested = crawl(seed='/files/index.html', user_agents=user_agents, engine='easyocr')
+
+    assert requested.count('/files/report.pdf') == 1
+    assert requested.count('/files/scan') == 1
+    assert set(user_agents) == {USER_AGENT}
+    assert sorted(extracted) == [
+        (b'%PDF-1.4 report body', 'pdf', 'easyocr', '.pdf'),
+        (b'\x89PNG scan body', 'image', 'easyocr', '.png'),
+    ]
+    assert pages['/files/report.pdf'] == 'pdf text'
+    assert crawler.pages == 3
+    assert not [name for name in os.listdir(tmp_path / 'downloads') if name.endswith('.part')]
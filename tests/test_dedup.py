@@ -0,0 +1,95 @@
+import io
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+from scrapey.dedup import PageDeduper, _POPCOUNT, dct_hash, pixel_difference
+
+LINES = [f"Line {i} of the standard form text, lorem ipsum dolor sit amet." for i in range(40)]
+
+
+def form_page(header="Invoice #10234", lines=LINES):
+    """An A4 page at 300 DPI with 8pt text, like a filled-in form."""
+    font = ImageFont.load_default(size=33)
+    page = Image.new('L', (2480, 3508), 255)
+    draw = ImageDraw.Draw(page)
+    draw.text((200, 200), header, font=font, fill=0)
+    for index, line in enumerate(lines):
+        draw.text((200, 400 + index * 70), line, font=font, fill=0)
+    return page
+
+
+def recompressed(image, quality=50):
+    data = io.BytesIO()
+    image.save(data, 'JPEG', quality=quality)
+    with Image.open(io.BytesIO(data.getvalue())) as copy:
+        return copy.convert('L')
+
+
+def run(deduper, image, text):
+    calls = []
+
+    def ocr():
+        calls.append(text)
+        return text
+
+    return deduper.run(image, ocr), bool(calls)
+
+
+@pytest.fixture(scope='module')
+def page():
+    return form_page()
+
+
+def test_filled_in_forms_share_a_hash(page):
+    # The hash alone cannot tell these apart, hence the pixel check
+    other = form_page("Invoice #99871")
+    assert _POPCOUNT[dct_hash(page) ^ dct_hash(other)].sum() <= 6
+
+
+@pytest.mark.parametrize('variant, rejected', [
+    (lambda: form_page("Invoice #99871"), 1),
+    (lambda: form_page("Invoice #10284"), 1),
+    # Different enough that the hash rules it out
+    (lambda: form_page(lines=LINES[:5] + ["A completely rewritten line that says something else."] + LINES[6:]), 0),
+])
+def test_changed_form_is_ocrd(page, variant, rejected):
+    deduper = PageDeduper(max_distance=6, max_pixel_difference=6.0)
+    assert run(deduper, page, 'first') == ('first', True)
+    assert run(deduper, variant(), 'second') == ('second', True)
+    assert deduper.deduplicated == 0
+    assert deduper.rejected == rejected
+
+
+@pytest.mark.parametrize('copy', [lambda page: page.copy(), recompressed])
+def test_duplicate_page_reuses_text(page, copy):
+    deduper = PageDeduper(max_distance=6, max_pixel_difference=6.0)
+    run(deduper, page, 'first')
+    assert run(deduper, copy(page), 'second') == ('first', False)
+    assert deduper.pages == 2
+    assert deduper.deduplicated == 1
+    assert "Deduplicated 1 of 2 pages" in deduper.summary()
+
+
+def test_different_page_is_not_a_candidate(page):
+    deduper = PageDeduper(max_distance=6, max_pixel_difference=6.0)
+    run(deduper, page, 'first')
+    other = Image.new('L', page.size, 255)
+    ImageDraw.Draw(other).rectangle((300, 300, 2000, 1500), fill=0)
+    assert run(deduper, other, 'second') == ('second', True)
+    assert deduper.rejected == 0
+
+
+def test_same_page_confirms_on_pixels(page):
+    deduper = PageDeduper(max_distance=6, max_pixel_difference=6.0)
+    signature = deduper.signature(page)
+    assert deduper.same_page(signature, deduper.signature(recompressed(page)))
+    assert not deduper.same_page(signature, deduper.signature(form_page("Invoice #99871")))
+
+
+def test_pixel_difference_is_local():
+    a = np.full((100, 100), 255, dtype=np.uint8)
+    b = a.copy()
+    b[10:14, 10:14] = 0
+    assert pixel_difference(a, b) == 255
+    assert pixel_difference(a, a) == 0
+    assert pixel_difference(a, a[:50]) == float('inf')
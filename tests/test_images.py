@@ -0,0 +1,120 @@
+import threading
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, TiffImagePlugin
+from scrapey.images import (
+    BandedFrame, get_image_frame_count, iter_image_frames, split_bands
+)
+
+WIDTH, HEIGHT = 300, 400
+# Text-like rows: a 12 pixel dark stripe every 30 rows
+STRIPES = [(y, y + 12) for y in range(20, HEIGHT - 20, 30)]
+
+
+def make_page():
+    page = Image.new('L', (WIDTH, HEIGHT), 255)
+    draw = ImageDraw.Draw(page)
+    for index, (top, bottom) in enumerate(STRIPES):
+        draw.rectangle((10 + index, top, WIDTH - 20, bottom), fill=index * 7)
+    return page
+
+
+def save_tiff(path, frames, **options):
+    frames[0].save(path, save_all=True, append_images=frames[1:], **options)
+    return str(path)
+
+
+def assert_not_in_stripe(row):
+    assert not any(top < row <= bottom for top, bottom in STRIPES), row
+
+
+def test_frame_count_and_ranges(tmp_path):
+    path = save_tiff(tmp_path / 'scan.tif', [Image.new('L', (10 + i, 10), 255) for i in range(4)])
+    assert get_image_frame_count(path) == 4
+    assert [(index, frame.width) for index, frame in iter_image_frames(path)] == [
+        (0, 10), (1, 11), (2, 12), (3, 13)
+    ]
+    assert [index for index, _ in iter_image_frames(path, (2, 3))] == [1, 2]
+    assert [index for index, _ in iter_image_frames(path, (3, 9))] == [2, 3]
+    assert list(iter_image_frames(path, (5, 6))) == []
+
+
+def test_pixel_limit_is_checked_per_frame(tmp_path):
+    frames = [Image.new('L', (10, 10), 255), Image.new('L', (40, 40), 255)]
+    path = save_tiff(tmp_path / 'scan.tif', frames)
+    frames_read = []
+    with pytest.raises(ValueError, match='Frame 2 .* above the image_pixel_limit'):
+        for index, _ in iter_image_frames(path, pixel_limit=1000):
+            frames_read.append(index)
+    assert frames_read == [0]
+
+
+def test_pil_guard_is_never_lifted(tmp_path, monkeypatch):
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 100)
+    path = save_tiff(tmp_path / 'big.tif', [Image.new('L', (30, 10), 255)])
+    errors = []
+
+    def read():
+        for _ in range(20):
+            try:
+                list(iter_image_frames(path, pixel_limit=0))
+            except ValueError:
+                errors.append(1)
+
+    threads = [threading.Thread(target=read) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert Image.MAX_IMAGE_PIXELS == 100
+    assert len(errors) == 80
+
+
+@pytest.mark.parametrize('compression, mode', [
+    ('raw', 'L'), ('tiff_lzw', 'L'), ('group4', '1'),
+])
+def test_banded_frame_matches_full_decode(tmp_path, monkeypatch, compression, mode):
+    # Pillow's own writer stores uncompressed images as a single strip
+    monkeypatch.setattr(TiffImagePlugin, 'WRITE_LIBTIFF', True)
+    page = make_page()
+    if mode == '1':
+        page = page.point(lambda value: 255 if value > 128 else 0).convert('1')
+    row_bytes = WIDTH if mode == 'L' else (WIDTH + 7) // 8
+    path = save_tiff(tmp_path / 'scan.tif', [page], compression=compression, strip_size=row_bytes * 16)
+
+    max_pixels = WIDTH * 100
+    (_, frame), = iter_image_frames(path, max_pixels=max_pixels)
+    assert isinstance(frame, BandedFrame)
+    bands = list(split_bands(frame, max_pixels))
+    assert len(bands) > 2
+    assert sum(band.height for band in bands) == HEIGHT
+    assert all(band.width == WIDTH for band in bands)
+    rows = np.concatenate([np.asarray(band) for band in bands])
+    with Image.open(path) as full:
+        assert np.array_equal(rows, np.asarray(full.convert('L')))
+
+    top = 0
+    for band in bands[:-1]:
+        top += band.height
+        assert_not_in_stripe(top)
+
+    preview = frame.preview(max_side=100)
+    assert preview.size == (75, 100)
+
+
+def test_small_frames_are_decoded_whole(tmp_path):
+    path = save_tiff(tmp_path / 'scan.tif', [make_page()], compression='tiff_lzw', strip_size=WIDTH * 16)
+    (_, frame), = iter_image_frames(path, max_pixels=WIDTH * HEIGHT)
+    assert isinstance(frame, Image.Image)
+    assert split_bands(frame, WIDTH * HEIGHT) == [frame]
+
+
+def test_split_bands_cuts_on_blank_rows():
+    page = make_page()
+    bands = split_bands(page, WIDTH * 100)
+    assert all(band.width * band.height <= WIDTH * 100 for band in bands)
+    assert np.array_equal(np.concatenate([np.asarray(band) for band in bands]), np.asarray(page))
+    top = 0
+    for band in bands[:-1]:
+        top += band.height
+        assert_not_in_stripe(top)
@@ -0,0 +1,116 @@
+import pytest
+from PIL import Image
+import scrapey.layout
+from scrapey.layout import LayoutStore, PageLayout
+
+
+@pytest.fixture
+def captures(monkeypatch):
+    """Replace OCR with a fake that returns one word per captured frame."""
+    calls = []
+
+    def capture_layout(image, engine='tesseract'):
+        calls.append(engine)
+        word = f"word{len(calls)}"
+        return PageLayout([(0, 0, 10, 10)], [90.0], [0], [0], [word], image.size)
+
+    monkeypatch.setattr(scrapey.layout, 'capture_layout', capture_layout)
+    return calls
+
+
+def make_tiff(path, frames):
+    images = [Image.new('L', (20, 10), 255) for _ in range(frames)]
+    images[0].save(path, save_all=True, append_images=images[1:])
+    return str(path)
+
+
+def test_get_caches_layout_per_frame(tmp_path, captures):
+    path = make_tiff(tmp_path / 'scan.tif', 2)
+    store = LayoutStore()
+    first = store.get(path)
+    assert store.get(path) is first
+    assert store.get(path, frame=1) is not first
+    assert captures == ['tesseract', 'tesseract']
+    assert store.query(path, None) == first.query(None)
+
+
+@pytest.mark.parametrize('frame', [2, -1])
+def test_get_frame_out_of_range(tmp_path, captures, frame):
+    path = make_tiff(tmp_path / 'scan.tif', 2)
+    with pytest.raises(ValueError, match='has no frame'):
+        LayoutStore().get(path, frame=frame)
+    assert captures == []
+
+
+def two_column_page():
+    """Two paragraphs; words are listed out of reading order on purpose."""
+    words = [
+        # word, box, line, paragraph
+        ('world', (60, 10, 100, 20), 0, 0),
+        ('Hello', (10, 10, 50, 20), 0, 0),
+        ('second', (10, 30, 60, 40), 1, 0),
+        ('line', (70, 30, 100, 40), 1, 0),
+        ('New', (10, 60, 40, 70), 2, 1),
+        ('paragraph', (50, 60, 120, 70), 2, 1),
+    ]
+    return PageLayout(
+        [box for _, box, _, _ in words], [90.0] * len(words),
+        [line for _, _, line, _ in words], [par for _, _, _, par in words],
+        [word for word, _, _, _ in words], (200, 100)
+    )
+
+
+def test_select_orders_by_line_then_x():
+    layout = two_column_page()
+    assert [layout.word(i) for i in layout.select()] == [
+        'Hello', 'world', 'second', 'line', 'New', 'paragraph'
+    ]
+
+
+@pytest.mark.parametrize('region, min_overlap, expected', [
+    ((0, 0, 200, 100), 0.5, ['Hello', 'world', 'second', 'line', 'New', 'paragraph']),
+    ((0, 0, 55, 45), 0.5, ['Hello', 'second']),
+    # 'paragraph' is only 10/70 inside, 'world' 20/40
+    ((0, 0, 80, 100), 0.5, ['Hello', 'world', 'second', 'New']),
+    ((0, 0, 80, 100), 0.1, ['Hello', 'world', 'second', 'line', 'New', 'paragraph']),
+    ((150, 0, 200, 100), 0.5, []),
+])
+def test_select_region(region, min_overlap, expected):
+    layout = two_column_page()
+    assert [layout.word(i) for i in layout.select(region, min_overlap)] == expected
+
+
+def test_query_breaks_lines_and_paragraphs():
+    layout = two_column_page()
+    assert layout.query() == "Hello world\nsecond line\n\nNew paragraph"
+    assert layout.query((0, 25, 200, 100)) == "second line\n\nNew paragraph"
+    assert layout.query((0, 0, 55, 45)) == "Hello\nsecond"
+    assert layout.query((150, 0, 200, 100)) == ""
+
+
+def test_concatenate_offsets_ids():
+    top, bottom = two_column_page(), two_column_page().offset(0, 100)
+    joined = PageLayout.concatenate([top, PageLayout([], [], [], [], [], (200, 0)), bottom], (200, 200))
+    assert len(joined) == 12
+    assert joined.line_ids.tolist() == [0, 0, 1, 1, 2, 2, 3, 3, 4, 4, 5, 5]
+    assert joined.paragraph_ids.tolist() == [0, 0, 0, 0, 1, 1, 2, 2, 2, 2, 3, 3]
+    assert joined.boxes[6].tolist() == [60, 110, 100, 120]
+    assert joined.query() == "Hello world\nsecond line\n\nNew paragraph\n\nHello world\nsecond line\n\nNew paragraph"
+    assert joined.query((0, 100, 200, 200)) == "Hello world\nsecond line\n\nNew paragraph"
+    assert len(PageLayout.concatenate([], (10, 10))) == 0
+
+
+def test_capture_layout_places_bands_on_the_page(monkeypatch):
+    monkeypatch.setitem(scrapey.layout.app_settings, 'max_image_pixels', 100 * 40)
+    bands = []
+
+    def capture(band):
+        bands.append(band.size)
+        return PageLayout([(5, 5, 20, 15)], [90.0], [0], [0], [f"band{len(bands)}"], band.size)
+
+    monkeypatch.setitem(scrapey.layout.LAYOUT_ENGINES, 'fake', capture)
+    layout = scrapey.layout.capture_layout(Image.new('L', (100, 100), 255), 'fake')
+    assert bands == [(100, 40), (100, 40), (100, 20)]
+    assert layout.size == (100, 100)
+    assert layout.boxes[:, 1].tolist() == [5, 45, 85]
+    assert layout.query() == "band1\n\nband2\n\nband3"
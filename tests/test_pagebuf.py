@@ -0,0 +1,106 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+import scrapey.ocr
+from scrapey import pagebuf
+from scrapey.dedup import PageDeduper
+from scrapey.pagebuf import PageBuffer, attach_page, ocr_pages_in_pool
+
+
+def make_page(label, size=(120, 80)):
+    page = Image.new('L', size, 255)
+    ImageDraw.Draw(page).rectangle((10, 10 + label * 10, 60 + label * 10, 20 + label * 10), fill=0)
+    return page
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """Run the pool in threads, so the stubbed OCR and buffer tracking apply."""
+    executor = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(pagebuf, '_get_pool', lambda workers: executor)
+    buffers = []
+
+    class TrackedBuffer(PageBuffer):
+        def __init__(self, image):
+            super().__init__(image)
+            buffers.append(self)
+
+    monkeypatch.setattr(pagebuf, 'PageBuffer', TrackedBuffer)
+    calls = []
+    lock = threading.Lock()
+
+    def ocr_page(image, engine):
+        # make_page draws its label's bar starting at row 10 + label * 10
+        label = (int(np.argmin(np.asarray(image).min(axis=1))) - 10) // 10
+        with lock:
+            calls.append(label)
+        if label == 99:
+            raise ValueError("unreadable page")
+        time.sleep(0.01)
+        return f"{engine}:{image.width}:{label}"
+
+    monkeypatch.setattr(scrapey.ocr, 'ocr_page', ocr_page)
+    yield buffers, calls
+    executor.shutdown(wait=True)
+
+
+def released(buffers):
+    return all(buffer._shm is None for buffer in buffers)
+
+
+def test_page_buffer_round_trip():
+    page = make_page(2)
+    with PageBuffer(page) as buffer:
+        with attach_page(buffer.descriptor) as image:
+            assert image.size == page.size
+            assert np.array_equal(np.asarray(image), np.asarray(page))
+    assert buffer._shm is None
+    buffer.release()  # Releasing twice is harmless
+
+
+def test_pages_come_back_in_order_and_buffers_are_released(pool):
+    buffers, calls = pool
+    pages = [(index, make_page(index)) for index in range(7)]
+    results = list(ocr_pages_in_pool(iter(pages), 'tesseract', workers=2))
+    assert [index for index, _ in results] == list(range(7))
+    assert [text.split(':')[0] for _, text in results] == ['tesseract'] * 7
+    assert len(buffers) == 7
+    assert released(buffers)
+
+
+def test_duplicates_share_in_flight_and_finished_results(pool):
+    buffers, calls = pool
+    a, b = make_page(1), make_page(3)
+    pages = [(0, a), (1, a.copy()), (2, b), (3, a.copy()), (4, b.copy()), (5, a.copy())]
+    deduper = PageDeduper()
+    results = list(ocr_pages_in_pool(iter(pages), 'tesseract', workers=2, deduper=deduper))
+    texts = [text for _, text in results]
+    assert texts[0] == texts[1] == texts[3] == texts[5]
+    assert texts[2] == texts[4] != texts[0]
+    # Only the first copy of each page reaches the engine or shared memory
+    assert sorted(calls) == [1, 3]
+    assert len(buffers) == 2
+    assert deduper.pages == 6
+    assert deduper.deduplicated == 4
+    assert released(buffers)
+
+
+def test_buffers_are_released_when_closed_early(pool):
+    buffers, _ = pool
+    pages = ((index, make_page(index)) for index in range(8))
+    results = ocr_pages_in_pool(pages, 'tesseract', workers=2)
+    assert next(results)[0] == 0
+    results.close()
+    assert buffers and released(buffers)
+
+
+def test_buffers_are_released_on_error(pool):
+    buffers, _ = pool
+    pages = [(0, make_page(1)), (1, make_page(99, size=(120, 1100))), (2, make_page(2))]
+    with pytest.raises(RuntimeError, match='unreadable page'):
+        list(ocr_pages_in_pool(iter(pages), 'tesseract', workers=2))
+    assert len(buffers) == 3
+    assert released(buffers)
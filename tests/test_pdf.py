@@ -0,0 +1,185 @@
+import threading
+import time
+import pytest
+from scrapey import pdf
+from scrapey.pdf import PDFBackend, _DocumentCache
+
+
+class FakeBackend(PDFBackend):
+    """Documents are text files with one page per line; extraction can be held up."""
+    name = 'fake'
+
+    def __init__(self):
+        self.opened = []
+        self.closed = []
+        self.counts = 0
+        self.release = {}
+
+    def open(self, file_path):
+        self.opened.append(file_path)
+        with open(file_path) as f:
+            return {'path': file_path, 'pages': f.read().splitlines(), 'closed': False}
+
+    def close(self, handle):
+        handle['closed'] = True
+        self.closed.append(handle['path'])
+
+    def page_count(self, handle):
+        self.counts += 1
+        return len(handle['pages'])
+
+    def page_text(self, handle, page_index):
+        assert not handle['closed']
+        gate = self.release.get(handle['path'])
+        if gate is not None:
+            gate.wait(5)
+        return handle['pages'][page_index]
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    backend = FakeBackend()
+    monkeypatch.setitem(pdf.PDF_BACKENDS, 'fake', backend)
+    return backend
+
+
+@pytest.fixture
+def documents(tmp_path):
+    paths = []
+    for name, pages in [('a', 3), ('b', 2), ('c', 1)]:
+        path = tmp_path / f'{name}.txt'
+        path.write_text("\n".join(f"{name}{i}" for i in range(pages)))
+        paths.append(str(path))
+    return paths
+
+
+def test_handles_and_page_counts_are_cached(backend, documents):
+    cache = _DocumentCache()
+    assert cache.page_count(backend, documents[0]) == 3
+    assert cache.page_count(backend, documents[0]) == 3
+    assert cache.extract_range(backend, documents[0], 1, 3) == [(1, 'a1'), (2, 'a2')]
+    assert backend.opened == [documents[0]]
+    assert backend.counts == 1
+
+
+def test_changed_file_is_reopened(backend, documents):
+    cache = _DocumentCache()
+    assert cache.page_count(backend, documents[1]) == 2
+    with open(documents[1], 'a') as f:
+        f.write("\nb2")
+    assert cache.page_count(backend, documents[1]) == 3
+    assert backend.closed == [documents[1]]
+
+
+def test_page_counts_are_evicted_with_handles(backend, documents):
+    cache = _DocumentCache(max_handles=2)
+    for path in documents:
+        cache.page_count(backend, path)
+    assert backend.closed == [documents[0]]
+    assert cache.page_count(backend, documents[0]) == 3
+    assert backend.counts == 4
+
+
+def test_extraction_does_not_block_other_documents(backend, documents):
+    cache = _DocumentCache()
+    backend.release[documents[0]] = gate = threading.Event()
+    slow = threading.Thread(target=cache.extract_range, args=(backend, documents[0], 0, 3))
+    slow.start()
+    try:
+        time.sleep(0.05)
+        start = time.perf_counter()
+        assert cache.extract_range(backend, documents[1], 0, 2) == [(0, 'b0'), (1, 'b1')]
+        assert cache.page_count(backend, documents[2]) == 1
+        assert time.perf_counter() - start < 1
+    finally:
+        gate.set()
+        slow.join()
+
+
+def test_eviction_waits_for_handle_in_use(backend, documents):
+    cache = _DocumentCache(max_handles=1)
+    backend.release[documents[0]] = gate = threading.Event()
+    results = []
+    slow = threading.Thread(
+        target=lambda: results.append(cache.extract_range(backend, documents[0], 0, 3))
+    )
+    slow.start()
+    time.sleep(0.05)
+    # Opening b evicts a while it is being read; closing waits for the reader
+    closer = threading.Thread(target=cache.page_count, args=(backend, documents[1]))
+    closer.start()
+    time.sleep(0.05)
+    assert backend.closed == []
+    gate.set()
+    slow.join()
+    closer.join()
+    assert results == [[(0, 'a0'), (1, 'a1'), (2, 'a2')]]
+    assert backend.closed == [documents[0]]
+
+
+def test_forget_and_clear(backend, documents):
+    cache = _DocumentCache()
+    for path in documents:
+        cache.page_count(backend, path)
+    cache.forget(documents[1])
+    assert backend.closed == [documents[1]]
+    cache.clear()
+    assert sorted(backend.closed) == sorted(documents)
+    cache.page_count(backend, documents[1])
+    assert backend.opened.count(documents[1]) == 2
+
+
+def test_extract_pdf_text_formats_pages(backend, documents, monkeypatch):
+    monkeypatch.setattr(pdf, 'get_pdf_backend', lambda name=None: backend)
+    text = pdf.extract_pdf_text(documents[0], (2, 3), backend='fake', workers=1)
+    assert text == "=== Page 2 ===\na1\n\n=== Page 3 ===\na2\n"
+    pdf.forget_document(documents[0])
+
+
+def test_pdfium_calls_are_serialised_across_documents(documents, monkeypatch):
+    import sys
+    import types
+    active = []
+    overlaps = []
+
+    def call(result):
+        active.append(1)
+        if len(active) > 1:
+            overlaps.append(len(active))
+        time.sleep(0.01)
+        active.pop()
+        return result
+
+    class Document:
+        def __init__(self, path):
+            call(None)
+            with open(path) as f:
+                self.pages = f.read().splitlines()
+
+        def __len__(self):
+            return call(len(self.pages))
+
+        def __getitem__(self, index):
+            text = self.pages[index]
+            textpage = types.SimpleNamespace(get_text_range=lambda: call(text), close=lambda: None)
+            return types.SimpleNamespace(get_textpage=lambda: textpage, close=lambda: None)
+
+        def close(self):
+            call(None)
+
+    monkeypatch.setitem(sys.modules, 'pypdfium2', types.SimpleNamespace(PdfDocument=Document))
+    backend = pdf.PdfiumBackend()
+    cache = _DocumentCache()
+
+    def extract(path):
+        for _ in range(5):
+            cache.page_count(backend, path)
+            cache.extract_range(backend, path, 0, 1)
+
+    threads = [threading.Thread(target=extract, args=(path,)) for path in documents]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    cache.clear()
+    assert overlaps == []
@@ -0,0 +1,50 @@
+import pytest
+from PIL import Image
+from PyPDF2 import PdfReader
+from scrapey.layout import PageLayout
+from scrapey.searchable_pdf import SearchablePDFWriter
+
+WORDS = ['Hello', 'naïve', 'Привет', '你好世界', 'Ελληνικά', '€', 'a']
+
+
+def make_layout(words):
+    """One 60x20 pixel box per word, in a single line."""
+    boxes = [(10 + 80 * index, 10, 70 + 80 * index, 30) for index in range(len(words))]
+    count = len(words)
+    return PageLayout(boxes, [90.0] * count, [0] * count, [0] * count, words, (80 * count + 20, 40))
+
+
+def write_pdf(path, words):
+    layout = make_layout(words)
+    with SearchablePDFWriter(str(path)) as writer:
+        writer.add_page(Image.new('L', layout.size, 255), layout, 72)
+    return path
+
+
+def test_text_layer_keeps_non_latin_text(tmp_path):
+    path = write_pdf(tmp_path / 'out.pdf', WORDS)
+    reader = PdfReader(str(path))
+    assert len(reader.pages) == 1
+    assert reader.pages[0].extract_text().split() == WORDS
+
+
+def test_text_layer_uses_utf16_codes(tmp_path):
+    path = write_pdf(tmp_path / 'out.pdf', ['€'])
+    data = path.read_bytes()
+    assert b'/Encoding /Identity-H' in data
+    assert b'<20AC> Tj' in data
+
+
+def test_text_layer_found_by_pdfium(tmp_path):
+    pdfium = pytest.importorskip('pypdfium2')
+    path = write_pdf(tmp_path / 'out.pdf', WORDS)
+    document = pdfium.PdfDocument(str(path))
+    try:
+        page = document[0]
+        text = page.get_textpage().get_text_range()
+        # The text layer is invisible
+        bitmap = page.render().to_pil().convert('L')
+        assert bitmap.getextrema() == (255, 255)
+    finally:
+        document.close()
+    assert text.split() == WORDS
@@ -0,0 +1,300 @@
+import asyncio
+import io
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from PIL import Image
+from scrapey.server import ExtractionService
+
+
+def make_pdf(page_texts):
+    """Build a minimal PDF with one line of Helvetica text per page."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in page_texts:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode('ascii')
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>".encode('ascii')
+        )
+        kids.append(len(objects))
+    objects[1] = (
+        f"<< /Type /Pages /Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] /Count {len(kids)} >>"
+    ).encode('ascii')
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n".encode('ascii') + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode('ascii'))
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode('ascii'))
+    out.write(
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode('ascii')
+    )
+    return out.getvalue()
+
+
+def make_png(width=40, height=20):
+    data = io.BytesIO()
+    Image.new('L', (width, height), 255).save(data, 'PNG')
+    return data.getvalue()
+
+
+class ThreadedService(ExtractionService):
+    """The service with a thread pool, so monkeypatched OCR reaches the workers."""
+
+    def _make_pool(self):
+        return ThreadPoolExecutor(max_workers=self.workers)
+
+
+def serve(service, scenario):
+    """Run scenario(client) against the service's app and return its result."""
+    async def run():
+        client = TestClient(TestServer(service.make_app()))
+        await client.start_server()
+        try:
+            return await scenario(client)
+        finally:
+            await client.close()
+    return asyncio.run(run())
+
+
+async def read_ndjson(response):
+    return [json.loads(line) for line in (await response.text()).splitlines()]
+
+
+@pytest.fixture
+def fake_ocr(monkeypatch):
+    """Replace OCR with a slow fake that reports the image width and engine."""
+    import scrapey.ocr
+    calls = []
+
+    def ocr_page(image, engine):
+        calls.append(engine)
+        time.sleep(0.05)
+        return f"{engine}:{image.width}"
+
+    monkeypatch.setattr(scrapey.ocr, 'ocr_page', ocr_page)
+    return calls
+
+
+def test_extract_pdf_job_streams_pages():
+    pdf = make_pdf(['alpha', 'beta', 'gamma'])
+
+    async def scenario(client):
+        response = await client.post('/extract/pdf', data=pdf)
+        assert response.status == 202
+        created = await response.json()
+        assert created['total_pages'] == 3
+
+        response = await client.get(f"/jobs/{created['job_id']}/pages")
+        assert response.headers['Content-Type'].startswith('application/x-ndjson')
+        lines = await read_ndjson(response)
+
+        status = await (await client.get(f"/jobs/{created['job_id']}")).json()
+        return lines, status
+
+    lines, status = serve(ExtractionService(workers=2, preload=()), scenario)
+    assert sorted((line['page'], line['text']) for line in lines[:-1]) == [
+        (1, 'alpha'), (2, 'beta'), (3, 'gamma')
+    ]
+    assert lines[-1] == {'status': 'done'}
+    assert status['status'] == 'done'
+    assert status['pages_done'] == 3
+    assert status['text'] == "=== Page 1 ===\nalpha\n\n=== Page 2 ===\nbeta\n\n=== Page 3 ===\ngamma\n"
+
+
+def test_extract_pdf_page_range_and_upload_cleanup():
+    pdf = make_pdf(['one', 'two', 'three', 'four'])
+    service = ThreadedService(workers=2, preload=())
+
+    async def scenario(client):
+        response = await client.post('/extract/pdf?page_start=2&page_end=3', data=pdf)
+        created = await response.json()
+        lines = await read_ndjson(await client.get(f"/jobs/{created['job_id']}/pages"))
+        return created, lines, service.jobs[created['job_id']].file_path
+
+    created, lines, upload = serve(service, scenario)
+    assert created['total_pages'] == 2
+    assert [(line['page'], line['text']) for line in lines[:-1]] == [(2, 'two'), (3, 'three')]
+    assert not os.path.exists(upload)
+
+
+def test_ocr_pdf_job(monkeypatch, fake_ocr):
+    import pdf2image
+
+    def convert_from_path(path, first_page, last_page, grayscale):
+        return [Image.new('L', (100 + first_page, 50))]
+
+    monkeypatch.setattr(pdf2image, 'convert_from_path', convert_from_path)
+    pdf = make_pdf(['', ''])
+
+    async def scenario(client):
+        response = await client.post('/ocr/pdf?engine=EasyOCR', data=pdf)
+        created = await response.json()
+        return await read_ndjson(await client.get(f"/jobs/{created['job_id']}/pages"))
+
+    lines = serve(ThreadedService(workers=2, preload=()), scenario)
+    assert sorted((line['page'], line['text']) for line in lines[:-1]) == [
+        (1, 'easyocr:101'), (2, 'easyocr:102')
+    ]
+    assert lines[-1] == {'status': 'done'}
+
+
+def test_ocr_image(fake_ocr):
+    async def scenario(client):
+        response = await client.post('/ocr/image?engine=tesseract', data=make_png(width=64))
+        return response.status, await response.json()
+
+    status, body = serve(ThreadedService(workers=2, preload=()), scenario)
+    assert status == 200
+    assert body == {'text': 'tesseract:64'}
+
+
+def test_ocr_image_reads_every_tiff_frame_and_bands_large_ones(fake_ocr, monkeypatch):
+    from scrapey.utils import app_settings
+    monkeypatch.setitem(app_settings, 'max_image_pixels', 100 * 50)
+    frames = [Image.new('L', (64, 20), 255), Image.new('L', (100, 120), 255)]
+    data = io.BytesIO()
+    frames[0].save(data, 'TIFF', save_all=True, append_images=frames[1:],
+                   compression='tiff_lzw', strip_size=100 * 20)
+
+    async def scenario(client):
+        response = await client.post('/ocr/image', data=data.getvalue())
+        return response.status, await response.json()
+
+    status, body = serve(ThreadedService(workers=1, preload=()), scenario)
+    assert status == 200
+    # The second frame is over max_image_pixels and is read in bands
+    text = "=== Page 1 ===\ntesseract:64\n\n=== Page 2 ===\n" + "\n".join(["tesseract:100"] * 3) + "\n"
+    assert body == {'text': text}
+
+
+def test_ocr_image_over_pixel_limit_is_rejected(fake_ocr, monkeypatch):
+    from scrapey.utils import app_settings
+    monkeypatch.setitem(app_settings, 'image_pixel_limit', 1000)
+
+    async def scenario(client):
+        response = await client.post('/ocr/image', data=make_png(width=64))
+        return response.status, await response.text()
+
+    status, text = serve(ThreadedService(workers=1, preload=()), scenario)
+    assert status == 400
+    assert 'image_pixel_limit' in text
+    assert fake_ocr == []
+
+
+def test_long_job_does_not_starve_images(monkeypatch, fake_ocr):
+    import pdf2image
+
+    def convert_from_path(path, first_page, last_page, grayscale):
+        return [Image.new('L', (100 + first_page, 50))]
+
+    monkeypatch.setattr(pdf2image, 'convert_from_path', convert_from_path)
+    service = ThreadedService(workers=2, preload=())
+    pages = 30
+
+    async def scenario(client):
+        created = await (await client.post('/ocr/pdf', data=make_pdf([''] * pages))).json()
+        job = service.jobs[created['job_id']]
+        await asyncio.sleep(0.1)
+        most_pending = service.pending_tasks
+        start = time.perf_counter()
+        image = asyncio.ensure_future(client.post('/ocr/image', data=make_png(width=64)))
+        while not image.done():
+            most_pending = max(most_pending, service.pending_tasks)
+            await asyncio.sleep(0.005)
+        body = await (await image).json()
+        seconds = time.perf_counter() - start
+        pages_done = len(job.pages)
+        await read_ndjson(await client.get(f"/jobs/{job.id}/pages"))
+        return body, seconds, pages_done, most_pending, job
+
+    body, seconds, pages_done, most_pending, job = serve(service, scenario)
+    assert body == {'text': 'tesseract:64'}
+    # Served after at most a page per worker, not behind the whole job
+    assert pages_done < pages // 2
+    assert seconds < 0.5
+    assert most_pending <= service.workers + 1
+    assert job.status == 'done' and len(job.pages) == pages
+
+
+def test_ocr_images_batched_only_while_workers_busy(fake_ocr):
+    service = ThreadedService(workers=2, preload=(), batch_window_ms=5)
+
+    async def scenario(client):
+        first = await client.post('/ocr/image', data=make_png(width=10))
+        assert service.batcher.batches == 1
+        responses = await asyncio.gather(*[
+            client.post('/ocr/image', data=make_png(width=width)) for width in range(20, 28)
+        ])
+        return [await first.json()] + [await response.json() for response in responses]
+
+    bodies = serve(service, scenario)
+    assert [body['text'] for body in bodies] == [
+        f"tesseract:{width}" for width in [10] + list(range(20, 28))
+    ]
+    assert len(fake_ocr) == 9
+    # Two images start on their own; the rest queue behind them and share batches
+    assert 3 <= service.batcher.batches < 9
+
+
+@pytest.mark.parametrize('method, path, body, status', [
+    ('post', '/ocr/image', b'', 400),
+    ('post', '/ocr/image', b'not an image', 400),
+    ('post', '/extract/pdf', b'not a pdf', 400),
+    ('post', '/ocr/pdf', b'not a pdf', 400),
+    ('post', '/extract/pdf?page_start=first', make_pdf(['x']), 400),
+    ('post', '/extract/web', b'{}', 400),
+    ('get', '/jobs/unknown', None, 404),
+    ('get', '/jobs/unknown/pages', None, 404),
+])
+def test_bad_input(method, path, body, status):
+    async def scenario(client):
+        response = await getattr(client, method)(path, data=body)
+        return response.status
+
+    assert serve(ThreadedService(workers=1, preload=()), scenario) == status
+
+
+def test_bad_pdf_upload_is_removed(tmp_path, monkeypatch):
+    import tempfile
+    monkeypatch.setattr(tempfile, 'tempdir', str(tmp_path))
+
+    async def scenario(client):
+        return (await client.post('/extract/pdf', data=b'not a pdf')).status
+
+    assert serve(ThreadedService(workers=1, preload=()), scenario) == 400
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_metrics(fake_ocr):
+    async def scenario(client):
+        await client.post('/ocr/image', data=make_png())
+        await client.post('/ocr/image', data=make_png())
+        await client.post('/ocr/image', data=b'')
+        await client.get('/health')
+        response = await client.get('/metrics')
+        return response.status, await response.json()
+
+    status, metrics = serve(ThreadedService(workers=2, preload=()), scenario)
+    assert status == 200
+    assert metrics['workers'] == 2
+    assert metrics['pool_pending_tasks'] == 0
+    assert metrics['image_queue_depth'] == 0
+    assert metrics['image_batches'] == 2
+    assert metrics['image_mean_batch_size'] == 1.0
+    assert metrics['jobs_running'] == 0
+    endpoint = metrics['endpoints']['ocr_image']
+    assert endpoint['requests'] == 3
+    assert endpoint['errors'] == 0
+    assert 0 < endpoint['p50_ms'] <= endpoint['p95_ms'] <= endpoint['max_ms']
@@ -0,0 +1,141 @@
+import os
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+import pytest
+from scrapey.watch import FolderWatcher
+
+
+class FakePool:
+    """Records submissions instead of running them."""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, func, file_path, output_path, engine):
+        future = Future()
+        self.submitted.append((file_path, future))
+        return future
+
+
+@pytest.fixture
+def watcher(tmp_path):
+    watch_dir = tmp_path / 'scans'
+    watch_dir.mkdir()
+    watcher = FolderWatcher(
+        str(watch_dir), workers=2, max_queue=4, settle_seconds=0,
+        ledger_path=str(tmp_path / 'ledger.sqlite'), max_crashes=2,
+    )
+    yield watcher
+    watcher.ledger.close()
+
+
+def add_file(watcher, name):
+    path = os.path.join(watcher.watch_dir, name)
+    with open(path, 'wb') as f:
+        f.write(name.encode('ascii'))
+    watcher._consider(path)
+    return path
+
+
+def ledger_status(watcher, path):
+    row = watcher.ledger.connection.execute(
+        "SELECT status FROM processed WHERE path = ?", (path,)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def crash(watcher, pool):
+    for _, future in pool.submitted:
+        if not future.done():
+            future.set_exception(BrokenProcessPool("worker died"))
+    watcher._collect_finished()
+
+
+def test_finished_files_are_recorded(watcher):
+    pool = FakePool()
+    path = add_file(watcher, 'a.pdf')
+    watcher._submit_ready(pool)
+    pool.submitted[0][1].set_result((path, 10, 0.1))
+    watcher._collect_finished()
+    assert ledger_status(watcher, path) == 'done'
+    assert watcher.processed == 1
+
+
+def test_crashed_files_retry_alone_then_fail(watcher):
+    poison = add_file(watcher, 'poison.pdf')
+    innocent = add_file(watcher, 'innocent.pdf')
+
+    pool = FakePool()
+    watcher._submit_ready(pool)
+    assert {path for path, _ in pool.submitted} == {poison, innocent}
+    crash(watcher, pool)
+    assert watcher._pool_broken
+    # Neither file is blamed yet; both are retried
+    assert ledger_status(watcher, poison) is None
+    assert ledger_status(watcher, innocent) is None
+
+    # After a crash, each retried file runs without company
+    watcher._consider(poison)
+    watcher._consider(innocent)
+    pool = FakePool()
+    watcher._submit_ready(pool)
+    assert [path for path, _ in pool.submitted] == [poison]
+    watcher._submit_ready(pool)
+    assert len(pool.submitted) == 1
+
+    crash(watcher, pool)
+    assert ledger_status(watcher, poison) == 'failed'
+    assert watcher.failed == 1
+
+    pool = FakePool()
+    watcher._submit_ready(pool)
+    assert [path for path, _ in pool.submitted] == [innocent]
+    pool.submitted[0][1].set_result((innocent, 5, 0.1))
+    watcher._collect_finished()
+    assert ledger_status(watcher, innocent) == 'done'
+    assert watcher._crashes == {}
+
+
+def test_extraction_errors_fail_immediately(watcher):
+    pool = FakePool()
+    path = add_file(watcher, 'broken.png')
+    watcher._submit_ready(pool)
+    pool.submitted[0][1].set_exception(RuntimeError("cannot identify image file"))
+    watcher._collect_finished()
+    assert ledger_status(watcher, path) == 'failed'
+    assert not watcher._pool_broken
+
+
+def test_pool_is_replaced_by_hand_before_python_311(watcher, monkeypatch):
+    import scrapey.watch
+    monkeypatch.setattr(scrapey.watch, '_RECYCLES_WORKERS', False)
+    pools = []
+
+    class RecordingPool(FakePool):
+        shut_down = False
+
+        def shutdown(self, wait=True):
+            self.shut_down = True
+
+    def make_pool():
+        watcher._pool_tasks = 0
+        pools.append(RecordingPool())
+        return pools[-1]
+
+    monkeypatch.setattr(watcher, '_make_pool', make_pool)
+    watcher.tasks_per_worker = 1
+    paths = [add_file(watcher, f'{name}.pdf') for name in 'abc']
+
+    pool = make_pool()
+    watcher._submit_ready(pool)
+    # Two workers, one file each: the third waits for a fresh pool
+    assert len(pool.submitted) == 2
+    assert watcher._renew_pool(pool) is pool
+
+    for path, future in pool.submitted:
+        future.set_result((path, 1, 0.1))
+    watcher._collect_finished()
+    fresh = watcher._renew_pool(pool)
+    assert fresh is not pool and pool.shut_down
+    watcher._submit_ready(fresh)
+    assert {path for path, _ in pool.submitted + fresh.submitted} == set(paths)
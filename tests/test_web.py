@@ -0,0 +1,78 @@
+import os
+import time
+import pytest
+from scrapey.utils import app_settings
+from scrapey.web import DocumentWriter, classify_content, document_suffix, prune_download_cache
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setitem(app_settings, 'model_cache_dir', str(tmp_path))
+    return tmp_path / 'downloads'
+
+
+def store(data, suffix='.pdf'):
+    writer = DocumentWriter(suffix)
+    for start in range(0, len(data), 4):
+        writer.write(data[start:start + 4])
+    return writer.finish()
+
+
+@pytest.mark.parametrize('content_type, url, kind', [
+    ('application/pdf', 'http://example.com/download', 'pdf'),
+    ('application/octet-stream', 'http://example.com/a.PDF', 'pdf'),
+    ('image/png; charset=binary', 'http://example.com/scan', 'image'),
+    ('text/html; charset=utf-8', 'http://example.com/', 'html'),
+    ('', 'http://example.com/', 'html'),
+    ('text/plain', 'http://example.com/a.txt', 'text'),
+    ('application/zip', 'http://example.com/a.zip', None),
+])
+def test_classify_content(content_type, url, kind):
+    assert classify_content(content_type, url) == kind
+
+
+def test_document_suffix():
+    assert document_suffix('pdf', 'http://example.com/get?id=1', 'application/pdf') == '.pdf'
+    assert document_suffix('image', 'http://example.com/scan.TIFF', 'image/tiff') == '.tiff'
+    assert document_suffix('image', 'http://example.com/scan', 'image/png') == '.png'
+
+
+def test_document_writer_stores_by_hash(cache_dir):
+    path, sha256 = store(b'same document')
+    assert os.path.basename(path) == sha256 + '.pdf'
+    assert store(b'same document') == (path, sha256)
+    assert os.listdir(cache_dir) == [sha256 + '.pdf']
+
+
+def test_document_writer_discard(cache_dir):
+    writer = DocumentWriter('.pdf')
+    writer.write(b'partial')
+    writer.discard()
+    assert os.listdir(cache_dir) == []
+
+
+def test_prune_download_cache_removes_least_recently_used(cache_dir, monkeypatch):
+    monkeypatch.setitem(app_settings, 'download_cache_max_mb', 0)
+    paths = []
+    for age, data in enumerate([b'a' * 100, b'b' * 100, b'c' * 100]):
+        path, _ = store(data)
+        stamp = time.time() - 1000 + age
+        os.utime(path, (stamp, stamp))
+        paths.append(path)
+    stale_part = cache_dir / 'old.part'
+    stale_part.write_bytes(b'x')
+    os.utime(stale_part, (0, 0))
+
+    # Reusing a document marks it as recently used
+    store(b'a' * 100)
+    prune_download_cache(keep=paths[1], max_bytes=200)
+
+    assert sorted(os.listdir(cache_dir)) == sorted(os.path.basename(p) for p in paths[:2])
+
+
+def test_download_cache_limit_applied_on_finish(cache_dir, monkeypatch):
+    monkeypatch.setitem(app_settings, 'download_cache_max_mb', 1)
+    old, _ = store(b'o' * 600 * 1024)
+    os.utime(old, (0, 0))
+    new, _ = store(b'n' * 600 * 1024)
+    assert os.listdir(cache_dir) == [os.path.basename(new)]